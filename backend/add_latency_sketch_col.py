@@ -0,0 +1,25 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import engine
+from sqlalchemy import text
+
+def migrate():
+    print("Migrating database schema...")
+    try:
+        with engine.connect() as conn:
+            # Add latency_sketch column to test_executions
+            try:
+                print("Executing: ALTER TABLE test_executions ADD COLUMN latency_sketch JSON COMMENT '响应时间分布(可合并草图)'")
+                conn.execute(text("ALTER TABLE test_executions ADD COLUMN latency_sketch JSON COMMENT '响应时间分布(可合并草图)'"))
+                conn.commit()
+                print("Success: latency_sketch column added.")
+            except Exception as e:
+                print(f"Error executing ALTER (might already exist): {e}")
+                
+    except Exception as e:
+        print(f"Connection Error: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,25 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import engine
+from sqlalchemy import text
+
+def migrate():
+    print("Migrating database schema...")
+    try:
+        with engine.connect() as conn:
+            # Add log_file column to test_executions
+            try:
+                print("Executing: ALTER TABLE test_executions ADD COLUMN log_file VARCHAR(255) COMMENT '完整日志文件路径'")
+                conn.execute(text("ALTER TABLE test_executions ADD COLUMN log_file VARCHAR(255) COMMENT '完整日志文件路径'"))
+                conn.commit()
+                print("Success: log_file column added.")
+            except Exception as e:
+                print(f"Error executing ALTER (might already exist): {e}")
+                
+    except Exception as e:
+        print(f"Connection Error: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,31 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import engine
+from sqlalchemy import text
+
+def migrate():
+    print("Migrating database schema...")
+    statements = [
+        "ALTER TABLE test_executions ADD COLUMN priority INT NOT NULL DEFAULT 0 COMMENT '排队优先级(越大越先执行)'",
+        "ALTER TABLE test_executions ADD COLUMN run_request JSON COMMENT '执行请求参数'",
+        "CREATE INDEX ix_test_executions_status ON test_executions (status)",
+    ]
+    try:
+        with engine.connect() as conn:
+            # Add scheduler queue columns to test_executions
+            for statement in statements:
+                try:
+                    print(f"Executing: {statement}")
+                    conn.execute(text(statement))
+                    conn.commit()
+                    print("Success.")
+                except Exception as e:
+                    print(f"Error executing statement (might already exist): {e}")
+                
+    except Exception as e:
+        print(f"Connection Error: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,25 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import engine
+from sqlalchemy import text
+
+def migrate():
+    print("Migrating database schema...")
+    try:
+        with engine.connect() as conn:
+            # Add regression column to test_executions
+            try:
+                print("Executing: ALTER TABLE test_executions ADD COLUMN regression JSON COMMENT '与基线执行的回归对比结果'")
+                conn.execute(text("ALTER TABLE test_executions ADD COLUMN regression JSON COMMENT '与基线执行的回归对比结果'"))
+                conn.commit()
+                print("Success: regression column added.")
+            except Exception as e:
+                print(f"Error executing ALTER (might already exist): {e}")
+                
+    except Exception as e:
+        print(f"Connection Error: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,30 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import engine
+from sqlalchemy import text
+
+def migrate():
+    print("Migrating database schema...")
+    statements = [
+        "ALTER TABLE test_executions ADD COLUMN script_hash VARCHAR(64) COMMENT '脚本配置哈希'",
+        "CREATE INDEX ix_test_executions_script_hash ON test_executions (script_hash)",
+    ]
+    try:
+        with engine.connect() as conn:
+            # Add script_hash column to test_executions
+            for statement in statements:
+                try:
+                    print(f"Executing: {statement}")
+                    conn.execute(text(statement))
+                    conn.commit()
+                    print("Success.")
+                except Exception as e:
+                    print(f"Error executing statement (might already exist): {e}")
+                
+    except Exception as e:
+        print(f"Connection Error: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,215 @@
+"""
+Load generator agent.
+
+Runs K6 execution segments for a backend on another machine, so load
+generation does not compete with the API server for CPU. Start one per
+load generator node (several on one host work too, e.g. for testing):
+
+    python -m app.agent --backend http://backend-host:8000 --port 9001
+
+AGENT_TOKEN must be set, to the same value as on the backend: the agent
+runs whatever script it is sent, so it only accepts runs carrying the
+token, and by default only listens on 127.0.0.1 (pass --host to expose it
+to the backend host).
+
+The agent registers with the backend and repeats that as a heartbeat with
+its current capacity. The backend connects to /run for each segment it
+assigns; see services/agents.py for the other side of the protocol.
+"""
+import argparse
+import asyncio
+import hmac
+import os
+import shutil
+import socket
+import tempfile
+from typing import Dict, Any, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+
+from .config import settings
+from .services.segment_worker import LocalSegmentWorker
+
+
+# Bytes of result data per binary frame
+RESULT_FRAME_SIZE = 1024 * 1024
+
+# Seconds between forwarding output lines and result data
+STREAM_INTERVAL = 0.1
+
+app = FastAPI(title="K6 Load Agent")
+
+# Segments running on this agent
+_running = 0
+
+
+def capacity() -> Dict[str, Any]:
+    """What this host can take: CPUs, 1-minute load average, running segments."""
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        load = 0.0  # Not available on Windows
+    return {
+        "cpus": os.cpu_count() or 1,
+        "load": round(load, 2),
+        "running": _running,
+    }
+
+
+@app.get("/capacity")
+def get_capacity():
+    """Current capacity report."""
+    return capacity()
+
+
+@app.websocket("/run")
+async def run_segment(websocket: WebSocket):
+    """
+    Run one segment for the backend.
+
+    The first message is {"action": "run", "script_name", "segment",
+    "sequence", "compression"}, followed by the script or K6 archive as one
+    binary frame; {"action": "stop"} may follow.
+    Output lines are sent as {"type": "lines", "lines": [...]}, the result
+    file as binary frames, and the exit code last as {"type": "exit", "code"}.
+    Closing the connection stops K6.
+    """
+    global _running
+    token = websocket.query_params.get("token")
+    if not settings.AGENT_TOKEN or not token or not hmac.compare_digest(token, settings.AGENT_TOKEN):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    workdir = tempfile.mkdtemp(prefix="k6agent_")
+    worker = LocalSegmentWorker()
+    run_task: Optional[asyncio.Task] = None
+    command_task: Optional[asyncio.Task] = None
+    _running += 1
+    try:
+        request = await websocket.receive_json()
+        script = await websocket.receive_bytes()
+        if request.get("action") != "run" or not script:
+            await websocket.send_json({"type": "error", "message": "Expected a run request and a script"})
+            return
+
+        # The extension tells K6 whether this is a script or an archive
+        script_path = os.path.join(workdir, os.path.basename(request.get("script_name") or "script.js"))
+        with open(script_path, "wb") as f:
+            f.write(script)
+        extension = ".json.gz" if request.get("compression") == "gzip" else ".json"
+        result_file = os.path.join(workdir, "result" + extension)
+
+        lines: asyncio.Queue = asyncio.Queue()
+        run_task = asyncio.create_task(worker.run(
+            script_path,
+            result_file,
+            lines.put,
+            segment=request.get("segment"),
+            sequence=request.get("sequence"),
+        ))
+        command_task = asyncio.create_task(_receive_commands(websocket, worker, run_task))
+
+        offset = 0
+        while True:
+            finished = run_task.done()
+            batch = []
+            while not lines.empty():
+                batch.append(lines.get_nowait())
+            if batch:
+                await websocket.send_json({"type": "lines", "lines": batch})
+            while True:
+                data = await asyncio.to_thread(_read_from, result_file, offset)
+                if not data:
+                    break
+                offset += len(data)
+                await websocket.send_bytes(data)
+            if finished:
+                break
+            await asyncio.wait({run_task}, timeout=STREAM_INTERVAL)
+
+        if run_task.cancelled():
+            return  # Connection dropped, nobody to report to
+        try:
+            code = run_task.result()
+        except Exception as e:
+            await websocket.send_json({"type": "error", "message": str(e)})
+            return
+        await websocket.send_json({"type": "exit", "code": code})
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _running -= 1
+        for task in (command_task, run_task):
+            if task and not task.done():
+                task.cancel()  # Kills K6 if the backend went away
+        if run_task:
+            await asyncio.gather(run_task, return_exceptions=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def _receive_commands(websocket: WebSocket, worker: LocalSegmentWorker, run_task: asyncio.Task):
+    """Handle stop requests; a dropped connection stops K6 for good."""
+    try:
+        while True:
+            message = await websocket.receive_json()
+            if message.get("action") == "stop":
+                worker.stop()
+    except (WebSocketDisconnect, RuntimeError):
+        run_task.cancel()
+
+
+def _read_from(path: str, offset: int) -> bytes:
+    """Up to RESULT_FRAME_SIZE bytes of a file from offset (b"" if it does not exist yet)."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read(RESULT_FRAME_SIZE)
+    except FileNotFoundError:
+        return b""
+
+
+async def heartbeat(backend: str, name: str, url: str):
+    """Register with the backend every AGENT_HEARTBEAT_INTERVAL seconds."""
+    headers = {"X-Agent-Token": settings.AGENT_TOKEN}
+    async with httpx.AsyncClient(timeout=10) as client:
+        while True:
+            try:
+                response = await client.post(
+                    f"{backend.rstrip('/')}/api/agents",
+                    json={"name": name, "url": url, "capacity": capacity()},
+                    headers=headers,
+                )
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                print(f"Agent heartbeat failed: {e}")
+            await asyncio.sleep(settings.AGENT_HEARTBEAT_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="K6 load generator agent")
+    parser.add_argument("--backend", required=True, help="Backend URL, e.g. http://localhost:8000")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (0.0.0.0 for all)")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--name", default=None, help="Agent name (default host:port)")
+    parser.add_argument("--url", default=None, help="URL the backend reaches this agent at")
+    args = parser.parse_args()
+    if not settings.AGENT_TOKEN:
+        parser.error("AGENT_TOKEN must be set (the same value as on the backend)")
+
+    hostname = socket.gethostname()
+    name = args.name or f"{hostname}:{args.port}"
+    url = args.url or f"http://{hostname}:{args.port}"
+
+    @app.on_event("startup")
+    async def start_heartbeat():
+        app.state.heartbeat = asyncio.create_task(heartbeat(args.backend, name, url))
+
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
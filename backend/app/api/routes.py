@@ -1,12 +1,17 @@
 """API routes for test configuration and execution."""
 import asyncio
+import hmac
+import os
 import httpx
+import numpy as np
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
+from ..config import settings
 from ..database import get_db
 from ..models import TestConfig, TestExecution
 from ..schemas import (
@@ -14,9 +19,12 @@ from ..schemas import (
     TestConfigUpdate,
     TestConfigResponse,
     TestExecutionResponse,
+    ExecutionPage,
     RunTestRequest,
 )
-from ..services import K6ScriptGenerator, K6Executor
+from ..services import K6ScriptGenerator, scheduler, agent_registry
+from ..services import result_store, http_client, time_series, regression, execution_summaries, profiling
+from ..services.log_sink import LogReader, LOG_LEVELS, index_path_for, page_text
 from ..websocket import manager
 
 router = APIRouter()
@@ -34,12 +42,42 @@ class DebugRequest(BaseModel):
     body: Optional[str] = None
 
 
+class EnqueueRequest(BaseModel):
+    """Schema for queueing a test run (same config as the WebSocket run action)."""
+    config: Dict[str, Any]
+    priority: int = 0
+
+
+class AgentRegistration(BaseModel):
+    """Schema for an agent heartbeat."""
+    name: str
+    url: str
+    capacity: Dict[str, Any] = {}
+
+
 class DebugResponse(BaseModel):
     """Schema for debug response."""
     status: int
     duration: float
     headers: Dict[str, str]
     body: str
+    truncated: bool = False
+
+
+class ProbeRequest(DebugRequest):
+    """Schema for a quick probe: the debug request sent repeatedly."""
+    requests: int = Field(default=100, ge=1, le=10000)
+    concurrency: int = Field(default=10, ge=1, le=100)
+
+
+class CompareRequest(BaseModel):
+    """Schema for comparing executions; tolerances and alpha default to the REGRESSION_* settings."""
+    candidate: List[int] = Field(min_length=1)
+    baseline: List[int] = Field(default=[], description="Default: the previous runs of the same script")
+    latency_tolerance: Optional[float] = Field(default=None, ge=0)
+    throughput_tolerance: Optional[float] = Field(default=None, ge=0)
+    error_rate_tolerance: Optional[float] = Field(default=None, ge=0)
+    alpha: Optional[float] = Field(default=None, gt=0, lt=1)
 
 
 # =============================================================================
@@ -142,53 +180,35 @@ def delete_config(config_id: int, db: Session = Depends(get_db)):
 async def debug_request(request: DebugRequest):
     """Send a debug request to test the API endpoint."""
     try:
-        start_time = datetime.now()
-        
-        async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-            response = await client.request(
-                method=request.method,
-                url=request.url,
-                headers={**request.headers, "Accept-Encoding": "identity"},  # Force uncompressed response
-                content=request.body if request.body else None,
-            )
-            
-        print(f"Debug Response Headers: {dict(response.headers)}")
-        print(f"Debug Response Content Start (Hex): {response.content[:20].hex()}")
-
-        
-        duration = (datetime.now() - start_time).total_seconds() * 1000
+        # Pooled connection; only the first BODY_READ_LIMIT bytes are read
+        response, content, truncated, duration = await http_client.fetch(
+            method=request.method,
+            url=request.url,
+            headers=request.headers,
+            body=request.body,
+        )
         
         # Convert headers to dict
         response_headers = dict(response.headers)
-        
-        # Handle response body
-        content = response.content
-        
-        # Check for GZIP magic number (1f 8b) if not automatically handled
-        if content.startswith(b'\x1f\x8b'):
-            try:
-                import gzip
-                content = gzip.decompress(content)
-            except Exception:
-                pass
 
         # Try to decode content
         try:
-            # Try UTF-8 first
-            body_text = content.decode('utf-8')
+            # Try UTF-8 first (ignoring a character cut at the read limit)
+            body_text = content.decode('utf-8', errors='ignore' if truncated else 'strict')
         except UnicodeDecodeError:
             try:
                 # Try GBK for Chinese sites
                 body_text = content.decode('gbk')
             except UnicodeDecodeError:
-                # Fallback to ISO-8859-1 or whatever header says, or just string repr
-                body_text = response.text
+                # Fallback to ISO-8859-1 or whatever header says
+                body_text = content.decode(response.encoding or 'latin-1', errors='replace')
 
         return DebugResponse(
             status=response.status_code,
             duration=round(duration, 2),
             headers=response_headers,
-            body=body_text[:10000],  # Limit response body size
+            body=body_text[:http_client.BODY_LIMIT],  # Limit response body size
+            truncated=truncated or len(body_text) > http_client.BODY_LIMIT,
         )
     except httpx.RequestError as e:
         raise HTTPException(status_code=502, detail=f"Request failed: {str(e)}")
@@ -196,23 +216,107 @@ async def debug_request(request: DebugRequest):
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+@router.post("/debug/probe", tags=["Debug"])
+async def probe_request(request: ProbeRequest):
+    """
+    Quick pre-flight before a full K6 run: send the debug request
+    `requests` times with `concurrency` in flight and return the status
+    codes, RPS and latency distribution.
+    """
+    try:
+        return await http_client.probe(
+            method=request.method,
+            url=request.url,
+            headers=request.headers,
+            body=request.body,
+            requests=request.requests,
+            concurrency=request.concurrency,
+        )
+    except httpx.InvalidURL as e:
+        raise HTTPException(status_code=400, detail=f"Invalid URL: {str(e)}")
+
+
 # =============================================================================
 # Test Execution
 # =============================================================================
 
-@router.get("/executions", response_model=List[TestExecutionResponse], tags=["Executions"])
+@router.get("/executions", response_model=ExecutionPage, tags=["Executions"])
 def list_executions(
     config_id: Optional[int] = None,
-    skip: int = 0,
-    limit: int = 100,
+    status: Optional[str] = None,
+    script_hash: Optional[str] = None,
+    before: Optional[int] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=execution_summaries.MAX_PAGE_SIZE),
     db: Session = Depends(get_db)
 ):
-    """List test executions."""
-    query = db.query(TestExecution)
-    if config_id:
-        query = query.filter(TestExecution.config_id == config_id)
-    executions = query.order_by(TestExecution.created_at.desc()).offset(skip).limit(limit).all()
-    return executions
+    """List test executions, newest first, with their key metrics."""
+    return execution_summaries.page(
+        db,
+        limit=limit,
+        before=before,
+        config_id=config_id,
+        status=status,
+        script_hash=script_hash,
+    )
+
+
+@router.post("/executions", tags=["Executions"])
+async def enqueue_execution(request: EnqueueRequest):
+    """Queue a test run; it starts when the scheduler has capacity."""
+    try:
+        execution = await scheduler.enqueue(request.config, priority=request.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "execution_id": execution.id,
+        "config_id": execution.config_id,
+        "status": "queued",
+        "position": await scheduler.position(execution.id),
+    }
+
+
+@router.post("/executions/compare", tags=["Executions"])
+def compare_executions(request: CompareRequest, db: Session = Depends(get_db)):
+    """Compare candidate executions with a baseline and flag significant regressions."""
+    ids = set(request.candidate) | set(request.baseline)
+    executions = {e.id: e for e in db.query(TestExecution).filter(TestExecution.id.in_(ids)).all()}
+    missing = sorted(ids - set(executions))
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Execution not found: {', '.join(map(str, missing))}")
+    
+    candidate = [executions[i] for i in request.candidate]
+    if request.baseline:
+        baseline = [executions[i] for i in request.baseline]
+    else:
+        baseline = regression.baseline_for(db, max(candidate, key=lambda e: e.id))
+        if not baseline:
+            raise HTTPException(status_code=404, detail="No earlier successful run of the same script")
+    
+    try:
+        return regression.compare(
+            baseline,
+            candidate,
+            latency_tolerance=request.latency_tolerance,
+            throughput_tolerance=request.throughput_tolerance,
+            error_rate_tolerance=request.error_rate_tolerance,
+            alpha=request.alpha,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/executions/{execution_id}/cancel", tags=["Executions"])
+async def cancel_execution(execution_id: int):
+    """Cancel a queued execution or stop a running one."""
+    if not await scheduler.cancel(execution_id):
+        raise HTTPException(status_code=404, detail="Execution is not queued or running")
+    return {"message": "Execution cancelled"}
+
+
+@router.get("/queue", tags=["Executions"])
+async def get_queue():
+    """Running executions and the queue in run order."""
+    return await scheduler.status()
 
 
 @router.get("/executions/{execution_id}", response_model=TestExecutionResponse, tags=["Executions"])
@@ -224,17 +328,173 @@ def get_execution(execution_id: int, db: Session = Depends(get_db)):
     return execution
 
 
+@router.get("/executions/{execution_id}/logs", tags=["Executions"])
+def get_execution_logs(
+    execution_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(200, ge=1, le=5000),
+    level: Optional[str] = Query(None, description="error, warning or info"),
+    db: Session = Depends(get_db)
+):
+    """Get a page of an execution's log lines, optionally of one level only."""
+    if level and level not in LOG_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Invalid level: {level}")
+    
+    execution = db.query(TestExecution).filter(TestExecution.id == execution_id).first()
+    if not execution:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    
+    if execution.log_file and os.path.exists(index_path_for(execution.log_file)):
+        return LogReader(execution.log_file).page(offset, limit, level)
+    # Executions from before chunked logs only have the text in the DB
+    return page_text(execution.logs or "", offset, limit, level)
+
+
+@router.get("/executions/{execution_id}/phases", tags=["Executions"])
+def get_execution_phases(execution_id: int, db: Session = Depends(get_db)):
+    """Get the time spent in each phase of an execution, from script generation to the stored result."""
+    execution = db.query(TestExecution).filter(TestExecution.id == execution_id).first()
+    if not execution:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    if not execution.phases:
+        raise HTTPException(status_code=404, detail="No phase timings for this execution")
+    return {"execution_id": execution.id, **execution.phases}
+
+
+@router.get("/executions/{execution_id}/profile", response_class=PlainTextResponse, tags=["Executions"])
+def get_execution_profile(execution_id: int, db: Session = Depends(get_db)):
+    """Get the sampled profile of an execution as folded stacks (for flame graph tools)."""
+    execution = db.query(TestExecution).filter(TestExecution.id == execution_id).first()
+    if not execution:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    path = profiling.profile_path_for(execution.id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No profile for this execution")
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@router.get("/executions/{execution_id}/timeseries", tags=["Executions"])
+def get_execution_timeseries(
+    execution_id: int,
+    metric: str,
+    start: Optional[float] = Query(None, alias="from", description="Epoch seconds"),
+    end: Optional[float] = Query(None, alias="to", description="Epoch seconds"),
+    step: Optional[float] = Query(None, description="Bucket width in seconds"),
+    agg: str = "avg",
+    tags: Optional[str] = Query(None, description="Tag filter, e.g. status:200,method:GET"),
+    db: Session = Depends(get_db)
+):
+    """Get one metric of an execution aggregated into time buckets."""
+    execution = db.query(TestExecution).filter(TestExecution.id == execution_id).first()
+    if not execution:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    
+    store = result_store.open_or_build(execution.id, execution.result_file)
+    if store is None:
+        raise HTTPException(status_code=404, detail="No result data for this execution")
+    if metric not in store.metrics:
+        raise HTTPException(status_code=404, detail=f"Metric not found: {metric}")
+    
+    try:
+        return store.query(
+            metric,
+            start=start,
+            end=end,
+            step=step,
+            agg=agg,
+            tags=result_store.parse_tag_filter(tags),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/executions/{execution_id}/series", tags=["Executions"])
+def get_execution_series(
+    execution_id: int,
+    points: int = Query(1000, ge=10, le=5000, description="Maximum points per series"),
+    method: str = Query("lttb", description="Downsampling: lttb or minmax"),
+    names: Optional[str] = Query(None, description="Series to return, e.g. rps,p95 (default all)"),
+    db: Session = Depends(get_db)
+):
+    """Get the per-second series of an execution (RPS, error rate, VUs, latency quantiles) downsampled for charts."""
+    execution = db.query(TestExecution).filter(TestExecution.id == execution_id).first()
+    if not execution:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    if method not in time_series.DOWNSAMPLE_METHODS:
+        raise HTTPException(status_code=400, detail=f"Unknown method: {method}")
+    selected = [name.strip() for name in names.split(",") if name.strip()] if names else list(time_series.SERIES_NAMES)
+    unknown = [name for name in selected if name not in time_series.SERIES_NAMES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown series: {', '.join(unknown)}")
+    
+    series = time_series.load_or_build(execution.id, execution.result_file)
+    if series is None:
+        raise HTTPException(status_code=404, detail="No result data for this execution")
+    
+    start = int(series["start"])
+    times = start + np.arange(len(series["rps"]), dtype=np.int64)
+    return {
+        "execution_id": execution.id,
+        "start": start,
+        "end": int(times[-1]),
+        "method": method,
+        "points": points,
+        "series": {name: time_series.downsample(times, series[name], points, method) for name in selected},
+    }
+
+
+# =============================================================================
+# Load Generator Agents
+# =============================================================================
+
+def _check_agent_token(token: Optional[str]):
+    """Remote agents are opt-in: only usable with AGENT_TOKEN set, and only with that token."""
+    if not settings.AGENT_TOKEN:
+        raise HTTPException(status_code=403, detail="Remote agents are disabled (AGENT_TOKEN is not set)")
+    if not token or not hmac.compare_digest(token, settings.AGENT_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid agent token")
+
+
+@router.post("/agents", tags=["Agents"])
+def register_agent(registration: AgentRegistration, x_agent_token: Optional[str] = Header(None)):
+    """Register an agent or refresh its heartbeat (sent by python -m app.agent)."""
+    _check_agent_token(x_agent_token)
+    agent = agent_registry.register(registration.name, registration.url, registration.capacity)
+    return agent.to_dict()
+
+
+@router.get("/agents", tags=["Agents"])
+def list_agents():
+    """Agents that new runs are spread across."""
+    return [agent.to_dict() for agent in agent_registry.available()]
+
+
+@router.delete("/agents/{name}", tags=["Agents"])
+def remove_agent(name: str, x_agent_token: Optional[str] = Header(None)):
+    """Stop using an agent until its next heartbeat."""
+    _check_agent_token(x_agent_token)
+    if not agent_registry.remove(name):
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return {"message": "Agent removed"}
+
+
 # =============================================================================
 # WebSocket for Real-time Test Execution
 # =============================================================================
 
 @router.websocket("/ws/test")
-async def websocket_test_endpoint(websocket: WebSocket, db: Session = Depends(get_db)):
-    """WebSocket endpoint for running tests with real-time logs."""
+async def websocket_test_endpoint(websocket: WebSocket):
+    """
+    WebSocket endpoint for running tests with real-time logs.
+    
+    Runs are queued on the scheduler and keep going if the socket closes;
+    the socket only follows them.
+    """
     await manager.connect(websocket)
     
-    current_executor = None
-    execution_task = None
+    # Latest execution started from this connection
+    current_execution_id = None
     
     try:
         while True:
@@ -243,19 +503,52 @@ async def websocket_test_endpoint(websocket: WebSocket, db: Session = Depends(ge
             action = data.get("action")
             
             if action == "run":
-                # Stop existing test if running
-                if current_executor:
-                    current_executor.stop()
+                try:
+                    execution = await scheduler.enqueue(
+                        data.get("config", {}),
+                        priority=int(data.get("priority", 0)),
+                        subscriber=websocket,
+                    )
+                except (TypeError, ValueError) as e:
+                    await manager.send_error(websocket, str(e))
+                    continue
+                
+                current_execution_id = execution.id
+                await manager.send_message(websocket, {
+                    "type": "execution_started",
+                    "execution_id": execution.id,
+                    "config_id": execution.config_id
+                })
+                position = await scheduler.position(execution.id)
+                if position:
+                    await manager.send_status(websocket, "queued", {"position": position})
+                    await manager.send_message(websocket, {
+                        "type": "queue",
+                        "execution_id": execution.id,
+                        "position": position
+                    })
+                
+            elif action == "subscribe":
+                # Re-attach to an execution, e.g. after reconnecting
+                execution_id = data.get("execution_id")
+                if isinstance(execution_id, int):
+                    current_execution_id = execution_id
+                    manager.subscribe(websocket, execution_id)
                 
-                # Run test in background task
-                current_executor = K6Executor()
-                execution_task = asyncio.create_task(
-                    run_test_via_websocket(websocket, data, db, current_executor)
-                )
+            elif action == "configure_logs":
+                try:
+                    manager.configure_logs(
+                        websocket,
+                        batch_size=data.get("batch_size"),
+                        flush_interval=data.get("flush_interval"),
+                        max_in_flight_bytes=data.get("max_in_flight_bytes"),
+                    )
+                except (TypeError, ValueError) as e:
+                    await manager.send_error(websocket, f"Invalid log settings: {e}")
                 
             elif action == "stop":
-                if current_executor:
-                    current_executor.stop()
+                execution_id = data.get("execution_id") or current_execution_id
+                if execution_id and await scheduler.cancel(execution_id):
                     await manager.send_log(websocket, "[INFO] Received stop command, terminating test...")
                 else:
                     await manager.send_message(websocket, {
@@ -266,138 +559,7 @@ async def websocket_test_endpoint(websocket: WebSocket, db: Session = Depends(ge
                 await manager.send_error(websocket, f"Unknown action: {action}")
                 
     except WebSocketDisconnect:
-        if current_executor:
-            current_executor.stop()
         manager.disconnect(websocket)
     except Exception as e:
-        if current_executor:
-            current_executor.stop()
         await manager.send_error(websocket, str(e))
         manager.disconnect(websocket)
-
-
-async def run_test_via_websocket(websocket: WebSocket, data: dict, db: Session, executor: K6Executor):
-    """Run a test and stream logs via WebSocket."""
-    try:
-        # Extract test configuration from request
-        config_data = data.get("config", {})
-        
-        # Validate required fields
-        if not config_data.get("url"):
-            await manager.send_error(websocket, "URL is required")
-            return
-        
-        # Send starting status
-        await manager.send_status(websocket, "starting")
-        
-        # Extract configuration - two-level mode structure
-        config_name = config_data.get("name", "Quick Test")
-        load_category = config_data.get("loadCategory", "vus")
-        load_sub_mode = config_data.get("loadSubMode", "simple")
-        
-        headers_data = config_data.get("headers", [])
-        stages_data = config_data.get("stages", [])
-        rps_stages_data = config_data.get("rpsStages", [])
-        thresholds_data = config_data.get("thresholds", [])
-        data_file = config_data.get("dataFile")
-        print(f"DEBUG: Processing config. dataFile from payload: {data_file}")
-        
-        # Create config record
-        db_config = TestConfig(
-            name=config_name,
-            url=config_data["url"],
-            method=config_data.get("method", "GET"),
-            headers=headers_data,
-            body=config_data.get("body"),
-            vus=config_data.get("vus", 1),
-            duration=config_data.get("duration", "30s"),
-            stages=stages_data if stages_data else None,
-            thresholds=thresholds_data if thresholds_data else None,
-            data_file=data_file,
-        )
-        db.add(db_config)
-        db.commit()
-        db.refresh(db_config)
-        
-        # Create execution record
-        execution = TestExecution(
-            config_id=db_config.id,
-            status="running",
-            start_time=datetime.utcnow()
-        )
-        db.add(execution)
-        db.commit()
-        db.refresh(execution)
-        
-        # Send execution info
-        await manager.send_message(websocket, {
-            "type": "execution_started",
-            "execution_id": execution.id,
-            "config_id": db_config.id
-        })
-        
-        # Generate K6 script with two-level mode parameters
-        generator = K6ScriptGenerator()
-        
-        script_path = generator.generate(
-            name=config_name,
-            url=config_data["url"],
-            method=config_data.get("method", "GET"),
-            headers=headers_data,
-            body=config_data.get("body"),
-            load_category=load_category,
-            load_sub_mode=load_sub_mode,
-            vus=config_data.get("vus", 1),
-            duration=config_data.get("duration", "30s"),
-            stages=stages_data if stages_data else None,
-            rps=config_data.get("rps", 100),
-            pre_allocated_vus=config_data.get("preAllocatedVUs", 10),
-            max_vus=config_data.get("maxVUs", 100),
-            rps_stages=rps_stages_data if rps_stages_data else None,
-            thresholds=thresholds_data if thresholds_data else None,
-            stop_on_failure=config_data.get("stopOnFailure", False),
-            data_file=data_file,
-        )
-        
-        await manager.send_log(websocket, f"Generated script: {script_path}")
-        await manager.send_status(websocket, "running")
-        
-        # Run K6 test
-        # Executor passed from endpoint
-        # executor = K6Executor()
-        
-        async def on_log(log: str):
-            await manager.send_log(websocket, log)
-        
-        result = await executor.run(
-            script_path=script_path,
-            execution_id=execution.id,
-            on_log=on_log,
-        )
-        
-        # Update execution record
-        execution.end_time = datetime.utcnow()
-        execution.status = "completed" if result.get("success") else "failed"
-        execution.result_summary = result.get("summary")
-        execution.result_file = result.get("result_file")
-        logs_text = "\n".join(result.get("logs", []))
-        # Truncate to 5MB (Keep tail)
-        max_log_size = 5 * 1024 * 1024
-        if len(logs_text) > max_log_size:
-             logs_text = "...[Logs Truncated due to size]...\n" + logs_text[-max_log_size:]
-        execution.logs = logs_text
-        db.commit()
-        
-        # Send completion status and result
-        await manager.send_status(websocket, execution.status)
-        await manager.send_result(websocket, {
-            "execution_id": execution.id,
-            "success": result.get("success", False),
-            "summary": result.get("summary"),
-        })
-        
-    except Exception as e:
-        await manager.send_error(websocket, f"Error running test: {str(e)}")
-        await manager.send_status(websocket, "failed")
-
-
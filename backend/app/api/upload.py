@@ -1,41 +1,62 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-import shutil
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+import asyncio
 import os
-import uuid
-from typing import Dict
+from typing import Dict, Any
+
+from ..config import settings
+from ..services import data_files
 
 router = APIRouter()
 
 # Define backend/data path
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-UPLOAD_DIR = os.path.join(BASE_DIR, "data")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+UPLOAD_DIR = settings.DATA_DIR
+
+# Allowance for the multipart framing around the file in Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
 
 @router.post("/upload/data", tags=["Upload"])
-async def upload_data_file(file: UploadFile = File(...)) -> Dict[str, str]:
-    """Upload a data file (CSV) for data-driven testing."""
+async def upload_data_file(request: Request, file: UploadFile = File(...)) -> Dict[str, Any]:
+    """
+    Upload a data file (CSV) for data-driven testing.
+    
+    The file is hashed, validated and converted to pre-parsed JSON shards in
+    one pass, so K6 processes do not each parse the whole CSV when a test
+    starts. Identical content is stored once: uploading it again returns
+    the same path with "deduplicated": true.
+    """
     if not file.filename:
         raise HTTPException(status_code=400, detail="Filename is missing")
         
     if not file.filename.lower().endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are allowed")
     
-    # Generate safe filename to avoid collisions and directory traversal
-    safe_filename = os.path.basename(file.filename)
-    unique_filename = f"{uuid.uuid4().hex[:8]}_{safe_filename}"
-    filepath = os.path.join(UPLOAD_DIR, unique_filename)
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > settings.DATA_UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"File is larger than the upload limit of {settings.DATA_UPLOAD_MAX_BYTES} bytes")
     
     try:
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
+        stored = await asyncio.to_thread(data_files.store_upload, file.file, UPLOAD_DIR)
+    except data_files.DataLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
         
-    # Return absolute path or relative path? 
-    # Frontend/Backend interactions usually prefer absolute path for execution, 
-    # but we should be careful. 
     # K6 Generator needs absolute path to read it.
-    return {"filename": unique_filename, "path": filepath}
+    return {"filename": os.path.basename(stored["path"]), **stored}
+
+
+@router.get("/data/usage", tags=["Upload"])
+async def get_data_usage() -> Dict[str, Any]:
+    """Stored data files and the space they take against DATA_QUOTA_BYTES."""
+    return await asyncio.to_thread(data_files.usage, UPLOAD_DIR)
+
+
+@router.post("/data/gc", tags=["Upload"])
+async def collect_data_garbage() -> Dict[str, int]:
+    """Delete data files no test config refers to (older than DATA_GC_MIN_AGE)."""
+    return await asyncio.to_thread(data_files.collect_garbage, UPLOAD_DIR)
 
 from fastapi.responses import StreamingResponse
 import io
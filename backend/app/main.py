@@ -1,9 +1,12 @@
 """FastAPI application entry point."""
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from . import metrics
 from .database import engine, Base
 from .api import router
+from .services import scheduler
+from .services.http_client import close_client
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -28,6 +31,19 @@ app.add_middleware(
 app.include_router(router, prefix="/api")
 
 
+@app.on_event("startup")
+async def start_scheduler():
+    """Resume queued executions."""
+    await scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    """Stop running executions and close pooled connections."""
+    await scheduler.shutdown()
+    await close_client()
+
+
 @app.get("/")
 def root():
     """Root endpoint."""
@@ -38,6 +54,14 @@ def root():
     }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Live metrics of running executions and backend internals, OpenMetrics text format (for Prometheus)."""
+    metrics.QUEUE_DEPTH.set(await scheduler.queue_depth())
+    metrics.RUNNING_EXECUTIONS.set(scheduler.running_count)
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/health")
 def health_check():
     """Health check endpoint."""
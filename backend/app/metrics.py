@@ -0,0 +1,249 @@
+"""In-process metrics registry exported in the OpenMetrics text format."""
+import abc
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Sequence
+
+# Content type of a scrape response
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Histogram bucket upper bounds (seconds) for internal latencies
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric(abc.ABC):
+    """
+    A metric family: one value (or histogram) per combination of label values.
+
+    Updates only touch the value of one label set under a lock, so they are
+    cheap from the event loop and safe from worker threads; rendering reads
+    the current values and never computes anything expensive.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def remove(self, **labels):
+        """Drop the series of one label set (e.g. a finished execution)."""
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """(sample name, labels, value) of every series."""
+
+    def render(self) -> List[str]:
+        lines = [f"# TYPE {self.name} {self.type}", f"# HELP {self.name} {_escape(self.documentation)}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """A value that only goes up, exported as <name>_total."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name + "_total", dict(zip(self.labels, key)), value) for key, value in items]
+
+
+class Gauge(Metric):
+    """A value that is set to the current state."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in items]
+
+
+class Histogram(Metric):
+    """Observations counted into fixed cumulative buckets, with their sum and count."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Counts per bucket (the last one is +Inf), sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+        result = []
+        for key, (counts, total) in items:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                result.append((self.name + "_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            result.append((self.name + "_sum", labels, total))
+            result.append((self.name + "_count", labels, cumulative))
+        return result
+
+
+class Registry:
+    """The metric families exported by /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        """All metrics in the OpenMetrics text format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Live aggregates of running executions, updated with every live metrics push
+EXECUTION_LABELS = ("execution_id", "config_id")
+EXECUTION_REQUESTS = REGISTRY.gauge("k6_execution_http_reqs", "HTTP requests so far", EXECUTION_LABELS)
+EXECUTION_FAILED = REGISTRY.gauge("k6_execution_http_req_failed", "Failed HTTP requests so far", EXECUTION_LABELS)
+EXECUTION_ERROR_RATE = REGISTRY.gauge("k6_execution_error_rate", "Share of failed HTTP requests", EXECUTION_LABELS)
+EXECUTION_RPS = REGISTRY.gauge("k6_execution_rps", "HTTP requests in the last complete second", EXECUTION_LABELS)
+EXECUTION_VUS = REGISTRY.gauge("k6_execution_vus", "Active virtual users", EXECUTION_LABELS)
+EXECUTION_LATENCY = REGISTRY.gauge(
+    "k6_execution_http_req_duration_milliseconds",
+    "HTTP request duration quantiles so far",
+    EXECUTION_LABELS + ("quantile",),
+)
+
+# Backend internals
+QUEUE_DEPTH = REGISTRY.gauge("k6_queue_depth", "Executions waiting in the queue")
+RUNNING_EXECUTIONS = REGISTRY.gauge("k6_running_executions", "Executions running on this backend")
+LOG_LINES = REGISTRY.counter("k6_log_lines", "K6 output lines published to followers")
+WEBSOCKET_SEND_SECONDS = REGISTRY.histogram("k6_websocket_send_seconds", "Time to send one WebSocket frame")
+PARSE_SECONDS = REGISTRY.histogram(
+    "k6_result_parse_seconds",
+    "Result processing time by stage: tail (one drain of a result file), "
+    "summary (re-parse after a tailing failure), store (columnar store build)",
+    ("stage",),
+    buckets=DEFAULT_BUCKETS + (30.0, 60.0, 300.0),
+)
+DB_COMMIT_SECONDS = REGISTRY.histogram("k6_db_commit_seconds", "Database session commit time, flush included")
+
+# Live quantiles exported per execution, as (snapshot key, label value)
+_LIVE_QUANTILES = (("p50", "0.5"), ("p90", "0.9"), ("p95", "0.95"), ("p99", "0.99"))
+
+
+def observe_execution(execution_id: int, config_id: Optional[int], snapshot: Dict[str, Any]):
+    """Export a live metrics snapshot (ResultAggregator.snapshot) of a running execution."""
+    labels = {"execution_id": execution_id, "config_id": config_id if config_id is not None else ""}
+    EXECUTION_REQUESTS.set(snapshot.get("http_reqs", 0), **labels)
+    EXECUTION_FAILED.set(snapshot.get("http_req_failed", 0), **labels)
+    EXECUTION_ERROR_RATE.set(snapshot.get("error_rate", 0), **labels)
+    EXECUTION_RPS.set(snapshot.get("rps", 0), **labels)
+    EXECUTION_VUS.set(snapshot.get("vus", 0), **labels)
+    duration = snapshot.get("http_req_duration") or {}
+    for key, quantile in _LIVE_QUANTILES:
+        if key in duration:
+            EXECUTION_LATENCY.set(duration[key], quantile=quantile, **labels)
+
+
+def forget_execution(execution_id: int, config_id: Optional[int]):
+    """Stop exporting a finished execution."""
+    labels = {"execution_id": execution_id, "config_id": config_id if config_id is not None else ""}
+    for metric in (EXECUTION_REQUESTS, EXECUTION_FAILED, EXECUTION_ERROR_RATE, EXECUTION_RPS, EXECUTION_VUS):
+        metric.remove(**labels)
+    for _, quantile in _LIVE_QUANTILES:
+        EXECUTION_LATENCY.remove(quantile=quantile, **labels)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
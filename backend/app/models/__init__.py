@@ -1,2 +1,3 @@
 """Database models."""
 from .test_config import TestConfig, TestExecution
+from .execution_summary import ExecutionSummary
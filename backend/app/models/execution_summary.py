@@ -0,0 +1,39 @@
+"""Slim per-execution metrics for listing history."""
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Float, ForeignKey, Index
+
+from ..database import Base
+
+
+class ExecutionSummary(Base):
+    """
+    One row per test execution with its key metrics as plain columns.
+
+    Kept in step with test_executions by services.execution_summaries, so
+    history listings read these narrow rows instead of execution records
+    with their JSON and log columns.
+    """
+    
+    __tablename__ = "execution_summaries"
+    __table_args__ = (
+        # Keyset pagination: newest first within a filter
+        Index("ix_execution_summaries_config_id", "config_id", "execution_id"),
+        Index("ix_execution_summaries_status", "status", "execution_id"),
+        Index("ix_execution_summaries_script_hash", "script_hash", "execution_id"),
+    )
+    
+    execution_id = Column(Integer, ForeignKey("test_executions.id"), primary_key=True, comment="执行ID")
+    config_id = Column(Integer, nullable=False, comment="关联配置ID")
+    name = Column(String(100), nullable=True, comment="配置名称")
+    url = Column(String(500), nullable=True, comment="请求URL")
+    status = Column(String(20), nullable=False, comment="状态")
+    script_hash = Column(String(64), nullable=True, comment="脚本配置哈希")
+    created_at = Column(DateTime, nullable=True, comment="创建时间")
+    start_time = Column(DateTime, nullable=True, comment="开始时间")
+    end_time = Column(DateTime, nullable=True, comment="结束时间")
+    duration_ms = Column(Float, nullable=True, comment="压测时长(毫秒)")
+    http_reqs = Column(BigInteger, nullable=True, comment="总请求数")
+    rps = Column(Float, nullable=True, comment="平均RPS")
+    p95 = Column(Float, nullable=True, comment="P95响应时间(毫秒)")
+    p99 = Column(Float, nullable=True, comment="P99响应时间(毫秒)")
+    error_rate = Column(Float, nullable=True, comment="错误率")
+    verdict = Column(String(20), nullable=True, comment="回归对比结论")
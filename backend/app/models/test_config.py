@@ -1,7 +1,8 @@
 """Database models for test configuration and execution."""
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Index
+from sqlalchemy.dialects.mysql import LONGTEXT
+from sqlalchemy.orm import relationship, deferred
 
 from ..database import Base
 
@@ -33,16 +34,27 @@ class TestExecution(Base):
     """Test execution record model."""
     
     __tablename__ = "test_executions"
+    __table_args__ = (
+        Index("ix_test_executions_config_created", "config_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     config_id = Column(Integer, ForeignKey("test_configs.id"), nullable=False, comment="关联配置ID")
-    status = Column(String(20), nullable=False, default="pending", comment="状态")
+    status = Column(String(20), nullable=False, default="pending", index=True, comment="状态")
+    priority = Column(Integer, nullable=False, default=0, comment="排队优先级(越大越先执行)")
+    # Deferred JSON columns: loaded on first access (the "results" group together)
+    run_request = deferred(Column(JSON, nullable=True, comment="执行请求参数"))
     start_time = Column(DateTime, nullable=True, comment="开始时间")
     end_time = Column(DateTime, nullable=True, comment="结束时间")
-    result_summary = Column(JSON, nullable=True, comment="结果摘要")
+    result_summary = deferred(Column(JSON, nullable=True, comment="结果摘要"), group="results")
     result_file = Column(String(255), nullable=True, comment="结果文件路径")
-    from sqlalchemy.dialects.mysql import LONGTEXT
-    logs = Column(LONGTEXT, nullable=True, comment="执行日志")
+    script_hash = Column(String(64), nullable=True, index=True, comment="脚本配置哈希")
+    latency_sketch = deferred(Column(JSON, nullable=True, comment="响应时间分布(可合并草图)"), group="results")
+    regression = deferred(Column(JSON, nullable=True, comment="与基线执行的回归对比结果"), group="results")
+    phases = deferred(Column(JSON, nullable=True, comment="执行各阶段耗时"))
+    # Deferred: only loaded when accessed, so listings never read log bytes
+    logs = deferred(Column(Text().with_variant(LONGTEXT, "mysql"), nullable=True, comment="执行日志(首尾摘录)"))
+    log_file = Column(String(255), nullable=True, comment="完整日志文件路径")
     created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
     
     # Relationships
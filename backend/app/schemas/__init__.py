@@ -5,6 +5,8 @@ from .test_config import (
     TestConfigResponse,
     TestExecutionCreate,
     TestExecutionResponse,
+    ExecutionSummaryResponse,
+    ExecutionPage,
     RunTestRequest,
     StageConfig,
     ThresholdConfig,
@@ -76,16 +76,48 @@ class TestExecutionResponse(BaseModel):
     id: int
     config_id: int
     status: str
+    priority: int = 0
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     result_summary: Optional[Dict[str, Any]] = None
     result_file: Optional[str] = None
+    script_hash: Optional[str] = None
+    regression: Optional[Dict[str, Any]] = None
     created_at: datetime
     
     class Config:
         from_attributes = True
 
 
+class ExecutionSummaryResponse(BaseModel):
+    """Schema for one row of the execution history."""
+    execution_id: int
+    config_id: int
+    name: Optional[str] = None
+    url: Optional[str] = None
+    status: str
+    script_hash: Optional[str] = None
+    created_at: Optional[datetime] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    duration_ms: Optional[float] = None
+    http_reqs: Optional[int] = None
+    rps: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+    error_rate: Optional[float] = None
+    verdict: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class ExecutionPage(BaseModel):
+    """Schema for a page of the execution history; pass next_cursor as `before` for the next page."""
+    items: List[ExecutionSummaryResponse]
+    next_cursor: Optional[int] = None
+
+
 class RunTestRequest(BaseModel):
     """Schema for running a test directly without saving config."""
     name: str = Field(default="Quick Test", description="测试名称")
@@ -1,3 +1,8 @@
 """Business services."""
 from .k6_generator import K6ScriptGenerator
 from .k6_executor import K6Executor
+from .agents import AgentRegistry
+from .scheduler import ExecutionScheduler
+
+agent_registry = AgentRegistry()
+scheduler = ExecutionScheduler(agents=agent_registry)
@@ -0,0 +1,169 @@
+"""Registry of load generator agents and the worker that runs segments on them."""
+import asyncio
+import json
+import os
+import time
+from typing import Optional, Callable, Dict, Any, List
+from urllib.parse import urlencode
+
+import websockets
+
+from ..config import settings
+from .segment_worker import SegmentWorker
+
+
+class AgentInfo:
+    """A registered agent and the capacity it last reported."""
+
+    def __init__(self, name: str, url: str, capacity: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.url = url.rstrip("/")
+        self.capacity = capacity or {}
+        self.last_seen = time.monotonic()
+
+    @property
+    def weight(self) -> float:
+        """Relative share of a test this agent should run: its idle CPUs."""
+        cpus = self.capacity.get("cpus") or 1
+        load = self.capacity.get("load") or 0
+        return max(cpus - load, 1)
+
+    def ws_url(self, path: str) -> str:
+        """WebSocket URL of an agent endpoint."""
+        url = self.url.replace("https://", "wss://", 1).replace("http://", "ws://", 1) + path
+        if settings.AGENT_TOKEN:
+            url += "?" + urlencode({"token": settings.AGENT_TOKEN})
+        return url
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "url": self.url,
+            "capacity": self.capacity,
+            "weight": self.weight,
+            "last_seen": round(time.monotonic() - self.last_seen, 1),
+        }
+
+
+class AgentRegistry:
+    """
+    Agents that announced themselves with a heartbeat.
+
+    Agents re-register every AGENT_HEARTBEAT_INTERVAL seconds; one that has
+    not been heard from for AGENT_TIMEOUT seconds is no longer offered to
+    new runs.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout or settings.AGENT_TIMEOUT
+        self._agents: Dict[str, AgentInfo] = {}
+
+    def register(self, name: str, url: str, capacity: Optional[Dict[str, Any]] = None) -> AgentInfo:
+        """Add an agent or refresh its heartbeat and capacity."""
+        agent = self._agents.get(name)
+        if agent and agent.url == url.rstrip("/"):
+            agent.capacity = capacity or agent.capacity
+            agent.last_seen = time.monotonic()
+        else:
+            agent = self._agents[name] = AgentInfo(name, url, capacity)
+        return agent
+
+    def remove(self, name: str) -> bool:
+        """Forget an agent. False if it was not registered."""
+        return self._agents.pop(name, None) is not None
+
+    def available(self) -> List[AgentInfo]:
+        """Agents with a recent heartbeat, by name."""
+        now = time.monotonic()
+        for name, agent in list(self._agents.items()):
+            if now - agent.last_seen > self.timeout:
+                del self._agents[name]
+        return sorted(self._agents.values(), key=lambda agent: agent.name)
+
+    def workers(self) -> List["RemoteSegmentWorker"]:
+        """One worker per available agent."""
+        return [RemoteSegmentWorker(agent) for agent in self.available()]
+
+
+class RemoteSegmentWorker(SegmentWorker):
+    """
+    Runs one segment on an agent.
+
+    The script (or its K6 archive) goes to the agent over a WebSocket as a
+    binary frame after the run request; the agent answers with its K6
+    output lines as JSON text frames and the bytes of its result file as
+    binary frames, which are written to `result_file` here so the executor
+    tails it exactly like the output of a local process.
+    """
+
+    def __init__(self, agent: AgentInfo):
+        self.agent = agent
+        self._websocket = None
+        self._stop_requested = False
+
+    def describe(self) -> str:
+        return self.agent.name
+
+    async def run(
+        self,
+        script_path: str,
+        result_file: str,
+        on_line: Callable[[str], Any],
+        segment: Optional[str] = None,
+        sequence: Optional[str] = None,
+    ) -> int:
+        with open(script_path, "rb") as f:
+            script = f.read()
+
+        try:
+            async with websockets.connect(self.agent.ws_url("/run"), max_size=None) as websocket:
+                self._websocket = websocket
+                await websocket.send(json.dumps({
+                    "action": "run",
+                    "script_name": os.path.basename(script_path),
+                    "segment": segment,
+                    "sequence": sequence,
+                    "compression": "gzip" if result_file.endswith(".gz") else "none",
+                }))
+                await websocket.send(script)
+                # stop() came while connecting
+                if self._stop_requested:
+                    await _send_stop(websocket)
+                await on_line(f"[INFO] Running on agent {self.agent.name} ({self.agent.url})")
+
+                with open(result_file, "wb") as out:
+                    async for message in websocket:
+                        if isinstance(message, bytes):
+                            out.write(message)
+                            # The executor's tailer reads the file by path
+                            out.flush()
+                            continue
+
+                        data = json.loads(message)
+                        if data.get("type") == "lines":
+                            for line in data.get("lines", []):
+                                await on_line(line)
+                        elif data.get("type") == "exit":
+                            return int(data.get("code", 1))
+                        elif data.get("type") == "error":
+                            raise RuntimeError(f"Agent {self.agent.name}: {data.get('message')}")
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            raise RuntimeError(f"Agent {self.agent.name} unreachable: {e}")
+        finally:
+            self._websocket = None
+
+        raise RuntimeError(f"Agent {self.agent.name} closed the connection before K6 finished")
+
+    def stop(self):
+        """Forward the stop to the agent, which stops its K6 the same way a local stop does."""
+        self._stop_requested = True
+        websocket = self._websocket
+        if websocket:
+            asyncio.get_running_loop().create_task(_send_stop(websocket))
+
+
+async def _send_stop(websocket):
+    try:
+        await websocket.send(json.dumps({"action": "stop"}))
+    except websockets.exceptions.WebSocketException:
+        pass
@@ -0,0 +1,473 @@
+"""Vectorized bulk parsing of K6 NDJSON result files."""
+import mmap
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Iterator, List, BinaryIO, Tuple, Dict
+
+import numpy as np
+import orjson
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .result_parser import ResultAggregator, open_result_file
+
+
+# Bytes read per chunk; each chunk is cut back to its last complete line
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Below this size a process pool costs more than it saves
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+
+# K6 writes Point lines in one of two fixed layouts:
+#   {"type":"Point","data":{"time":"...","value":1,"tags":{...}},"metric":"http_reqs"}
+#   {"metric":"http_reqs","type":"Point","data":{"time":"...","value":1,"tags":{...}}}
+# The fast path locates fields by byte offset in NumPy; any line that does
+# not match exactly goes through the JSON decoder instead.
+_TYPE_FIRST_PREFIX = np.frombuffer(b'{"type":"Point","data":{"time":"', dtype=np.uint8)
+_METRIC_FIRST_PREFIX = np.frombuffer(b'{"metric":"', dtype=np.uint8)
+_METRIC_FIRST_INFIX = np.frombuffer(b'","type":"Point","data":{"time":"', dtype=np.uint8)
+_VALUE_INFIX = np.frombuffer(b'","value":', dtype=np.uint8)
+_METRIC_SUFFIX = np.frombuffer(b'"metric":"', dtype=np.uint8)
+_TAGS_INFIX = np.frombuffer(b',"tags":', dtype=np.uint8)
+
+# Window widths (bytes) for each field
+_WINDOW_WIDTH = 64
+_TIME_WIDTH = 40
+_VALUE_WIDTH = 32
+_TAIL_WIDTH = 64
+_METRIC_WIDTH = 48
+
+_QUOTE, _COLON, _COMMA, _BRACE_CLOSE, _NEWLINE = (ord(c) for c in '":,}\n')
+
+# Multipliers for hashing metric names into a single 64-bit key
+_NAME_HASH_WEIGHTS = np.random.default_rng(6).integers(1, 2 ** 63, _METRIC_WIDTH // 8, dtype=np.uint64)
+
+
+class PointColumns:
+    """Typed columns for the Point entries of a chunk of K6 output."""
+
+    def __init__(
+        self,
+        metric_names: List[str],
+        metric_ids: np.ndarray,
+        time_us: np.ndarray,
+        time_valid: np.ndarray,
+        values: np.ndarray,
+        tags: Optional[List[bytes]] = None,
+    ):
+        self.metric_names = metric_names  # metric id -> metric name
+        self.metric_ids = metric_ids      # int32 per point
+        self.time_us = time_us            # int64 epoch microseconds per point
+        self.time_valid = time_valid      # bool, False where the timestamp was unparsable
+        self.values = values              # float64 per point
+        self.tags = tags                  # raw JSON of each point's tags (only if requested)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def parse_result_file(result_file: str, aggregator: Optional[ResultAggregator] = None) -> ResultAggregator:
+    """Parse a whole result file into a ResultAggregator, chunk by chunk."""
+    aggregator = aggregator or ResultAggregator()
+    with open_result_file(result_file) as f:
+        for chunk in iter_chunks(f):
+            aggregator.feed_columns(decode_points(chunk))
+    return aggregator
+
+
+def parse_result_file_parallel(result_file: str, workers: int) -> ResultAggregator:
+    """
+    Parse a result file on several cores.
+
+    The file is memory-mapped and split at newline boundaries into byte
+    ranges; each range is parsed in a worker process into a partial
+    ResultAggregator, and the partials are merged in file order. Gzip
+    output cannot be split and is parsed serially.
+
+    Workers are spawned, not forked: this runs in a thread of the server
+    process, and a fork would copy its locks and event loop state.
+    """
+    if (
+        workers <= 1
+        or result_file.endswith(".gz")
+        or os.path.getsize(result_file) < PARALLEL_MIN_BYTES
+    ):
+        return parse_result_file(result_file)
+
+    ranges = split_line_ranges(result_file, workers)
+    aggregator = ResultAggregator()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for partial in pool.map(_parse_range, [result_file] * len(ranges), *zip(*ranges)):
+            aggregator.merge(partial)
+    return aggregator
+
+
+def split_line_ranges(result_file: str, parts: int) -> List[Tuple[int, int]]:
+    """Split a file into about `parts` (start, end) byte ranges that begin on line starts."""
+    size = os.path.getsize(result_file)
+    if size == 0:
+        return []
+
+    with open(result_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = [0]
+        for i in range(1, parts):
+            newline = mm.find(b"\n", max(size * i // parts, bounds[-1]))
+            if newline < 0:
+                break
+            if newline + 1 > bounds[-1]:
+                bounds.append(newline + 1)
+        if bounds[-1] < size:
+            bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_range(result_file: str, start: int, end: int) -> ResultAggregator:
+    """Worker: parse one byte range of a memory-mapped result file."""
+    aggregator = ResultAggregator()
+    with open(result_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            position = start
+            while position < end:
+                chunk_end = min(position + CHUNK_SIZE, end)
+                if chunk_end < end:
+                    cut = mm.rfind(b"\n", position, chunk_end)
+                    if cut < 0:
+                        # Single line longer than the chunk size
+                        cut = mm.find(b"\n", chunk_end, end)
+                    chunk_end = end if cut < 0 else cut + 1
+                chunk = view[position:chunk_end]
+                aggregator.feed_columns(decode_points(chunk))
+                chunk.release()
+                position = chunk_end
+        finally:
+            view.release()
+    return aggregator
+
+
+def iter_chunks(f: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[memoryview]:
+    """
+    Read a binary stream in large blocks that always end on a line boundary.
+
+    The unfinished last line of a block is carried over to the next one, so
+    non-seekable streams such as gzip readers work too.
+
+    Args:
+        f: File or stream opened in binary mode, positioned at a line start
+        chunk_size: Approximate bytes per chunk
+    """
+    rest = b""
+    while True:
+        block = f.read(chunk_size)
+        if not block:
+            if rest:
+                yield memoryview(rest)
+            return
+        if rest:
+            block = rest + block
+
+        cut = block.rfind(b"\n")
+        if cut < 0:
+            # Single line longer than the chunk size
+            rest = block
+            continue
+        rest = block[cut + 1:]
+        yield memoryview(block)[:cut + 1]
+
+
+def decode_points(chunk, with_tags: bool = False) -> PointColumns:
+    """
+    Decode all Point lines of a chunk (bytes-like, whole lines) into typed columns.
+
+    With `with_tags`, also return the raw JSON object of every point's tags
+    (b"" when a point has none).
+    """
+    buf = np.frombuffer(chunk, dtype=np.uint8)
+    if len(buf) == 0:
+        return _empty_columns()
+    ends = np.flatnonzero(buf == _NEWLINE)
+    if buf[-1] != _NEWLINE:
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    points = _decode_fast(buf, starts, ends)
+
+    # Lines the fast path could not read (Metric definitions, other layouts)
+    leftover = np.ones(len(starts), dtype=bool)
+    leftover[points["row"]] = False
+    leftover = np.flatnonzero(leftover & (ends > starts))
+    slow_tags: List[bytes] = []
+    if len(leftover):
+        slow, slow_tags = _decode_slow(chunk, starts[leftover], ends[leftover])
+        if len(slow["row"]):
+            slow["row"] = leftover[slow["row"]]
+            # Keep file order so "last value" metrics stay correct
+            order = np.argsort(np.concatenate((points["row"], slow["row"])), kind="stable")
+            points = {key: np.concatenate((points[key], slow[key]))[order] for key in points}
+
+    if len(points["row"]) == 0:
+        return _empty_columns()
+
+    # Only a handful of distinct names: group rows by a hash of the name bytes
+    hashes = np.ascontiguousarray(points["metric"]).view(np.uint64) @ _NAME_HASH_WEIGHTS
+    _, first, metric_ids = np.unique(hashes, return_index=True, return_inverse=True)
+    metric_names = [points["metric"][i].tobytes().rstrip(b"\0").decode() for i in first]
+
+    tags = None
+    if with_tags:
+        # Negative starts index the tags serialized by the slow path
+        data = chunk if isinstance(chunk, bytes) else bytes(chunk)
+        tags = [
+            data[start:end] if start >= 0 else slow_tags[-start - 1]
+            for start, end in zip(points["tag_start"].tolist(), points["tag_end"].tolist())
+        ]
+
+    time_us, time_valid = parse_times_us(points["time"], points["time_length"])
+    return PointColumns(
+        metric_names=metric_names,
+        metric_ids=metric_ids.astype(np.int32),
+        time_us=time_us,
+        time_valid=time_valid,
+        values=points["value"],
+        tags=tags,
+    )
+
+
+def parse_times_us(raw: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized RFC3339 parsing to epoch microseconds.
+
+    Args:
+        raw: uint8 matrix, one timestamp per row (at least 26 wide)
+        lengths: Timestamp length per row
+
+    Handles K6's 2024-01-01T12:00:00.123456789+08:00 and ...Z forms with
+    0-9 fraction digits. Returns (time_us, valid_mask).
+    """
+    n, width = raw.shape
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+
+    rows = np.arange(n)
+
+    def digit(column) -> np.ndarray:
+        values = raw[:, column] if isinstance(column, int) else raw[rows, column]
+        return values.astype(np.int64) - 48
+
+    def number(start: int, count: int) -> np.ndarray:
+        result = digit(start)
+        for i in range(start + 1, start + count):
+            result = result * 10 + digit(i)
+        return result
+
+    year = number(0, 4)
+    month = number(5, 2)
+    day = number(8, 2)
+    seconds_of_day = number(11, 2) * 3600 + number(14, 2) * 60 + number(17, 2)
+
+    # Timezone: trailing 'Z' or +HH:MM / -HH:MM
+    is_utc = raw[rows, np.clip(lengths - 1, 0, width - 1)] == ord("Z")
+    tz_start = np.where(is_utc, lengths - 1, lengths - 6)
+    tz_index = np.clip(tz_start, 0, width - 6)
+    tz_char = raw[rows, tz_index]
+    tz_sign = np.where(tz_char == ord("-"), -1, 1)
+    tz_hours = digit(tz_index + 1) * 10 + digit(tz_index + 2)
+    tz_minutes = digit(tz_index + 4) * 10 + digit(tz_index + 5)
+    offset = np.where(is_utc, 0, tz_sign * (tz_hours * 3600 + tz_minutes * 60))
+
+    # Fraction digits run from column 20 up to the timezone, truncated to microseconds
+    has_fraction = raw[:, 19] == ord(".")
+    fraction = np.zeros(n, dtype=np.int64)
+    for i in range(20, 26):
+        present = has_fraction & (i < tz_start)
+        fraction = fraction * 10 + np.where(present, digit(i), 0)
+
+    epoch_seconds = _days_from_civil(year, month, day) * 86400 + seconds_of_day - offset
+
+    valid = (
+        (lengths >= 20)
+        & (raw[:, 4] == ord("-")) & (raw[:, 10] == ord("T")) & (raw[:, 13] == ord(":"))
+        & (is_utc | (tz_char == ord("+")) | (tz_char == ord("-")))
+    )
+    return epoch_seconds * 1_000_000 + fraction, valid
+
+
+def _decode_fast(buf: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> Dict[str, np.ndarray]:
+    """Locate metric, time and value of every line in a known layout by byte offset."""
+    # Zero padding on both sides lets fixed-width windows run past line and chunk edges
+    padded = np.concatenate((
+        np.zeros(_TAIL_WIDTH, dtype=np.uint8), buf, np.zeros(_WINDOW_WIDTH, dtype=np.uint8)
+    ))
+    windows = sliding_window_view(padded, _WINDOW_WIDTH)
+    starts = starts + _TAIL_WIDTH
+    ends = ends + _TAIL_WIDTH
+
+    # The 32 byte type-first prefix compares as four 64-bit words
+    prefix = np.ascontiguousarray(windows[starts, :len(_TYPE_FIRST_PREFIX)])
+    type_first = np.flatnonzero(
+        (prefix.view(np.uint64) == _TYPE_FIRST_PREFIX.view(np.uint64)).all(axis=1)
+    )
+    metric_first = np.flatnonzero(
+        (prefix[:, :len(_METRIC_FIRST_PREFIX)] == _METRIC_FIRST_PREFIX).all(axis=1)
+    )
+
+    # Type-first layout: the line ends with ,"metric":"<name>"}
+    tail_at = ends[type_first] - _TAIL_WIDTH
+    tail = windows[tail_at, :_TAIL_WIDTH]
+    colon = _TAIL_WIDTH - 1 - np.argmax(tail[:, ::-1] == _COLON, axis=1)
+    tf_metric_at = tail_at + colon - (len(_METRIC_SUFFIX) - 2)
+    tf_ok = (
+        (tail[:, -1] == _BRACE_CLOSE) & (tail[:, -2] == _QUOTE)
+        & _matches(windows, tf_metric_at, _METRIC_SUFFIX)
+    )
+    # ...,"tags":{...}},"metric":"<name>"}
+    tf_data_end = tf_metric_at - 2
+    tf_name_at = tail_at + colon + 2
+    tf_name_length = _TAIL_WIDTH - 2 - (colon + 2)
+    tf_time_at = starts[type_first] + len(_TYPE_FIRST_PREFIX)
+
+    # Metric-first layout: the name runs from byte 11 to the next quote
+    mf_name_at = starts[metric_first] + len(_METRIC_FIRST_PREFIX)
+    mf_name_length = np.argmax(windows[mf_name_at, :_METRIC_WIDTH + 1] == _QUOTE, axis=1)
+    mf_ok = (mf_name_length > 0) & _matches(windows, mf_name_at + mf_name_length, _METRIC_FIRST_INFIX)
+    mf_time_at = mf_name_at + mf_name_length + len(_METRIC_FIRST_INFIX)
+    # ...,"tags":{...}}}
+    mf_data_end = ends[metric_first] - 2
+
+    row = np.concatenate((type_first[tf_ok], metric_first[mf_ok]))
+    name_at = np.concatenate((tf_name_at[tf_ok], mf_name_at[mf_ok]))
+    name_length = np.concatenate((tf_name_length[tf_ok], mf_name_length[mf_ok]))
+    time_at = np.concatenate((tf_time_at[tf_ok], mf_time_at[mf_ok]))
+    data_end = np.concatenate((tf_data_end[tf_ok], mf_data_end[mf_ok]))
+    if len(type_first) and len(metric_first):
+        order = np.argsort(row, kind="stable")
+        row, name_at, name_length = row[order], name_at[order], name_length[order]
+        time_at, data_end = time_at[order], data_end[order]
+
+    # "time":"<timestamp>","value":<number>
+    time_raw = windows[time_at, :_TIME_WIDTH]
+    time_length = np.argmax(time_raw == _QUOTE, axis=1)
+    value_at = time_at + time_length + len(_VALUE_INFIX)
+    value_raw = windows[value_at, :_VALUE_WIDTH]
+    value_length = np.argmax((value_raw == _COMMA) | (value_raw == _BRACE_CLOSE), axis=1)
+
+    ok = np.flatnonzero(
+        (name_length > 0) & (name_length <= _METRIC_WIDTH)
+        & (time_length > 0)
+        & _matches(windows, time_at + time_length, _VALUE_INFIX)
+        & (value_length > 0)
+        & (value_at + value_length < ends[row])
+    )
+
+    # Tags run from after "tags": to the end of the data object
+    value_end = value_at + value_length
+    has_tags = _matches(windows, value_end, _TAGS_INFIX)
+    tag_start = np.where(has_tags, value_end + len(_TAGS_INFIX), data_end) - _TAIL_WIDTH
+    tag_end = np.maximum(data_end - _TAIL_WIDTH, tag_start)
+
+    return {
+        "row": row[ok],
+        "metric": windows[name_at[ok], :_METRIC_WIDTH] * _below(name_length[ok], _METRIC_WIDTH),
+        "time": time_raw[ok],
+        "time_length": time_length[ok],
+        "value": _parse_values(value_raw[ok], value_length[ok]),
+        "tag_start": tag_start[ok],
+        "tag_end": tag_end[ok],
+    }
+
+
+def _decode_slow(chunk, starts: np.ndarray, ends: np.ndarray) -> Tuple[Dict[str, np.ndarray], List[bytes]]:
+    """
+    Decode individual lines with the JSON parser and collect Point fields.
+
+    Tags are re-serialized into a side list; the k-th entry is referenced by
+    tag_start == -(k + 1).
+    """
+    found_rows, metrics, times, values, tags = [], [], [], [], []
+    for row, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        try:
+            entry = orjson.loads(chunk[start:end])
+        except orjson.JSONDecodeError:
+            continue
+        if not isinstance(entry, dict) or entry.get("type") != "Point":
+            continue
+        point = entry.get("data") or {}
+        try:
+            value = float(point.get("value") or 0)
+        except (TypeError, ValueError):
+            value = 0.0
+
+        found_rows.append(row)
+        metrics.append(str(entry.get("metric")).encode()[:_METRIC_WIDTH])
+        times.append(str(point.get("time", "")).encode()[:_TIME_WIDTH])
+        values.append(value)
+        tags.append(orjson.dumps(point["tags"]) if point.get("tags") else b"")
+
+    return {
+        "row": np.array(found_rows, dtype=np.int64),
+        "metric": _byte_matrix(metrics, _METRIC_WIDTH),
+        "time": _byte_matrix(times, _TIME_WIDTH),
+        "time_length": np.array([len(text) for text in times], dtype=np.int64),
+        "value": np.array(values, dtype=np.float64),
+        "tag_start": -np.arange(1, len(found_rows) + 1, dtype=np.int64),
+        "tag_end": np.zeros(len(found_rows), dtype=np.int64),
+    }, tags
+
+
+def _matches(windows: np.ndarray, at: np.ndarray, literal: np.ndarray) -> np.ndarray:
+    """Whether `literal` occurs at each offset."""
+    return (windows[at, :len(literal)] == literal).all(axis=1)
+
+
+def _below(lengths: np.ndarray, width: int) -> np.ndarray:
+    """uint8 mask, one row per length, with ones before the length."""
+    return (np.arange(width) < lengths[:, None]).astype(np.uint8)
+
+
+def _byte_matrix(items: List[bytes], width: int) -> np.ndarray:
+    """Zero-padded uint8 matrix of byte strings."""
+    return np.array(items, dtype=f"S{width}").view(np.uint8).reshape(len(items), width)
+
+
+def _days_from_civil(year: np.ndarray, month: np.ndarray, day: np.ndarray) -> np.ndarray:
+    """Days since 1970-01-01 of a proleptic Gregorian date (vectorized)."""
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def _parse_values(raw: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Convert raw value tokens (uint8 rows cut at `lengths`) to float64."""
+    values = np.zeros(len(raw), dtype=np.float64)
+
+    # Counters and rates are single digits, which skip string conversion
+    first = raw[:, 0]
+    single = (lengths == 1) & (first >= ord("0")) & (first <= ord("9"))
+    values[single] = first[single] - ord("0")
+
+    rest = np.flatnonzero(~single)
+    if len(rest) == 0:
+        return values
+    text = (raw[rest] * _below(lengths[rest], raw.shape[1])).view(f"S{raw.shape[1]}").ravel()
+    try:
+        values[rest] = text.astype(np.float64)
+    except ValueError:
+        for i, value in zip(rest.tolist(), text.tolist()):
+            try:
+                values[i] = float(value)
+            except ValueError:
+                pass
+    return values
+
+
+def _empty_columns() -> PointColumns:
+    return PointColumns(
+        metric_names=[],
+        metric_ids=np.zeros(0, dtype=np.int32),
+        time_us=np.zeros(0, dtype=np.int64),
+        time_valid=np.zeros(0, dtype=bool),
+        values=np.zeros(0, dtype=np.float64),
+    )
@@ -0,0 +1,404 @@
+"""Content-addressed storage of uploaded CSV data files, pre-parsed into JSON shards."""
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Optional, List, Dict, Any, BinaryIO, TextIO
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models import TestConfig
+
+
+# Bumped when the shard or manifest layout changes
+MANIFEST_VERSION = 1
+
+# Delimiters tried when sniffing a CSV (same candidates as Papa Parse)
+DELIMITERS = ",\t|;"
+
+# Bytes of the file the delimiter is guessed from
+SNIFF_SIZE = 64 * 1024
+
+# Bytes read from an upload at a time
+CHUNK_SIZE = 1024 * 1024
+
+# Name prefix of uploads still being written
+TEMPORARY_PREFIX = ".upload-"
+
+# Validation errors listed before giving up on a file
+MAX_ERRORS = 5
+
+# How generated scripts hand out data rows (see K6ScriptGenerator.generate)
+DATA_DISTRIBUTIONS = ("round-robin", "per-vu")
+
+
+# Serializes moving uploads into place and deleting files
+_store_lock = threading.RLock()
+
+
+class DataLimitExceeded(ValueError):
+    """An upload over DATA_UPLOAD_MAX_BYTES, or one that does not fit in DATA_QUOTA_BYTES."""
+
+
+def shards_dir(data_file: str) -> str:
+    """Directory holding the shards and manifest of a data file."""
+    return data_file + ".parts"
+
+
+def manifest_path(data_file: str) -> str:
+    """Location of the manifest of a data file."""
+    return os.path.join(shards_dir(data_file), "manifest.json")
+
+
+def load_manifest(data_file: str) -> Optional[Dict[str, Any]]:
+    """
+    Manifest of an ingested data file, None if it was never ingested.
+
+    Shard entries get an absolute `path` added, ready to open() from a script.
+    """
+    try:
+        with open(manifest_path(data_file), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    directory = shards_dir(data_file)
+    for shard in manifest["shards"]:
+        shard["path"] = os.path.join(directory, shard["file"])
+    return manifest
+
+
+def ingest_existing(data_file: str, shard_rows: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Manifest of a stored data file, ingesting the file first if needed.
+
+    Files saved before uploads were ingested (including those converted to
+    `<file>.json` rows by earlier versions) have no shards; they are parsed
+    here once, the same way as an upload, and keep their name.
+
+    Raises:
+        FileNotFoundError: If the data file does not exist
+        ValueError: If the file is not valid UTF-8 CSV with a header and at least one row
+    """
+    manifest = load_manifest(data_file)
+    if manifest is not None:
+        return manifest
+    shard_rows = shard_rows or settings.DATA_SHARD_ROWS
+
+    with _store_lock:
+        # Another run may have ingested it meanwhile
+        manifest = load_manifest(data_file)
+        if manifest is not None:
+            return manifest
+        temporary_parts = shards_dir(
+            os.path.join(os.path.dirname(data_file), f"{TEMPORARY_PREFIX}{uuid.uuid4().hex}.tmp")
+        )
+        os.makedirs(temporary_parts)
+        try:
+            with open(data_file, "r", encoding="utf-8-sig", newline="") as f:
+                try:
+                    manifest = _write_shards(f, temporary_parts, shard_rows)
+                except UnicodeDecodeError:
+                    raise ValueError("CSV file must be UTF-8 encoded")
+            digest = hashlib.sha256()
+            with open(data_file, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            manifest["sha256"] = digest.hexdigest()
+            manifest["bytes"] = os.path.getsize(data_file)
+            with open(os.path.join(temporary_parts, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            shutil.rmtree(shards_dir(data_file), ignore_errors=True)
+            os.replace(temporary_parts, shards_dir(data_file))
+        finally:
+            shutil.rmtree(temporary_parts, ignore_errors=True)
+    return load_manifest(data_file)
+
+
+def data_dependencies(data_file: Optional[str]) -> List[str]:
+    """Files a script built for this data file reads: the CSV and its manifest."""
+    return [data_file, manifest_path(data_file)] if data_file else []
+
+
+def store_upload(
+    source: BinaryIO,
+    data_dir: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    quota_bytes: Optional[int] = None,
+    shard_rows: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Save an uploaded CSV under the SHA-256 of its content and ingest it.
+
+    The upload is read once, in chunks: each chunk is hashed, copied to a
+    temporary file and fed to the CSV parser, which validates the rows and
+    writes them as JSON shards (rows become arrays of strings, column names
+    are stored once in the manifest, empty lines are skipped) so a K6
+    process loads only the shards covering its part of the data with
+    JSON.parse instead of parsing the whole CSV. The file then becomes
+    `<sha256>.csv` with its shards in `<sha256>.csv.parts/`; if that
+    content is already stored, the copy is dropped and the existing file is
+    returned, so identical uploads share one file.
+
+    Returns:
+        {"path", "sha256", "bytes", "rows", "columns", "deduplicated"}
+
+    Raises:
+        DataLimitExceeded: If the file is over `max_bytes` or does not fit the quota
+        ValueError: If the file is not valid UTF-8 CSV with a header and at least one row
+    """
+    data_dir = data_dir or settings.DATA_DIR
+    max_bytes = settings.DATA_UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    quota_bytes = settings.DATA_QUOTA_BYTES if quota_bytes is None else quota_bytes
+    shard_rows = shard_rows or settings.DATA_SHARD_ROWS
+
+    temporary = os.path.join(data_dir, f"{TEMPORARY_PREFIX}{uuid.uuid4().hex}.tmp")
+    temporary_parts = shards_dir(temporary)
+    os.makedirs(temporary_parts)
+    try:
+        digest = hashlib.sha256()
+        with open(temporary, "wb") as copy:
+            reader = _HashingReader(source, copy, digest, max_bytes)
+            text = io.TextIOWrapper(io.BufferedReader(reader, CHUNK_SIZE), encoding="utf-8-sig", newline="")
+            try:
+                manifest = _write_shards(text, temporary_parts, shard_rows)
+            except UnicodeDecodeError:
+                raise ValueError("CSV file must be UTF-8 encoded")
+            # Trailing empty lines the parser had no need to read still count for the hash
+            while reader.read(CHUNK_SIZE):
+                pass
+
+        key = digest.hexdigest()
+        manifest["sha256"] = key
+        manifest["bytes"] = reader.size
+        path = os.path.join(data_dir, f"{key}.csv")
+
+        # Uploads run in threads; only one at a time may move files into place
+        with _store_lock:
+            deduplicated = load_manifest(path) is not None
+            if deduplicated:
+                os.utime(path)  # Recently used: not garbage yet
+            else:
+                _ensure_quota(data_dir, _tree_size(temporary) + _tree_size(temporary_parts), quota_bytes)
+                with open(os.path.join(temporary_parts, "manifest.json"), "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, ensure_ascii=False)
+                shutil.rmtree(shards_dir(path), ignore_errors=True)
+                os.replace(temporary_parts, shards_dir(path))
+                os.replace(temporary, path)
+    finally:
+        shutil.rmtree(temporary_parts, ignore_errors=True)
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+    return {
+        "path": path,
+        "sha256": key,
+        "bytes": manifest["bytes"],
+        "rows": manifest["rows"],
+        "columns": manifest["columns"],
+        "deduplicated": deduplicated,
+    }
+
+
+def usage(data_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Data files stored and the space they take (shards included), against the quota."""
+    data_dir = data_dir or settings.DATA_DIR
+    return {
+        "files": len(_data_files(data_dir)),
+        "bytes": _stored_bytes(data_dir),
+        "quota_bytes": settings.DATA_QUOTA_BYTES,
+    }
+
+
+def collect_garbage(data_dir: Optional[str] = None, min_age: Optional[float] = None) -> Dict[str, int]:
+    """
+    Delete data files no test config refers to.
+
+    Every run creates a test config holding its data file, so a file that no
+    config mentions is not used by a saved config, a queued run or a past
+    execution. Files modified (uploaded, or uploaded again as a duplicate)
+    within `min_age` seconds are kept, as they are usually about to be used.
+
+    Returns:
+        {"files": deleted files, "bytes": space freed}
+    """
+    data_dir = data_dir or settings.DATA_DIR
+    min_age = settings.DATA_GC_MIN_AGE if min_age is None else min_age
+    with SessionLocal() as db:
+        # Configs store the path of the file; compare names so moved installs still match
+        referenced = {
+            os.path.basename(path)
+            for (path,) in db.query(TestConfig.data_file).filter(TestConfig.data_file.isnot(None)).distinct()
+        }
+
+    now = time.time()
+    deleted = freed = 0
+    with _store_lock:
+        for entry in _data_files(data_dir):
+            if entry.name in referenced or now - entry.stat().st_mtime < min_age:
+                continue
+            size = _tree_size(entry.path) + _tree_size(shards_dir(entry.path))
+            shutil.rmtree(shards_dir(entry.path), ignore_errors=True)
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            deleted += 1
+            freed += size
+        # Leftovers of interrupted uploads
+        with os.scandir(data_dir) as it:
+            for entry in it:
+                if entry.name.startswith(TEMPORARY_PREFIX) and now - entry.stat().st_mtime >= min_age:
+                    freed += _tree_size(entry.path)
+                    if entry.is_dir():
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        os.remove(entry.path)
+    return {"files": deleted, "bytes": freed}
+
+
+class _HashingReader(io.RawIOBase):
+    """Reads an upload while hashing it, copying it to `sink` and enforcing a size limit."""
+
+    def __init__(self, source: BinaryIO, sink: BinaryIO, digest, max_bytes: int):
+        self.source = source
+        self.sink = sink
+        self.digest = digest
+        self.max_bytes = max_bytes
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.source.read(len(buffer))
+        if not data:
+            return 0
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise DataLimitExceeded(f"File is larger than the upload limit of {self.max_bytes} bytes")
+        self.digest.update(data)
+        self.sink.write(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _ensure_quota(data_dir: str, size: int, quota_bytes: int):
+    """Make room for `size` more bytes, collecting garbage if needed."""
+    if _stored_bytes(data_dir) + size <= quota_bytes:
+        return
+    # Called with _store_lock held; the lock is reentrant
+    collect_garbage(data_dir)
+    if _stored_bytes(data_dir) + size > quota_bytes:
+        raise DataLimitExceeded(f"Data file quota of {quota_bytes} bytes exceeded")
+
+
+def _data_files(data_dir: str) -> List[os.DirEntry]:
+    """Stored CSV files, not counting uploads in progress."""
+    with os.scandir(data_dir) as it:
+        return [
+            entry for entry in it
+            if entry.name.endswith(".csv") and not entry.name.startswith(TEMPORARY_PREFIX) and entry.is_file()
+        ]
+
+
+def _stored_bytes(data_dir: str) -> int:
+    """Size of the data directory without uploads in progress."""
+    total = 0
+    with os.scandir(data_dir) as it:
+        for entry in it:
+            if not entry.name.startswith(TEMPORARY_PREFIX):
+                total += _tree_size(entry.path)
+    return total
+
+
+def _tree_size(path: str) -> int:
+    """Bytes in a file, or in all files under a directory (0 if missing)."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def _write_shards(f: TextIO, directory: str, shard_rows: int) -> Dict[str, Any]:
+    """Parse CSV text into shard files in `directory`; returns the manifest."""
+    # Guess the delimiter from the first lines (completing the last one), then parse from the start
+    sample = f.read(SNIFF_SIZE)
+    sample += f.readline()
+    try:
+        # Blank lines (skipped below anyway) defeat the sniffer
+        lines = "".join(line for line in sample.splitlines(keepends=True) if line.strip())
+        delimiter = csv.Sniffer().sniff(lines, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ","
+
+    reader = csv.reader(itertools.chain(io.StringIO(sample, newline=""), f), delimiter=delimiter)
+    columns = next(reader, None)
+    if not columns or columns == [""]:
+        raise ValueError("CSV file is empty or has no header row")
+    errors = _check_columns(columns)
+
+    shards: List[Dict[str, Any]] = []
+    rows: List[List[str]] = []
+    total = 0
+
+    def flush():
+        name = f"part-{len(shards):05d}.json"
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as out:
+            json.dump(rows, out, ensure_ascii=False, separators=(",", ":"))
+        shards.append({"file": name, "start": total - len(rows), "rows": len(rows)})
+        rows.clear()
+
+    for row in reader:
+        if not row or row == [""]:
+            continue
+        if len(row) != len(columns):
+            errors.append(f"line {reader.line_num}: expected {len(columns)} fields, found {len(row)}")
+            if len(errors) >= MAX_ERRORS:
+                break
+            continue
+        rows.append(row)
+        total += 1
+        if len(rows) >= shard_rows:
+            flush()
+
+    if errors:
+        raise ValueError("Invalid CSV: " + "; ".join(errors[:MAX_ERRORS]))
+    if rows:
+        flush()
+    if not total:
+        raise ValueError("CSV file has no data rows")
+
+    return {
+        "version": MANIFEST_VERSION,
+        "columns": columns,
+        "delimiter": delimiter,
+        "rows": total,
+        "shards": shards,
+    }
+
+
+def _check_columns(columns: List[str]) -> List[str]:
+    """Problems with a header row: empty or repeated column names."""
+    errors = []
+    seen = set()
+    for index, name in enumerate(columns, 1):
+        if not name.strip():
+            errors.append(f"column {index} has no name")
+        elif name in seen:
+            errors.append(f"column '{name}' appears more than once")
+        seen.add(name)
+    return errors
@@ -0,0 +1,125 @@
+"""Slim execution summary rows for history listings, and their keyset pagination."""
+from typing import Optional, Dict, Any
+
+from sqlalchemy.orm import Session, joinedload, undefer, undefer_group
+
+from ..models import TestExecution, ExecutionSummary
+
+
+# Largest page a listing returns
+MAX_PAGE_SIZE = 500
+
+
+def sync(db: Session, execution: TestExecution) -> ExecutionSummary:
+    """
+    Write the summary row of an execution (insert or update) in the session.
+
+    Called wherever an execution is created or changes status, in the same
+    transaction, so listings never disagree with execution records. The
+    execution must have been flushed (it needs its id).
+    """
+    request = execution.run_request or {}
+    name = request.get("name")
+    url = request.get("url")
+    # Executions without a run request (older records) take them from their config
+    if not (name and url) and execution.config is not None:
+        name = name or execution.config.name
+        url = url or execution.config.url
+    result = execution.result_summary or {}
+    latency = result.get("http_req_duration") or {}
+    requests = result.get("http_reqs")
+    failed = result.get("http_req_failed")
+
+    duration = result.get("duration")
+    if duration is None and execution.start_time and execution.end_time:
+        duration = (execution.end_time - execution.start_time).total_seconds() * 1000
+
+    return db.merge(ExecutionSummary(
+        execution_id=execution.id,
+        config_id=execution.config_id,
+        name=(name or "")[:100] or None,
+        url=(url or "")[:500] or None,
+        status=execution.status,
+        script_hash=execution.script_hash,
+        created_at=execution.created_at,
+        start_time=execution.start_time,
+        end_time=execution.end_time,
+        duration_ms=duration,
+        http_reqs=requests,
+        rps=result.get("rps"),
+        p95=latency.get("p95"),
+        p99=latency.get("p99"),
+        error_rate=(failed or 0) / requests if requests else None,
+        verdict=(execution.regression or {}).get("verdict"),
+    ))
+
+
+def page(
+    db: Session,
+    limit: int = 50,
+    before: Optional[int] = None,
+    config_id: Optional[int] = None,
+    status: Optional[str] = None,
+    script_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    One page of execution summaries, newest first.
+
+    Keyset pagination on the execution id (ids grow with creation time):
+    `before` is the `next_cursor` of the previous page, so every page is an
+    index range scan no matter how deep into the history it is.
+
+    Returns:
+        {"items": [ExecutionSummary], "next_cursor": id to pass as `before`, None on the last page}
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(ExecutionSummary)
+    if config_id is not None:
+        query = query.filter(ExecutionSummary.config_id == config_id)
+    if status:
+        query = query.filter(ExecutionSummary.status == status)
+    if script_hash:
+        query = query.filter(ExecutionSummary.script_hash == script_hash)
+    if before is not None:
+        query = query.filter(ExecutionSummary.execution_id < before)
+
+    # One extra row tells whether there is a next page
+    rows = query.order_by(ExecutionSummary.execution_id.desc()).limit(limit + 1).all()
+    items = rows[:limit]
+    return {
+        "items": items,
+        "next_cursor": items[-1].execution_id if len(rows) > limit else None,
+    }
+
+
+def backfill(db: Session, batch_size: int = 500) -> int:
+    """
+    (Re)build the summary rows of all executions, in batches by id.
+
+    Returns:
+        Number of executions summarized
+    """
+    done = 0
+    last_id = 0
+    while True:
+        executions = (
+            db.query(TestExecution)
+            .options(
+                undefer(TestExecution.run_request),
+                undefer_group("results"),
+                joinedload(TestExecution.config),
+            )
+            .filter(TestExecution.id > last_id)
+            .order_by(TestExecution.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not executions:
+            return done
+        for execution in executions:
+            sync(db, execution)
+        last_id = executions[-1].id
+        done += len(executions)
+        db.commit()
+        # Keep the session small
+        db.expunge_all()
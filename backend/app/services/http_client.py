@@ -0,0 +1,187 @@
+"""Shared HTTP client for debug requests and quick probes."""
+import asyncio
+import time
+import zlib
+from collections import Counter
+from typing import Optional, Dict, Any, Set, Tuple
+
+import httpx
+
+from ..config import settings
+from .latency_sketch import LatencySketch
+
+
+# Response body characters returned by a debug request
+BODY_LIMIT = 10000
+
+# Bytes read before truncating: enough for BODY_LIMIT characters of UTF-8
+BODY_READ_LIMIT = BODY_LIMIT * 4
+
+# Distinct error messages reported by a probe
+MAX_PROBE_ERRORS = 10
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+# Clients of finished event loops being closed
+_closing: Set[asyncio.Task] = set()
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    The pooled client, created on first use.
+
+    Connections (HTTP/2 where the server offers it) are kept alive between
+    calls, so a debug request to a host that was recently contacted
+    measures the request rather than the TCP and TLS handshakes.
+
+    Certificates are not verified unless DEBUG_HTTP_VERIFY_TLS is set: the
+    debug tools are aimed at test environments, which commonly serve
+    self-signed certificates.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    # Pooled connections belong to the event loop that opened them
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        if _client is not None and not _client.is_closed:
+            _discard(_client, _client_loop)
+        _client_loop = loop
+        _client = httpx.AsyncClient(
+            http2=True,
+            verify=settings.DEBUG_HTTP_VERIFY_TLS,
+            timeout=settings.DEBUG_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.DEBUG_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.DEBUG_HTTP_MAX_CONNECTIONS,
+            ),
+        )
+    return _client
+
+
+def _discard(client: httpx.AsyncClient, client_loop: Optional[asyncio.AbstractEventLoop]):
+    """Close a client left behind by another event loop without waiting for it."""
+    if client_loop is not None and client_loop.is_running():
+        # Still serving another thread: its connections are closed there
+        asyncio.run_coroutine_threadsafe(_close_quietly(client), client_loop)
+    else:
+        task = asyncio.get_running_loop().create_task(_close_quietly(client))
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+
+
+async def _close_quietly(client: httpx.AsyncClient):
+    try:
+        await client.aclose()
+    except Exception:
+        # The connections died with their event loop; nothing left to release
+        pass
+
+
+async def close_client():
+    """Close the pooled client and its connections (on shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch(
+    method: str,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    body: Optional[str] = None,
+) -> Tuple[httpx.Response, bytes, bool, float]:
+    """
+    Send one request, reading at most BODY_READ_LIMIT bytes of the response.
+
+    Returns:
+        (response, body, truncated, duration in ms). The body is decompressed
+        if the server sent gzip despite the request for an uncompressed one;
+        truncated is set only when the response had more than BODY_READ_LIMIT
+        bytes (or decompressed to more).
+    """
+    # Force uncompressed response
+    headers = {**(headers or {}), "Accept-Encoding": "identity"}
+    start = time.perf_counter()
+    chunks = []
+    size = 0
+    truncated = False
+    async with get_client().stream(method, url, headers=headers, content=body or None) as response:
+        async for chunk in response.aiter_raw():
+            chunks.append(chunk)
+            size += len(chunk)
+            # One byte past the limit tells a longer body from one of exactly the limit
+            if size > BODY_READ_LIMIT:
+                # Leaving the block closes the response without reading the rest
+                truncated = True
+                break
+    duration = (time.perf_counter() - start) * 1000
+
+    content = b"".join(chunks)[:BODY_READ_LIMIT]
+    # Check for GZIP magic number (1f 8b) if not automatically handled
+    if content.startswith(b"\x1f\x8b"):
+        try:
+            # A decompressor object copes with a truncated stream
+            decompressor = zlib.decompressobj(wbits=31)
+            content = decompressor.decompress(content, BODY_READ_LIMIT)
+            truncated = truncated or bool(decompressor.unconsumed_tail)
+        except zlib.error:
+            pass
+    return response, content, truncated, duration
+
+
+async def probe(
+    method: str,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    body: Optional[str] = None,
+    requests: int = 100,
+    concurrency: int = 10,
+) -> Dict[str, Any]:
+    """
+    Send `requests` requests, `concurrency` at a time, as a pre-flight check.
+
+    Each latency covers the whole exchange including reading the body. The
+    first requests also pay for opening the pooled connections.
+
+    Returns:
+        Counts by outcome and status code, elapsed seconds, RPS and the
+        latency distribution in ms (avg/min/max/p50/p90/p95/p99/p999)
+    """
+    headers = headers or {}
+    sketch = LatencySketch()
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        client = get_client()
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                async with client.stream(method, url, headers=headers, content=body or None) as response:
+                    async for _ in response.aiter_raw():
+                        pass
+            except httpx.HTTPError as e:
+                errors[f"{type(e).__name__}: {e}"] += 1
+                continue
+            sketch.add((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    elapsed = time.perf_counter() - start
+
+    failed = sum(errors.values()) + sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "success": requests - failed,
+        "failed": failed,
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "errors": dict(errors.most_common(MAX_PROBE_ERRORS)),
+        "duration": round(elapsed, 3),
+        "rps": round(sketch.count / elapsed, 2) if elapsed > 0 else 0,
+        "latency": {key: round(value, 2) for key, value in sketch.stats().items()},
+    }
@@ -2,20 +2,46 @@
 import asyncio
 import json
 import os
-import subprocess
+import re
+import shutil
+import time
 from datetime import datetime
-from typing import Optional, Callable, Dict, Any
+from typing import Optional, Callable, Dict, Any, List, Sequence
 
 from ..config import settings
+from .. import metrics
+from .result_parser import ResultAggregator, ResultTailer, open_result_file
+from .log_sink import LogSink, log_path_for
+from .segment_worker import SegmentWorker, LocalSegmentWorker, segment_sequence
+from .script_cache import ScriptCache
+from .profiling import PhaseTimer, span
+from . import bulk_parser, time_series
+
+
+# Rates in K6 output, e.g. " 398.5/s" in "default   [  22% ] 050/100 VUs  1m02.3s/5m00s  49.2/s"
+_RATE = re.compile(r'\s(\d+\.?\d*)/s')
+
+# Cap on lines kept for the stdout JSON summary fallback
+MAX_SUMMARY_LINES = 10000
 
 
 class K6Executor:
-    """Execute K6 tests and stream output."""
+    """
+    Execute K6 tests and stream output.
+    
+    A test runs as one K6 process, or split into execution segments with one
+    SegmentWorker per segment. Each segment writes its own result file,
+    which is tailed separately; live metrics and the final summary come from
+    merging the per-segment aggregates, and the segment files are joined
+    into the single result file of the execution at the end.
+    """
     
     def __init__(self):
         self.k6_path = settings.K6_PATH
         self.results_dir = settings.RESULTS_DIR
-        self.current_process: Optional[subprocess.Popen] = None
+        self.workers: List[SegmentWorker] = []
+        # Set by stop(); a run stopped before its workers started never starts them
+        self.stopped = False
     
     async def run(
         self,
@@ -24,6 +50,13 @@ class K6Executor:
         on_log: Optional[Callable[[str], None]] = None,
         on_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
         on_error: Optional[Callable[[str], None]] = None,
+        on_metrics: Optional[Callable[[Dict[str, Any]], None]] = None,
+        segments: Optional[int] = None,
+        workers: Optional[List[SegmentWorker]] = None,
+        weights: Optional[Sequence[float]] = None,
+        archive: Optional[bool] = None,
+        dependencies: Sequence[str] = (),
+        timer: Optional[PhaseTimer] = None,
     ) -> Dict[str, Any]:
         """
         Run K6 test script.
@@ -34,173 +67,200 @@ class K6Executor:
             on_log: Callback for log messages
             on_complete: Callback when test completes
             on_error: Callback for errors
+            on_metrics: Callback for live aggregate metrics while running
+            segments: Number of local K6 processes (default K6_SEGMENTS)
+            workers: Workers to run the segments on, instead of local processes
+            weights: Relative segment sizes, one per worker (default equal)
+            archive: Run a `k6 archive` of the script (default K6_ARCHIVE)
+            dependencies: Files the script reads; the archive is rebuilt when they change
+            timer: Phase timer of the execution (k6.* and result.* spans, k6.first_output mark)
             
         Returns:
             Test result summary
         """
-        # Prepare result file path
+        # Prepare result file path (K6 gzips the JSON output when the name ends in .gz)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        result_file = os.path.join(
-            self.results_dir, 
-            f"result_{execution_id}_{timestamp}.json"
-        )
+        extension = ".json.gz" if settings.RESULT_COMPRESSION == "gzip" else ".json"
+        result_name = f"result_{execution_id}_{timestamp}"
+        result_file = os.path.join(self.results_dir, result_name + extension)
+        
+        if workers is None:
+            count = max(1, segments or settings.K6_SEGMENTS)
+            workers = [LocalSegmentWorker(self.k6_path) for _ in range(count)]
+        self.workers = workers
         
-        # Build command with --no-color for cleaner output
-        # Use --verbose for more detailed progress output
-        cmd = [
-            self.k6_path,
-            "run",
-            "--out", f"json={result_file}",
-            "--no-color",
-            script_path
-        ]
+        # Segment boundaries and per-segment output files
+        if len(workers) > 1:
+            bounds = segment_sequence(len(workers), weights)
+            sequence = ",".join(str(bound) for bound in bounds)
+            plan = [
+                (f"{bounds[i]}:{bounds[i + 1]}", os.path.join(self.results_dir, f"{result_name}_s{i}{extension}"))
+                for i in range(len(workers))
+            ]
+        else:
+            sequence = None
+            plan = [(None, result_file)]
+        segmented = sequence is not None
         
-        logs = []
+        # Bounded in memory, full log on disk
+        log_sink = LogSink(log_path_for(execution_id))
         result_summary = None
+        capturing_summary = False
+        summary_lines = []
+        max_log_rps = 0
         
-        try:
-            # Start K6 process with separate stdout and stderr
-            self.current_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                encoding='utf-8',
-                errors='replace'
-            )
+        # Follow the result files while K6 writes them
+        tailers = [ResultTailer(segment_file) for _, segment_file in plan]
+        tail_tasks = []
+        worker_tasks = []
+        publish_task = None
+        
+        async def handle_line(line: str):
+            """Record one output line and forward it to the log callback."""
+            nonlocal capturing_summary, max_log_rps
+            if timer:
+                timer.mark("k6.first_output")
+            log_sink.write(line)
             
-            if on_log:
-                await on_log(f"[INFO] Starting K6 test: {os.path.basename(script_path)}")
-                await on_log(f"[INFO] Command: {' '.join(cmd)}")
+            # Peak rate printed by K6 (often more accurate than avg per second);
+            # with several processes each only prints its own share
+            if not segmented:
+                scan_start = time.perf_counter()
+                for match in _RATE.findall(line):
+                    max_log_rps = max(max_log_rps, float(match))
+                if timer:
+                    timer.add("log.rate_scan", time.perf_counter() - scan_start)
             
-            # Read stdout and stderr concurrently
-            import threading
-            import queue
+            # Check if this is a progress line (contains VUs, iterations, etc.)
+            is_progress = any(keyword in line for keyword in [
+                'running', 'VUs', 'iterations', 'complete', 
+                'default', 'iters/s', 'reqs/s', '%'
+            ])
             
-            output_queue = queue.Queue()
+            # Check for JSON summary output (interleaved when there are several processes)
+            if not segmented and line.strip().startswith('{'):
+                capturing_summary = True
+            
+            if capturing_summary and len(summary_lines) < MAX_SUMMARY_LINES:
+                summary_lines.append(line)
+            
+            if on_log:
+                # Add progress indicator for progress lines
+                if is_progress and 'running' in line.lower():
+                    await on_log(f"[PROGRESS] {line}")
+                else:
+                    await on_log(line)
+        
+        def segment_handler(index: int):
+            """Line handler tagging the output of one segment."""
+            async def handle_segment_line(line: str):
+                await handle_line(f"[s{index}] {line}")
+            return handle_segment_line
+        
+        try:
+            if on_log:
+                await on_log(f"[INFO] Starting K6 test: {os.path.basename(script_path)}")
+                if segmented:
+                    await on_log(
+                        f"[INFO] Split into {len(workers)} execution segments: "
+                        + ", ".join(f"s{i}={segment}@{worker.describe()}"
+                                    for i, ((segment, _), worker) in enumerate(zip(plan, workers)))
+                    )
             
-            def read_stream(stream, stream_name):
-                """Read from a stream and put lines into the queue."""
+            # Bundled script: no module fetch or compile of imports at startup,
+            # and nothing for remote workers to resolve
+            if (settings.K6_ARCHIVE if archive is None else archive) and script_path.endswith(".js"):
+                cache = ScriptCache(os.path.dirname(script_path))
                 try:
-                    for line in iter(stream.readline, ''):
-                        if line:
-                            # Clean up progress lines (remove carriage returns)
-                            cleaned_line = line.rstrip('\r\n')
-                            if cleaned_line:
-                                output_queue.put((stream_name, cleaned_line))
-                except Exception as e:
-                    output_queue.put(('error', str(e)))
-                finally:
-                    output_queue.put((stream_name, None))  # Signal end
+                    with span(timer, "k6.archive"):
+                        script_path = await cache.archive(script_path, self.k6_path, dependencies)
+                    if on_log:
+                        await on_log(f"[INFO] Using archive: {os.path.basename(script_path)}")
+                except (RuntimeError, OSError) as e:
+                    if on_log:
+                        await on_log(f"[WARN] Could not build K6 archive, running the script directly: {e}")
             
-            # Start reader threads
-            stdout_thread = threading.Thread(
-                target=read_stream, 
-                args=(self.current_process.stdout, 'stdout')
-            )
-            stderr_thread = threading.Thread(
-                target=read_stream, 
-                args=(self.current_process.stderr, 'stderr')
-            )
+            # Stopped while the script or archive was being prepared
+            if self.stopped:
+                if on_log:
+                    await on_log("[INFO] Test cancelled before K6 started")
+                return {
+                    "success": False,
+                    "cancelled": True,
+                    "log_excerpt": log_sink.excerpt(),
+                    "log_file": log_sink.path,
+                }
             
-            stdout_thread.daemon = True
-            stderr_thread.daemon = True
-            stdout_thread.start()
-            stderr_thread.start()
+            if segmented:
+                tail_tasks = [asyncio.create_task(tailer.follow(None)) for tailer in tailers]
+                if on_metrics:
+                    publish_task = asyncio.create_task(_publish_merged(tailers, on_metrics))
+            else:
+                tail_tasks = [asyncio.create_task(tailers[0].follow(on_metrics))]
             
-            # Process output from both streams
-            capturing_summary = False
-            summary_lines = []
-            streams_closed = 0
-            last_progress_time = datetime.now()
+            worker_tasks = [
+                asyncio.create_task(worker.run(
+                    script_path,
+                    segment_file,
+                    segment_handler(i) if segmented else handle_line,
+                    segment=segment,
+                    sequence=sequence,
+                ))
+                for i, ((segment, segment_file), worker) in enumerate(zip(plan, workers))
+            ]
+            with span(timer, "k6.run"):
+                return_codes = await asyncio.gather(*worker_tasks)
             
-            while streams_closed < 2:
-                try:
-                    stream_name, line = output_queue.get(timeout=0.1)
-                    
-                    if line is None:
-                        streams_closed += 1
-                        continue
-                    
-                    logs.append(line)
-                    
-                    # Check if this is a progress line (contains VUs, iterations, etc.)
-                    is_progress = any(keyword in line for keyword in [
-                        'running', 'VUs', 'iterations', 'complete', 
-                        'default', 'iters/s', 'reqs/s', '%'
-                    ])
-                    
-                    # Check for JSON summary output
-                    if line.strip().startswith('{'):
-                        capturing_summary = True
-                    
-                    if capturing_summary:
-                        summary_lines.append(line)
-                    
-                    if on_log:
-                        # Add progress indicator for progress lines
-                        if is_progress and 'running' in line.lower():
-                            await on_log(f"[PROGRESS] {line}")
-                        else:
-                            await on_log(line)
-                    
-                except queue.Empty:
-                    # Check if process has ended
-                    if self.current_process.poll() is not None:
-                        # Give threads a moment to finish
-                        await asyncio.sleep(0.1)
-                        if output_queue.empty():
-                            break
-                    continue
-                
-                # Small yield for async cooperation
-                await asyncio.sleep(0.01)
+            # The run failed if any segment failed (e.g. its share of a threshold)
+            return_code = next((code for code in return_codes if code != 0), 0)
             
-            # Wait for threads to finish
-            stdout_thread.join(timeout=1)
-            stderr_thread.join(timeout=1)
+            # Final drain of the result files
+            if publish_task:
+                publish_task.cancel()
+            for tailer in tailers:
+                tailer.stop()
+            with span(timer, "result.drain"):
+                tail_results = await asyncio.gather(*tail_tasks, return_exceptions=True)
+            tail_errors = [e for e in tail_results if isinstance(e, Exception)]
+            for e in tail_errors:
+                print(f"Error tailing result file: {e}")
+            tail_failed = bool(tail_errors)
             
-            # Get return code
-            return_code = self.current_process.wait()
+            # Join the segment files: gzip members and NDJSON lines both concatenate
+            if segmented:
+                with span(timer, "result.join"):
+                    await asyncio.to_thread(_join_files, [segment_file for _, segment_file in plan], result_file)
             
-            # Parse summary if available
-            if summary_lines:
+            # Summary comes from the incremental state, no re-read of the result file
+            latency_sketch = None
+            with span(timer, "result.summary"):
+                aggregator = _merged(tailers)
+                if not tail_failed and aggregator.has_data():
+                    result_summary = aggregator.summary()
+                    latency_sketch = aggregator.latency.to_dict()
+            if latency_sketch is not None:
+                # Per-second series for the charts; rebuilt from the result file if this fails
+                try:
+                    with span(timer, "result.series"):
+                        await asyncio.to_thread(time_series.save_series, execution_id, aggregator)
+                except (OSError, ValueError) as e:
+                    print(f"Error saving time series: {e}")
+            
+            # Fall back to the stdout summary if no points were written
+            if not result_summary and summary_lines:
                 try:
                     summary_text = "\n".join(summary_lines)
                     result_summary = json.loads(summary_text)
                 except json.JSONDecodeError:
                     pass
             
-            # Try to parse result file if summary not captured
-            if not result_summary and os.path.exists(result_file):
-                result_summary = self._parse_result_file(result_file)
+            # Re-parse the result file only if tailing broke down
+            if not result_summary and tail_failed and os.path.exists(result_file):
+                result_summary = await asyncio.to_thread(self._parse_result_file, result_file, timer)
             
-            # Extract Max RPS from logs (often more accurate/peak than avg per second)
-            if result_summary and logs:
-                try:
-                    import re
-                    max_log_rps = 0
-                    for log in logs:
-                        # Match patterns like: " 398.5/s" or " 398/s"
-                        # Be careful to avoid false positives, usually typically at end of line or preceded by space
-                        # K6 log format: "default   [  22% ] 050/100 VUs  1m02.3s/5m00s  49.2/s"
-                        matches = re.findall(r'\s(\d+\.?\d*)/s', log)
-                        if matches:
-                            for m in matches:
-                                try:
-                                    val = float(m)
-                                    # Filter out unrealistic values if needed, but K6 is usually right
-                                    if val > max_log_rps:
-                                        max_log_rps = val
-                                except ValueError:
-                                    pass
-                    
-                    if max_log_rps > result_summary.get("rps_max", 0):
-                        result_summary["rps_max"] = max_log_rps
-                        # Also update "rps" (avg) if max is significantly higher? No, keep avg as avg.
-                except Exception as e:
-                    print(f"Error parsing RPS from logs: {e}")
+            # Max RPS seen in the logs, if higher than the per-second maximum
+            if result_summary and max_log_rps > result_summary.get("rps_max", 0):
+                result_summary["rps_max"] = max_log_rps
 
             if return_code == 0:
                 if on_log:
@@ -219,7 +279,10 @@ class K6Executor:
                 "return_code": return_code,
                 "result_file": result_file if os.path.exists(result_file) else None,
                 "summary": result_summary,
-                "logs": logs,
+                "latency_sketch": latency_sketch,
+                "segments": len(workers),
+                "log_excerpt": log_sink.excerpt(),
+                "log_file": log_sink.path,
             }
             
         except Exception as e:
@@ -232,122 +295,91 @@ class K6Executor:
             return {
                 "success": False,
                 "error": error_msg,
-                "logs": logs,
+                "log_excerpt": log_sink.excerpt(),
+                "log_file": log_sink.path,
             }
         finally:
-            self.current_process = None
+            # Also reached when the run task is cancelled: leave nothing running
+            for task in worker_tasks + tail_tasks + [publish_task]:
+                if task and not task.done():
+                    task.cancel()
+            if worker_tasks:
+                await asyncio.gather(*worker_tasks, return_exceptions=True)
+            self.workers = []
+            log_sink.close()
     
     def stop(self):
-        """Stop currently running K6 process."""
-        if self.current_process:
-            self.current_process.terminate()
-            try:
-                self.current_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.current_process.kill()
-            self.current_process = None
+        """
+        Stop the running test on all its workers.
+        
+        Does not block: run() finishes on its own once every K6 has exited.
+        Before the workers have started, run() returns without starting them.
+        """
+        self.stopped = True
+        for worker in self.workers:
+            worker.stop()
     
-    def _parse_result_file(self, result_file: str) -> Optional[Dict[str, Any]]:
+    def _parse_result_file(self, result_file: str, timer: Optional[PhaseTimer] = None) -> Optional[Dict[str, Any]]:
         """Parse K6 JSON output file to extract metrics."""
         try:
-            metrics = {
-                "http_reqs": 0,
-                "http_req_duration": {"avg": 0, "min": 0, "max": 0, "p90": 0, "p95": 0},
-                "http_req_failed": 0,
-                "iterations": 0,
-                "vus": 0,
-                "vus_max": 0,
-                "duration": 0,
-                "rps": 0,
-                "rps_max": 0,
-            }
-            
-            durations = []
-            timestamps = []  # Track timestamps for RPS calculation
-            rps_by_second = {}  # Count requests per second
-            
-            with open(result_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        data = json.loads(line)
-                        metric_type = data.get("type")
-                        metric_name = data.get("metric")
-                        
-                        if metric_type == "Point":
-                            value = data.get("data", {}).get("value", 0)
-                            timestamp = data.get("data", {}).get("time", "")
-                            
-                            if metric_name == "http_reqs":
-                                metrics["http_reqs"] += int(value)
-                                # Extract second for RPS calculation
-                                if timestamp:
-                                    try:
-                                        # Parse ISO timestamp and get second
-                                        ts_str = timestamp[:19]  # Get YYYY-MM-DDTHH:MM:SS
-                                        if ts_str not in rps_by_second:
-                                            rps_by_second[ts_str] = 0
-                                        rps_by_second[ts_str] += int(value)
-                                        timestamps.append(timestamp)
-                                    except:
-                                        pass
-                            elif metric_name == "http_req_duration":
-                                durations.append(value)
-                            elif metric_name == "http_req_failed":
-                                if value:
-                                    metrics["http_req_failed"] += int(value)
-                            elif metric_name == "iterations":
-                                metrics["iterations"] += int(value)
-                            elif metric_name == "vus":
-                                metrics["vus"] = max(metrics["vus"], int(value))
-                            elif metric_name == "vus_max":
-                                metrics["vus_max"] = max(metrics["vus_max"], int(value))
-                                
-                    except json.JSONDecodeError:
-                        continue
-
-            # Calculate actual test duration from timestamps
-            if timestamps:
-                try:
-                    timestamps.sort()
-                    start_time = datetime.fromisoformat(timestamps[0].replace('Z', '+00:00'))
-                    end_time = datetime.fromisoformat(timestamps[-1].replace('Z', '+00:00'))
-                    duration_seconds = (end_time - start_time).total_seconds()
-                    # Ensure duration is at least 1 second to avoid division by zero
-                    metrics["duration"] = max(duration_seconds * 1000, 1000)
-                except Exception as e:
-                    print(f"Error calculating duration: {e}")
-                    pass
-            
-            # Calculate duration statistics
-            if durations:
-                durations.sort()
-                n = len(durations)
-                metrics["http_req_duration"] = {
-                    "avg": sum(durations) / n,
-                    "min": durations[0],
-                    "max": durations[-1],
-                    "p90": durations[int(n * 0.9)] if n > 0 else 0,
-                    "p95": durations[int(n * 0.95)] if n > 0 else 0,
-                }
-            
-            # Calculate RPS metrics
-            if rps_by_second:
-                rps_values = list(rps_by_second.values())
-                metrics["rps"] = sum(rps_values) / len(rps_values) if rps_values else 0
-                metrics["rps_max"] = max(rps_values) if rps_values else 0
-                metrics["duration"] = len(rps_values) * 1000  # Duration in ms
-            
-            # Try to extract Max RPS from logs (often more accurate/peak than avg per second)
-            log_max_rps = 0
-            import re
-            rps_pattern = re.compile(r'(\d+\.?\d*)/s')
-            
-            # We don't have access to 'logs' here directly unless passed or read?
-            # logs are in self.run, not passed to _parse_result_file.
-            # So return metrics, and update in run() method.
-            
-            return metrics
+            with metrics.PARSE_SECONDS.time(stage="summary"), span(timer, f"result.parse.{settings.RESULT_PARSER}"):
+                if settings.RESULT_PARSER == "parallel":
+                    aggregator = bulk_parser.parse_result_file_parallel(
+                        result_file, settings.RESULT_PARSE_WORKERS
+                    )
+                elif settings.RESULT_PARSER == "bulk":
+                    aggregator = bulk_parser.parse_result_file(result_file)
+                else:
+                    aggregator = ResultAggregator()
+                    with open_result_file(result_file) as f:
+                        for line in f:
+                            aggregator.feed_line(line)
+            with span(timer, "result.parse.summary"):
+                return aggregator.summary()
             
         except Exception as e:
             print(f"Error parsing result file: {e}")
             return None
+
+
+def _merged(tailers: List[ResultTailer]) -> ResultAggregator:
+    """Aggregates of all segments together."""
+    merged = ResultAggregator()
+    for tailer in tailers:
+        merged.merge(tailer.aggregator, concurrent=True)
+    return merged
+
+
+async def _publish_merged(
+    tailers: List[ResultTailer],
+    on_metrics: Callable[[Dict[str, Any]], None],
+    interval: Optional[float] = None,
+):
+    """Send merged live metrics of several segments every interval (default LIVE_METRICS_INTERVAL) until cancelled."""
+    interval = settings.LIVE_METRICS_INTERVAL if interval is None else interval
+    copies = [ResultAggregator() for _ in tailers]
+    while True:
+        await asyncio.sleep(interval)
+        # Tailers drain in worker threads, so copy each one between drains
+        # and reuse its previous copy while it is busy
+        for i, tailer in enumerate(tailers):
+            if not tailer.draining:
+                copies[i] = ResultAggregator().merge(tailer.aggregator, series=False)
+        merged = ResultAggregator()
+        for copy in copies:
+            merged.merge(copy, concurrent=True, series=False)
+        if merged.has_data():
+            await on_metrics(merged.snapshot())
+
+
+def _join_files(parts: List[str], target: str):
+    """Concatenate the segment result files into one and remove them."""
+    existing = [part for part in parts if os.path.exists(part)]
+    if not existing:
+        return
+    with open(target, "wb") as out:
+        for part in existing:
+            with open(part, "rb") as f:
+                shutil.copyfileobj(f, out, 1024 * 1024)
+    for part in existing:
+        os.remove(part)
@@ -1,17 +1,25 @@
 """K6 script generator service."""
+import hashlib
 import json
-import os
 from typing import Optional, List, Dict, Any
-from datetime import datetime
 
 from ..config import settings
+from .script_cache import ScriptCache
+from .data_files import ingest_existing
+from .profiling import PhaseTimer, span
+
+
+# Part of every script hash: bump when _build_script output changes so
+# cached scripts (and archives) from before are not reused
+SCRIPT_FORMAT_VERSION = 3
 
 
 class K6ScriptGenerator:
     """Generate K6 test scripts from configuration."""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[ScriptCache] = None):
         self.scripts_dir = settings.SCRIPTS_DIR
+        self.cache = cache or ScriptCache(self.scripts_dir)
     
     def generate(
         self,
@@ -32,12 +40,18 @@ class K6ScriptGenerator:
         thresholds: Optional[List[Dict[str, str]]] = None,
         stop_on_failure: bool = False,
         data_file: Optional[str] = None,
+        data_distribution: str = "round-robin",
+        timer: Optional[PhaseTimer] = None,
     ) -> str:
         """
         Generate K6 script and return the file path.
         
+        Scripts are cached by a hash of the normalized config: an identical
+        config reuses the existing file (see ScriptCache), and the hash is
+        the file name, so ScriptCache.key_of(path) recovers it.
+        
         Args:
-            name: Test name
+            name: Test name (not part of the script, so not part of the hash)
             url: Request URL
             method: HTTP method
             headers: Request headers (list of {key, value})
@@ -52,11 +66,15 @@ class K6ScriptGenerator:
             max_vus: Maximum VUs (rps modes)
             rps_stages: RPS stage configuration (rps stages mode)
             thresholds: Threshold configuration
+            data_file: CSV data file; rows are available as `item` in the request body
+            data_distribution: 'round-robin' (rows in turn across all VUs) or
+                'per-vu' (each VU cycles through its own slice of the rows)
+            timer: Phase timer of the execution (script.hash, script.cache, script.render)
             
         Returns:
             Path to generated script file
         """
-        script_content = self._build_script(
+        params = dict(
             url=url,
             method=method,
             headers=headers,
@@ -73,18 +91,17 @@ class K6ScriptGenerator:
             thresholds=thresholds,
             stop_on_failure=stop_on_failure,
             data_file=data_file,
+            data_distribution=data_distribution,
         )
+        with span(timer, "script.hash"):
+            key = script_hash(params)
         
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_name = "".join(c if c.isalnum() else "_" for c in name)
-        filename = f"{safe_name}_{timestamp}.js"
-        filepath = os.path.join(self.scripts_dir, filename)
-        
-        # Write script to file
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(script_content)
-        
+        # Render and write only on a cache miss
+        with span(timer, "script.cache"):
+            filepath = self.cache.get(key)
+        if filepath is None:
+            with span(timer, "script.render"):
+                filepath = self.cache.put(key, self._build_script(**params))
         return filepath
     
     def generate_preview(
@@ -105,6 +122,7 @@ class K6ScriptGenerator:
         thresholds: Optional[List[Dict[str, str]]] = None,
         stop_on_failure: bool = False,
         data_file: Optional[str] = None,
+        data_distribution: str = "round-robin",
     ) -> str:
         """Generate K6 script content without saving to file."""
         return self._build_script(
@@ -124,6 +142,7 @@ class K6ScriptGenerator:
             thresholds=thresholds,
             stop_on_failure=stop_on_failure,
             data_file=data_file,
+            data_distribution=data_distribution,
         )
     
     def _build_script(
@@ -144,6 +163,7 @@ class K6ScriptGenerator:
         thresholds: Optional[List[Dict[str, str]]],
         stop_on_failure: bool = False,
         data_file: Optional[str] = None,
+        data_distribution: str = "round-robin",
     ) -> str:
         """Build K6 script content."""
         
@@ -265,20 +285,60 @@ class K6ScriptGenerator:
         
         if data_file:
             imports.append("import { SharedArray } from 'k6/data';")
-            imports.append("import papaparse from 'https://jslib.k6.io/papaparse/5.1.1/index.js';")
-            
-            # Escape path for JS string
-            data_file_js = data_file.replace("\\", "\\\\")
-            
-            data_loading_code = f'''
-// Load CSV data
-const data = new SharedArray('data', function () {{
-  return papaparse.parse(open('{data_file_js}'), {{ header: true }}).data;
-}});
+            # Files stored before uploads were ingested are converted on first use
+            data_loading_code = self._sharded_data_code(ingest_existing(data_file))
+            if data_distribution == "per-vu":
+                item_retrieval_code = """
+  // Get data row for current iteration (each VU cycles through its own slice)
+  const [sliceStart, sliceEnd] = vuSlice();
+  const item = row(sliceStart + exec.vu.iterationInScenario % (sliceEnd - sliceStart));
+"""
+                # VUs per test: fixed for the VU modes (K6 starts them all
+                # up front), unknown for the arrival-rate executors
+                if load_category == "vus":
+                    targets = [int(stage.get("target", 0)) for stage in stages or []]
+                    test_vus = max(targets + [1]) if load_sub_mode == "stages" and stages else vus
+                else:
+                    test_vus = None
+                data_loading_code += f'''
+// VUs of the whole test, null when the executor starts VUs as needed
+const TEST_VUS = {json.dumps(test_vus)};
+
+// VUs of this process: K6 gives a segment the floor or the ceiling of its
+// share, and the ceiling never gives two VUs the same rows
+function instanceVus() {{
+  const segment = __ENV.EXECUTION_SEGMENT;
+  if (!segment) return TEST_VUS;
+  const [from, to] = segment.split(':').map(fraction);
+  return Math.max(Math.ceil((to - from) * TEST_VUS - 1e-9), 1);
+}}
+
+// Rows of this VU, fixed at its first iteration
+let vuRows;
+function vuSlice() {{
+  if (!vuRows) {{
+    if (TEST_VUS === null) {{
+      // The VU count changes while the test runs: every VU uses all rows
+      vuRows = [0, data.length];
+      return vuRows;
+    }}
+    const vus = instanceVus();
+    const index = (exec.vu.idInInstance - 1) % vus;
+    if (vus > data.length) {{
+      // More VUs than rows: one row each, shared
+      vuRows = [index % data.length, index % data.length + 1];
+    }} else {{
+      vuRows = [Math.floor(index * data.length / vus), Math.floor((index + 1) * data.length / vus)];
+    }}
+  }}
+  return vuRows;
+}}
 '''
-            item_retrieval_code = """
+            else:
+                # Segments hold disjoint rows when sharded, all rows otherwise
+                item_retrieval_code = """
   // Get data row for current iteration (round-robin)
-  const item = data[exec.scenario.iterationInTest % data.length];
+  const item = row(exec.scenario.iterationInInstance % data.length);
 """
 
         if stop_on_failure or data_file:
@@ -339,3 +399,71 @@ export function handleSummary(data) {{
 }}
 '''
         return script
+
+    def _sharded_data_code(self, manifest: Dict[str, Any]) -> str:
+        """
+        Data loading for an ingested data file (see data_files.store_upload).
+
+        Each K6 process loads only the shards overlapping the rows of its
+        execution segment, which LocalSegmentWorker passes in the
+        EXECUTION_SEGMENT environment variable. Without it (a single
+        process, or `k6 archive` collecting the files to bundle) all rows
+        are loaded.
+        """
+        shards = [
+            {"path": shard["path"].replace("\\", "/"), "start": shard["start"], "rows": shard["rows"]}
+            for shard in manifest["shards"]
+        ]
+        return f'''
+// Pre-parsed data: rows as arrays of strings, split into shards
+const DATA_COLUMNS = {json.dumps(manifest["columns"], ensure_ascii=False)};
+const DATA_ROWS = {manifest["rows"]};
+const DATA_SHARDS = {json.dumps(shards, ensure_ascii=False, indent=2)};
+
+function fraction(value) {{
+  const [numerator, denominator] = value.split('/');
+  return denominator === undefined ? Number(numerator) : Number(numerator) / Number(denominator);
+}}
+
+// Rows [start, end) belonging to this process's execution segment
+function segmentRows() {{
+  const segment = __ENV.EXECUTION_SEGMENT;
+  if (!segment) return [0, DATA_ROWS];
+  const [from, to] = segment.split(':').map(fraction);
+  const start = Math.floor(from * DATA_ROWS);
+  const end = Math.floor(to * DATA_ROWS);
+  // Fewer rows than segments: every process uses all of them
+  return end > start ? [start, end] : [0, DATA_ROWS];
+}}
+
+const data = new SharedArray('data', function () {{
+  const [start, end] = segmentRows();
+  const rows = [];
+  for (const shard of DATA_SHARDS) {{
+    if (shard.start + shard.rows <= start || shard.start >= end) continue;
+    const part = JSON.parse(open(shard.path));
+    const to = Math.min(end - shard.start, shard.rows);
+    for (let i = Math.max(start - shard.start, 0); i < to; i++) rows.push(part[i]);
+  }}
+  return rows;
+}});
+
+function row(index) {{
+  const values = data[index];
+  const item = {{}};
+  for (let i = 0; i < DATA_COLUMNS.length; i++) item[DATA_COLUMNS[i]] = values[i];
+  return item;
+}}
+'''
+
+
+def script_hash(params: Dict[str, Any]) -> str:
+    """SHA-256 of a normalized script config (canonical JSON plus the format version)."""
+    canonical = json.dumps(
+        {"version": SCRIPT_FORMAT_VERSION, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
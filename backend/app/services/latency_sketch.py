@@ -0,0 +1,201 @@
+"""Mergeable latency quantile sketch."""
+import math
+import re
+from typing import Optional, Dict, Any, Iterable
+
+import numpy as np
+
+from ..config import settings
+
+
+# Quantile keys: the percent with the decimal point dropped (p5, p95, p999);
+# the point may also be written out (p99.9)
+_QUANTILE_KEY = re.compile(r"^p(\d{1,2})(?:\.(?=\d))?(\d*)$")
+
+
+class LatencySketch:
+    """
+    Log-bucketed histogram of latencies with bounded relative error.
+
+    Every value v > 0 falls into bucket ceil(log(v) / log(gamma)) with
+    gamma = (1 + a) / (1 - a), so any quantile is reported within a relative
+    error of a (the relative accuracy). Memory depends on the value range,
+    not on the number of points, and two sketches with the same accuracy
+    merge by adding bucket counts.
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: Optional[float] = None,
+        max_buckets: Optional[int] = None,
+    ):
+        if relative_accuracy is None:
+            relative_accuracy = settings.LATENCY_SKETCH_ACCURACY
+        if max_buckets is None:
+            max_buckets = settings.LATENCY_SKETCH_MAX_BUCKETS
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def add(self, value: float, count: int = 1):
+        """Record a value `count` times."""
+        if self.count == 0:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+        self.count += count
+        self.sum += value * count
+
+        if value <= 0:
+            self.zero_count += count
+            return
+
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def add_many(self, values: np.ndarray):
+        """Record an array of values at once (vectorized add)."""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+
+        low, high = float(values.min()), float(values.max())
+        if self.count == 0:
+            self.min, self.max = low, high
+        else:
+            self.min = min(self.min, low)
+            self.max = max(self.max, high)
+        self.count += len(values)
+        self.sum += float(values.sum())
+
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        if len(positive) == 0:
+            return
+
+        indexes = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+        unique, counts = np.unique(indexes, return_counts=True)
+        for index, bucket_count in zip(unique.tolist(), counts.tolist()):
+            self.buckets[index] = self.buckets.get(index, 0) + bucket_count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other: "LatencySketch"):
+        """Add all values recorded by another sketch into this one."""
+        if other.count == 0:
+            return
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+
+        if self.count == 0:
+            self.min, self.max = other.min, other.max
+        else:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.count += other.count
+        self.sum += other.sum
+        self.zero_count += other.zero_count
+
+        for index, bucket_count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + bucket_count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile (0 <= q <= 1)."""
+        if self.count == 0:
+            return 0
+        if q >= 1:
+            return self.max
+
+        # Same rank convention as indexing a sorted list at int(n * q)
+        rank = min(int(self.count * q), self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0)
+
+        cumulative = self.zero_count
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            if cumulative > rank:
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+    def stats(self, quantiles: Iterable[float] = (0.5, 0.9, 0.95, 0.99, 0.999)) -> Dict[str, float]:
+        """avg/min/max plus the requested quantiles keyed as p50, p90, p999..."""
+        result = {
+            "avg": self.sum / self.count if self.count else 0,
+            "min": self.min,
+            "max": self.max,
+        }
+        for q in quantiles:
+            result[_quantile_key(q)] = self.quantile(q)
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to a JSON-compatible dict."""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "zero_count": self.zero_count,
+            "buckets": {str(index): c for index, c in sorted(self.buckets.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencySketch":
+        """Restore a sketch serialized with to_dict()."""
+        sketch = cls(data["relative_accuracy"], data.get("max_buckets"))
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.buckets = {int(index): c for index, c in data["buckets"].items()}
+        return sketch
+
+    def _bucket_value(self, index: int) -> float:
+        """Representative value of a bucket, within the relative accuracy of all its members."""
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def _collapse(self):
+        """Fold the lowest buckets together to stay within max_buckets."""
+        indexes = sorted(self.buckets)
+        excess = len(indexes) - self.max_buckets
+        folded = sum(self.buckets.pop(index) for index in indexes[:excess])
+        target = indexes[excess]
+        self.buckets[target] += folded
+
+
+def _quantile_key(q: float) -> str:
+    """0.95 -> 'p95', 0.999 -> 'p999'."""
+    return "p" + f"{q * 100:g}".replace(".", "")
+
+
+def quantile_from_key(key: str) -> Optional[float]:
+    """'p95' -> 0.95, 'p999' or 'p99.9' -> 0.999 (the keys of stats()); None for other names."""
+    if key == "p100":
+        return 1.0
+    match = _QUANTILE_KEY.match(key)
+    if not match:
+        return None
+    whole, fraction = match.groups()
+    # Shift the point in the text, as 99.9 / 100 is not exactly 0.999
+    return float(f"0.{whole:0>2}{fraction}")
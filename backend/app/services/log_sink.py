@@ -0,0 +1,193 @@
+"""Bounded in-memory log buffer with the full log stored on disk in indexed chunks."""
+import gzip
+import json
+import os
+from collections import deque
+from typing import Optional, List, Dict, Any, Tuple
+
+from ..config import settings
+
+
+# Levels a log line can be filtered by
+LOG_LEVELS = ("error", "warning", "info")
+
+
+class LogSink:
+    """
+    Collect the output lines of one execution.
+
+    Memory holds only the first `head_lines` lines and a ring buffer of the
+    last `tail_lines`. Every line also goes to the log file, written as a
+    series of independent gzip members of `chunk_lines` lines each (the
+    file as a whole is still a normal .gz). An index next to it records one
+    JSON array per member:
+
+        [first line number, byte offset, byte length, line count, errors, warnings]
+
+    so any range of lines, or of lines of one level, can be read back by
+    decompressing only the members it touches.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        head_lines: Optional[int] = None,
+        tail_lines: Optional[int] = None,
+        chunk_lines: Optional[int] = None,
+    ):
+        self.path = path
+        self.head_lines = settings.LOG_HEAD_LINES if head_lines is None else head_lines
+        self.chunk_lines = settings.LOG_CHUNK_LINES if chunk_lines is None else chunk_lines
+        self.head: List[str] = []
+        self.tail = deque(maxlen=settings.LOG_TAIL_LINES if tail_lines is None else tail_lines)
+        self.line_count = 0
+
+        self._chunk: List[str] = []
+        self._offset = 0
+        self._file = open(path, "wb")
+        self._index = open(index_path_for(path), "w", encoding="utf-8")
+
+    def write(self, line: str):
+        """Append one line."""
+        self.line_count += 1
+        if len(self.head) < self.head_lines:
+            self.head.append(line)
+        else:
+            self.tail.append(line)
+        if self._file:
+            self._chunk.append(line)
+            if len(self._chunk) >= self.chunk_lines:
+                self._write_chunk()
+
+    def close(self):
+        """Write the last partial chunk and finish the log file."""
+        if self._file:
+            if self._chunk:
+                self._write_chunk()
+            self._file.close()
+            self._index.close()
+            self._file = None
+
+    @property
+    def omitted(self) -> int:
+        """Lines that are only in the file, not in memory."""
+        return self.line_count - len(self.head) - len(self.tail)
+
+    def excerpt(self) -> str:
+        """Head and tail of the log, with a marker where lines were left out."""
+        if not self.omitted:
+            return "\n".join(self.head + list(self.tail))
+        marker = f"...[{self.omitted} lines omitted, full log: {os.path.basename(self.path)}]..."
+        return "\n".join(self.head + [marker] + list(self.tail))
+
+    def _write_chunk(self):
+        """Compress the pending lines into one gzip member and index it."""
+        data = gzip.compress(("\n".join(self._chunk) + "\n").encode("utf-8"), compresslevel=6)
+        self._file.write(data)
+        self._file.flush()
+
+        levels = [line_level(line) for line in self._chunk]
+        entry = [
+            self.line_count - len(self._chunk),
+            self._offset,
+            len(data),
+            len(self._chunk),
+            levels.count("error"),
+            levels.count("warning"),
+        ]
+        self._index.write(json.dumps(entry) + "\n")
+        self._index.flush()
+
+        self._offset += len(data)
+        self._chunk = []
+
+
+class LogReader:
+    """Random access to a log written by LogSink (also while it is being written)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.chunks: List[List[int]] = []
+        with open(index_path_for(path), "r", encoding="utf-8") as f:
+            for entry in f:
+                try:
+                    self.chunks.append(json.loads(entry))
+                except ValueError:
+                    break  # Entry still being written
+
+    def page(self, offset: int, limit: int, level: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Lines [offset, offset + limit) of the log, or of its lines of one level.
+
+        Returns:
+            {"total": matching lines, "offset": offset, "lines": [{"n": line number, "text": ...}]}
+        """
+        total = sum(self._count(chunk, level) for chunk in self.chunks)
+        lines: List[Dict[str, Any]] = []
+        position = 0  # Matching lines before the current chunk
+        with open(self.path, "rb") as f:
+            for chunk in self.chunks:
+                count = self._count(chunk, level)
+                if position + count <= offset or count == 0:
+                    position += count
+                    continue
+                if len(lines) >= limit:
+                    break
+
+                first_line, byte_offset, byte_length = chunk[0], chunk[1], chunk[2]
+                f.seek(byte_offset)
+                text = gzip.decompress(f.read(byte_length)).decode("utf-8", errors="replace")
+                for number, line in _numbered(text, first_line):
+                    if level and line_level(line) != level:
+                        continue
+                    if position >= offset and len(lines) < limit:
+                        lines.append({"n": number, "text": line})
+                    position += 1
+        return {"total": total, "offset": offset, "lines": lines}
+
+    @staticmethod
+    def _count(chunk: List[int], level: Optional[str]) -> int:
+        line_count, errors, warnings = chunk[3], chunk[4], chunk[5]
+        if level == "error":
+            return errors
+        if level == "warning":
+            return warnings
+        if level == "info":
+            return line_count - errors - warnings
+        return line_count
+
+
+def page_text(text: str, offset: int, limit: int, level: Optional[str] = None) -> Dict[str, Any]:
+    """Same as LogReader.page() over a log held as one string (older executions)."""
+    matching = [
+        {"n": number, "text": line}
+        for number, line in _numbered(text, 0)
+        if not level or line_level(line) == level
+    ]
+    return {"total": len(matching), "offset": offset, "lines": matching[offset:offset + limit]}
+
+
+def line_level(line: str) -> str:
+    """Classify a K6 or executor log line as error, warning or info."""
+    if "[ERROR]" in line or "level=error" in line or "level=fatal" in line:
+        return "error"
+    if "[WARN]" in line or "level=warning" in line:
+        return "warning"
+    return "info"
+
+
+def log_path_for(execution_id: int) -> str:
+    """Full log file of an execution."""
+    return os.path.join(settings.LOGS_DIR, f"exec_{execution_id}.log.gz")
+
+
+def index_path_for(log_path: str) -> str:
+    """Chunk index of a log file."""
+    return log_path + ".idx"
+
+
+def _numbered(text: str, first_line: int) -> List[Tuple[int, str]]:
+    lines = text.split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    return list(enumerate(lines, first_line))
@@ -0,0 +1,168 @@
+"""Phase timings of an execution and an opt-in sampling profiler."""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from ..config import settings
+
+
+class PhaseTimer:
+    """
+    Wall-clock spans of the phases of one execution.
+
+    Spans are (name, start, duration) relative to the creation of the timer,
+    so they line up into a timeline from "run" to the stored result; they may
+    overlap (the K6 run spans its startup and the first output). Marks record
+    a single moment, e.g. the first K6 output line. Totals add up many short
+    stretches of the same work, e.g. scanning every log line, where a span
+    per occurrence would be too many.
+
+    Spans are opened from the event loop and from worker threads, so
+    recording only appends and adds under a lock.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.utcnow()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Dict[str, Any]] = []
+        self.marks: Dict[str, float] = {}
+        self.totals: Dict[str, Dict[str, float]] = {}
+
+    def _elapsed_ms(self, at: Optional[float] = None) -> float:
+        return ((at if at is not None else time.perf_counter()) - self._start) * 1000
+
+    @contextmanager
+    def span(self, name: str):
+        """Record the duration of a block as a span."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.spans.append({
+                    "name": name,
+                    "start_ms": round(self._elapsed_ms(start), 3),
+                    "duration_ms": round((end - start) * 1000, 3),
+                })
+
+    def mark(self, name: str):
+        """Record the moment something first happened (later calls are ignored)."""
+        with self._lock:
+            self.marks.setdefault(name, round(self._elapsed_ms(), 3))
+
+    def add(self, name: str, seconds: float):
+        """Add a stretch of time to a total."""
+        with self._lock:
+            total = self.totals.setdefault(name, {"ms": 0.0, "count": 0})
+            total["ms"] += seconds * 1000
+            total["count"] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "started_at": self.started_at.isoformat(),
+                "total_ms": round(self._elapsed_ms(), 3),
+                "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+                "marks": dict(self.marks),
+                "totals": {
+                    name: {"ms": round(total["ms"], 3), "count": total["count"]}
+                    for name, total in self.totals.items()
+                },
+            }
+
+
+@contextmanager
+def span(timer: Optional[PhaseTimer], name: str):
+    """PhaseTimer.span that does nothing without a timer."""
+    if timer is None:
+        yield
+    else:
+        with timer.span(name):
+            yield
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of all threads of the process at an interval.
+
+    A background thread reads sys._current_frames(), so the profiled code
+    runs unmodified and the cost is one stack walk per thread per sample.
+    Stacks are counted in the folded format ("thread;outer;...;inner count"
+    per line) read by flamegraph.pl, speedscope and most flame graph tools.
+    It sees the whole process: other executions running at the same time
+    show up too, under their own frames.
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval or settings.PROFILE_SAMPLE_INTERVAL
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Stop sampling and return the folded stacks."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.folded()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+# The profiler samples the whole process, so one profile is captured at a time
+_profiling = threading.Lock()
+
+
+def start_profile() -> Optional[SamplingProfiler]:
+    """Start the profiler, None if another execution is being profiled."""
+    if not _profiling.acquire(blocking=False):
+        return None
+    profiler = SamplingProfiler()
+    profiler.start()
+    return profiler
+
+
+def finish_profile(profiler: SamplingProfiler, execution_id: int) -> str:
+    """Stop the profiler and save its folded stacks; returns the path."""
+    try:
+        folded = profiler.stop()
+    finally:
+        _profiling.release()
+    path = profile_path_for(execution_id)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(folded)
+    return path
+
+
+def profile_path_for(execution_id: int) -> str:
+    """File holding the sampled profile of an execution."""
+    return os.path.join(settings.RESULTS_DIR, f"profile_{execution_id}.folded")
@@ -0,0 +1,332 @@
+"""Regression detection between executions of the same test."""
+import math
+from typing import Optional, Dict, Any, List, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models import TestExecution
+from .latency_sketch import LatencySketch
+from . import time_series, execution_summaries
+
+
+# Latency quantiles compared between runs, as (summary key, quantile)
+QUANTILES = (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+
+VERDICTS = ("pass", "regression", "no_baseline")
+
+
+class RunSample:
+    """
+    What one or more executions measured, pooled: the latency distribution,
+    request and failure counts and the requests of every second.
+
+    Several executions (e.g. the last few runs as a baseline) pool by
+    merging their latency sketches, adding their counts and concatenating
+    their per-second request counts.
+    """
+
+    def __init__(self, executions: Sequence[TestExecution], rebuild_series: bool = True):
+        if not executions:
+            raise ValueError("No executions to compare")
+        self.ids = [execution.id for execution in executions]
+        self.latency: Optional[LatencySketch] = None
+        self.requests = 0
+        self.failed = 0
+        rps = []
+        for execution in executions:
+            if not execution.latency_sketch or not execution.result_summary:
+                raise ValueError(f"Execution {execution.id} has no stored latency distribution")
+            sketch = LatencySketch.from_dict(execution.latency_sketch)
+            if self.latency is None:
+                self.latency = sketch
+            else:
+                self.latency.merge(sketch)
+            self.requests += int(execution.result_summary.get("http_reqs") or 0)
+            self.failed += int(execution.result_summary.get("http_req_failed") or 0)
+
+            if rebuild_series:
+                series = time_series.load_or_build(execution.id, execution.result_file)
+            else:
+                series = time_series.load_series(execution.id)
+            # First and last second are partial
+            if series is not None and len(series["rps"]) > 2:
+                rps.append(series["rps"][1:-1].astype(np.float64))
+        # Throughput is tested only when every run has its per-second counts
+        self.rps = np.concatenate(rps) if len(rps) == len(executions) else None
+        summaries = [execution.result_summary.get("rps") or 0 for execution in executions]
+        self.mean_rps = float(self.rps.mean()) if self.rps is not None and len(self.rps) else float(np.mean(summaries))
+
+    @property
+    def error_rate(self) -> float:
+        return self.failed / self.requests if self.requests else 0.0
+
+
+def compare(
+    baseline: Sequence[TestExecution],
+    candidate: Sequence[TestExecution],
+    latency_tolerance: Optional[float] = None,
+    throughput_tolerance: Optional[float] = None,
+    error_rate_tolerance: Optional[float] = None,
+    alpha: Optional[float] = None,
+    rebuild_series: bool = True,
+) -> Dict[str, Any]:
+    """
+    Compare a candidate run (or runs) against a baseline.
+
+    A check is a regression when the candidate is worse than the baseline
+    by more than its tolerance and the difference is statistically
+    significant at level `alpha`; it is an improvement when it is better by
+    as much. Latency quantiles are tested with a two-sample
+    Kolmogorov-Smirnov test on the latency sketches, the mean latency with
+    Welch's t-test (variance from the sketch buckets), throughput with
+    Welch's t-test on the requests of every second and the error rate with
+    a two-proportion z-test. Runs without saved per-second series are
+    judged on the throughput tolerance alone.
+
+    Args:
+        latency_tolerance: Allowed relative increase of a latency (0.1 = 10%)
+        throughput_tolerance: Allowed relative drop of the mean RPS
+        error_rate_tolerance: Allowed absolute increase of the error rate (0.01 = 1 point)
+        alpha: Significance level
+        rebuild_series: Rebuild missing per-second series from result files
+
+    Returns:
+        {"verdict": "pass" | "regression", "baseline": [ids], "candidate": [ids],
+         "alpha", "checks": [{"metric", "baseline", "candidate", "change",
+         "tolerance", "test", "p_value", "status"}]}
+
+    Raises:
+        ValueError: If an execution has no stored latency distribution
+    """
+    latency_tolerance = settings.REGRESSION_LATENCY_TOLERANCE if latency_tolerance is None else latency_tolerance
+    throughput_tolerance = settings.REGRESSION_THROUGHPUT_TOLERANCE if throughput_tolerance is None else throughput_tolerance
+    error_rate_tolerance = settings.REGRESSION_ERROR_RATE_TOLERANCE if error_rate_tolerance is None else error_rate_tolerance
+    alpha = settings.REGRESSION_ALPHA if alpha is None else alpha
+
+    base = RunSample(baseline, rebuild_series)
+    cand = RunSample(candidate, rebuild_series)
+    checks = []
+
+    def check(metric, base_value, cand_value, change, tolerance, test, p_value, worse_is_higher=True):
+        significant = p_value is None or p_value < alpha
+        worse = change if worse_is_higher else -change
+        if significant and worse > tolerance:
+            status = "regression"
+        elif significant and worse < -tolerance:
+            status = "improvement"
+        else:
+            status = "ok"
+        checks.append({
+            "metric": metric,
+            "baseline": _round(base_value),
+            "candidate": _round(cand_value),
+            "change": _round(change),
+            "tolerance": tolerance,
+            "test": test,
+            "p_value": None if p_value is None else _round(p_value),
+            "status": status,
+        })
+
+    # Latency: the KS test covers the whole distribution, the quantiles say how far it moved
+    ks_p = ks_test(base.latency, cand.latency)[1]
+    for key, q in QUANTILES:
+        base_value, cand_value = base.latency.quantile(q), cand.latency.quantile(q)
+        check(f"http_req_duration.{key}", base_value, cand_value,
+              _relative(base_value, cand_value), latency_tolerance, "ks", ks_p)
+
+    base_mean, base_var = sketch_moments(base.latency)
+    cand_mean, cand_var = sketch_moments(cand.latency)
+    check("http_req_duration.avg", base_mean, cand_mean, _relative(base_mean, cand_mean), latency_tolerance,
+          "welch", welch_test(base_mean, base_var, base.latency.count, cand_mean, cand_var, cand.latency.count))
+
+    if base.rps is not None and cand.rps is not None and len(base.rps) > 1 and len(cand.rps) > 1:
+        rps_test, rps_p = "welch", welch_test(
+            base.rps.mean(), base.rps.var(ddof=1), len(base.rps),
+            cand.rps.mean(), cand.rps.var(ddof=1), len(cand.rps),
+        )
+    else:
+        rps_test, rps_p = None, None
+    check("rps", base.mean_rps, cand.mean_rps, _relative(base.mean_rps, cand.mean_rps),
+          throughput_tolerance, rps_test, rps_p, worse_is_higher=False)
+
+    check("error_rate", base.error_rate, cand.error_rate, cand.error_rate - base.error_rate, error_rate_tolerance,
+          "z", proportion_test(base.failed, base.requests, cand.failed, cand.requests))
+
+    return {
+        "verdict": "regression" if any(c["status"] == "regression" for c in checks) else "pass",
+        "baseline": base.ids,
+        "candidate": cand.ids,
+        "alpha": alpha,
+        "checks": checks,
+    }
+
+
+def baseline_for(db: Session, execution: TestExecution, runs: Optional[int] = None) -> List[TestExecution]:
+    """
+    The latest successful earlier executions of the same test.
+
+    Runs of the same test share the hash of their generated script, whichever
+    saved config they were started from.
+    """
+    runs = runs or settings.REGRESSION_BASELINE_RUNS
+    if not execution.script_hash:
+        return []
+    return (
+        db.query(TestExecution)
+        .filter(
+            TestExecution.script_hash == execution.script_hash,
+            TestExecution.id < execution.id,
+            TestExecution.status == "completed",
+            TestExecution.latency_sketch.isnot(None),
+        )
+        .order_by(TestExecution.id.desc())
+        .limit(runs)
+        .all()
+    )
+
+
+def verdict_for(db: Session, execution: TestExecution) -> Dict[str, Any]:
+    """Regression report of a finished execution against its baseline, stored with the execution."""
+    baseline = baseline_for(db, execution)
+    if not baseline:
+        return {"verdict": "no_baseline", "baseline": [], "candidate": [execution.id], "checks": []}
+    # Per-second series of older baseline runs are not rebuilt here, to keep the result prompt
+    return compare(baseline, [execution], rebuild_series=False)
+
+
+def record_verdict(execution_id: int) -> Optional[Dict[str, Any]]:
+    """Compute the verdict of a finished execution and store it; None if the execution is gone."""
+    with SessionLocal() as db:
+        execution = db.query(TestExecution).filter(TestExecution.id == execution_id).first()
+        if execution is None:
+            return None
+        report = verdict_for(db, execution)
+        execution.regression = report
+        execution_summaries.sync(db, execution)
+        db.commit()
+        return report
+
+
+def ks_test(a: LatencySketch, b: LatencySketch) -> tuple:
+    """
+    Two-sample Kolmogorov-Smirnov test on two latency sketches.
+
+    The empirical CDFs are compared at every bucket boundary, so differences
+    within one bucket (under the sketch accuracy) are not seen.
+
+    Returns:
+        (D statistic, asymptotic p-value)
+    """
+    if a.relative_accuracy != b.relative_accuracy:
+        raise ValueError("Cannot compare sketches with different relative accuracy")
+    if not a.count or not b.count:
+        return 0.0, 1.0
+    indexes = sorted(set(a.buckets) | set(b.buckets))
+    cdf_a = (a.zero_count + np.cumsum([a.buckets.get(i, 0) for i in indexes])) / a.count
+    cdf_b = (b.zero_count + np.cumsum([b.buckets.get(i, 0) for i in indexes])) / b.count
+    d = float(max(np.abs(cdf_a - cdf_b).max(), abs(a.zero_count / a.count - b.zero_count / b.count)))
+    n = a.count * b.count / (a.count + b.count)
+    return d, _kolmogorov_sf((math.sqrt(n) + 0.12 + 0.11 / math.sqrt(n)) * d)
+
+
+def sketch_moments(sketch: LatencySketch) -> tuple:
+    """(mean, sample variance) of a sketch; the variance uses the bucket representative values."""
+    if sketch.count < 2:
+        return (sketch.sum / sketch.count if sketch.count else 0.0), 0.0
+    mean = sketch.sum / sketch.count
+    indexes = np.fromiter(sketch.buckets, dtype=np.float64, count=len(sketch.buckets))
+    counts = np.fromiter(sketch.buckets.values(), dtype=np.float64, count=len(sketch.buckets))
+    values = 2 * sketch.gamma ** indexes / (sketch.gamma + 1)
+    squares = float((counts * (values - mean) ** 2).sum()) + sketch.zero_count * mean ** 2
+    return mean, squares / (sketch.count - 1)
+
+
+def welch_test(mean_a: float, var_a: float, n_a: int, mean_b: float, var_b: float, n_b: int) -> float:
+    """Two-sided p-value of Welch's t-test for a difference in means."""
+    if n_a < 2 or n_b < 2:
+        return 1.0
+    se_a, se_b = var_a / n_a, var_b / n_b
+    if se_a + se_b == 0:
+        return 1.0 if mean_a == mean_b else 0.0
+    t = (mean_b - mean_a) / math.sqrt(se_a + se_b)
+    df = (se_a + se_b) ** 2 / (se_a ** 2 / (n_a - 1) + se_b ** 2 / (n_b - 1))
+    return _student_t_two_sided(t, df)
+
+
+def proportion_test(x_a: int, n_a: int, x_b: int, n_b: int) -> float:
+    """Two-sided p-value of the two-proportion z-test."""
+    if not n_a or not n_b:
+        return 1.0
+    pooled = (x_a + x_b) / (n_a + n_b)
+    se = math.sqrt(pooled * (1 - pooled) * (1 / n_a + 1 / n_b))
+    if se == 0:
+        return 1.0
+    z = (x_b / n_b - x_a / n_a) / se
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def _kolmogorov_sf(x: float) -> float:
+    """P(K > x) for the Kolmogorov distribution."""
+    if x < 0.2:
+        return 1.0
+    total = sum((-1) ** (k - 1) * math.exp(-2 * k * k * x * x) for k in range(1, 101))
+    return min(max(2 * total, 0.0), 1.0)
+
+
+def _student_t_two_sided(t: float, df: float) -> float:
+    """P(|T| > |t|) for Student's t with df degrees of freedom."""
+    if df > 1000:
+        # Indistinguishable from the normal distribution, where the continued fraction converges slowly
+        return math.erfc(abs(t) / math.sqrt(2))
+    return _incomplete_beta(df / 2, 0.5, df / (df + t * t))
+
+
+def _incomplete_beta(a: float, b: float, x: float) -> float:
+    """Regularized incomplete beta function I_x(a, b), by its continued fraction."""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(
+        math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x)
+    )
+    # The continued fraction converges for x < (a + 1) / (a + b + 2); use the symmetry otherwise
+    if x > (a + 1) / (a + b + 2):
+        return 1 - front * _beta_fraction(b, a, 1 - x) / b
+    return front * _beta_fraction(a, b, x) / a
+
+
+def _beta_fraction(a: float, b: float, x: float, iterations: int = 300, epsilon: float = 1e-12) -> float:
+    """Continued fraction of the incomplete beta function (modified Lentz's method)."""
+    tiny = 1e-300
+    c, d = 1.0, 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, iterations + 1):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1) < epsilon:
+            break
+    return result
+
+
+def _relative(base: float, candidate: float) -> float:
+    """Relative change from base to candidate (0 when both are 0)."""
+    if base == 0:
+        return 0.0 if candidate == 0 else math.inf
+    return candidate / base - 1
+
+
+def _round(value: float) -> Optional[float]:
+    """Rounded for the report; None for an infinite change (JSON has no infinity)."""
+    return None if math.isinf(value) else round(float(value), 6)
@@ -0,0 +1,358 @@
+"""Incremental parsing of K6 NDJSON result files."""
+import asyncio
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Optional, Callable, Dict, Any, Union, BinaryIO
+
+import numpy as np
+
+from ..config import settings
+from .. import metrics
+from .latency_sketch import LatencySketch
+from .time_series import SecondHistograms
+
+
+# Bytes read from the result file per drain step
+READ_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def open_result_file(result_file: str) -> BinaryIO:
+    """Open a K6 result file for reading, decompressing .gz output on the fly."""
+    if result_file.endswith(".gz"):
+        return gzip.open(result_file, "rb")
+    return open(result_file, "rb")
+
+
+class ResultAggregator:
+    """Keep running aggregates over the points of a K6 result file."""
+
+    def __init__(self):
+        self.http_reqs = 0
+        self.http_req_failed = 0
+        self.iterations = 0
+        self.vus = 0
+        self.vus_max = 0
+        self.current_vus = 0
+        self.latency = LatencySketch()  # http_req_duration
+        self.rps_by_second: Dict[int, int] = {}  # epoch second -> request count
+        # Per-second series for charts (see time_series.build_series)
+        self.failed_by_second: Dict[int, int] = {}  # epoch second -> failed requests
+        self.vus_by_second: Dict[int, int] = {}  # epoch second -> peak VUs
+        self.latency_by_second = SecondHistograms()  # http_req_duration
+
+        # Memo for timestamp -> epoch second (points arrive mostly in order)
+        self._last_second_key = None
+        self._last_second = 0
+
+    def feed_line(self, line: Union[str, bytes]):
+        """Feed one NDJSON line."""
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            return
+        if isinstance(data, dict):
+            self.feed(data)
+
+    def feed(self, data: Dict[str, Any]):
+        """Feed one decoded K6 output entry."""
+        if data.get("type") != "Point":
+            return
+
+        metric_name = data.get("metric")
+        if metric_name not in _FED_METRICS:
+            return
+        point = data.get("data", {})
+        value = point.get("value", 0)
+
+        second = None
+        timestamp = point.get("time", "")
+        if timestamp:
+            try:
+                second = self._epoch_second(timestamp)
+            except (ValueError, IndexError):
+                pass
+
+        if metric_name == "http_reqs":
+            self.http_reqs += int(value)
+            if second is not None:
+                self.rps_by_second[second] = self.rps_by_second.get(second, 0) + int(value)
+        elif metric_name == "http_req_duration":
+            self.latency.add(value)
+            if second is not None:
+                self.latency_by_second.add(second, value)
+        elif metric_name == "http_req_failed":
+            if value:
+                self.http_req_failed += int(value)
+                if second is not None:
+                    self.failed_by_second[second] = self.failed_by_second.get(second, 0) + int(value)
+        elif metric_name == "iterations":
+            self.iterations += int(value)
+        elif metric_name == "vus":
+            self.current_vus = int(value)
+            self.vus = max(self.vus, self.current_vus)
+            if second is not None:
+                self.vus_by_second[second] = max(self.vus_by_second.get(second, 0), self.current_vus)
+        elif metric_name == "vus_max":
+            self.vus_max = max(self.vus_max, int(value))
+
+    def feed_columns(self, columns):
+        """
+        Feed a block of decoded points at once (see bulk_parser.PointColumns).
+
+        Equivalent to feed() on every point, in file order.
+        """
+        for metric_id, metric_name in enumerate(columns.metric_names):
+            mask = columns.metric_ids == metric_id
+            values = columns.values[mask]
+
+            if metric_name == "http_reqs":
+                counts = values.astype(np.int64)
+                self.http_reqs += int(counts.sum())
+                valid = columns.time_valid[mask]
+                seconds = columns.time_us[mask][valid] // 1_000_000
+                if len(seconds):
+                    unique, inverse = np.unique(seconds, return_inverse=True)
+                    totals = np.bincount(inverse, weights=counts[valid])
+                    for second, total in zip(unique.tolist(), totals.tolist()):
+                        self.rps_by_second[second] = self.rps_by_second.get(second, 0) + int(total)
+            elif metric_name == "http_req_duration":
+                self.latency.add_many(values)
+                valid = columns.time_valid[mask]
+                self.latency_by_second.add_many(columns.time_us[mask][valid] // 1_000_000, values[valid])
+            elif metric_name == "http_req_failed":
+                failed = values != 0
+                self.http_req_failed += int(values[failed].astype(np.int64).sum())
+                valid = columns.time_valid[mask] & failed
+                _add_by_second(self.failed_by_second, columns.time_us[mask][valid], values[valid], np.add)
+            elif metric_name == "iterations":
+                self.iterations += int(values.astype(np.int64).sum())
+            elif metric_name == "vus":
+                if len(values):
+                    vus = values.astype(np.int64)
+                    self.current_vus = int(vus[-1])
+                    self.vus = max(self.vus, int(vus.max()))
+                    valid = columns.time_valid[mask]
+                    _add_by_second(self.vus_by_second, columns.time_us[mask][valid], vus[valid], np.maximum)
+            elif metric_name == "vus_max":
+                if len(values):
+                    self.vus_max = max(self.vus_max, int(values.astype(np.int64).max()))
+
+    def merge(self, other: "ResultAggregator", concurrent: bool = False, series: bool = True) -> "ResultAggregator":
+        """
+        Fold in the aggregates of another part of the same run.
+
+        By default the part is a later stretch of the same result file, and
+        parts must be merged in file order for the live "current VUs" value.
+        With `concurrent` it is another execution segment running alongside
+        this one, so VU counts add up instead. Without `series` the
+        per-second chart data is left out, for cheap copies that only feed
+        snapshot().
+        """
+        self.http_reqs += other.http_reqs
+        self.http_req_failed += other.http_req_failed
+        self.iterations += other.iterations
+        if concurrent:
+            # Peaks of different segments need not coincide; their sum is an upper bound
+            self.vus += other.vus
+            self.vus_max += other.vus_max
+            self.current_vus += other.current_vus
+        else:
+            self.vus = max(self.vus, other.vus)
+            self.vus_max = max(self.vus_max, other.vus_max)
+            if other.vus:
+                self.current_vus = other.current_vus
+        for second, count in other.rps_by_second.items():
+            self.rps_by_second[second] = self.rps_by_second.get(second, 0) + count
+        self.latency.merge(other.latency)
+        if series:
+            for second, count in other.failed_by_second.items():
+                self.failed_by_second[second] = self.failed_by_second.get(second, 0) + count
+            combine = (lambda a, b: a + b) if concurrent else max
+            for second, vus in other.vus_by_second.items():
+                self.vus_by_second[second] = combine(self.vus_by_second.get(second, 0), vus)
+            self.latency_by_second.merge(other.latency_by_second)
+        return self
+
+    def has_data(self) -> bool:
+        """Whether any request or VU point has been seen."""
+        return bool(self.http_reqs or self.latency.count or self.vus)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Live view of the aggregates, cheap enough to send every second."""
+        # The newest second is usually still being written, report the one before it
+        rps = 0
+        if self.rps_by_second:
+            last_second = max(self.rps_by_second)
+            rps = self.rps_by_second.get(last_second - 1, self.rps_by_second[last_second])
+
+        return {
+            "http_reqs": self.http_reqs,
+            "http_req_failed": self.http_req_failed,
+            "error_rate": self.http_req_failed / self.http_reqs if self.http_reqs else 0,
+            "iterations": self.iterations,
+            "vus": self.current_vus,
+            "vus_max": self.vus_max,
+            "rps": rps,
+            "elapsed": len(self.rps_by_second),
+            "http_req_duration": self._duration_stats(),
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Final metrics in the format stored as the execution result summary."""
+        metrics = {
+            "http_reqs": self.http_reqs,
+            "http_req_duration": self._duration_stats(),
+            "http_req_failed": self.http_req_failed,
+            "iterations": self.iterations,
+            "vus": self.vus,
+            "vus_max": self.vus_max,
+            "duration": 0,
+            "rps": 0,
+            "rps_max": 0,
+        }
+
+        # Calculate RPS metrics
+        if self.rps_by_second:
+            rps_values = list(self.rps_by_second.values())
+            metrics["rps"] = sum(rps_values) / len(rps_values)
+            metrics["rps_max"] = max(rps_values)
+            metrics["duration"] = len(rps_values) * 1000  # Duration in ms
+
+        return metrics
+
+    def _duration_stats(self) -> Dict[str, float]:
+        """Calculate duration statistics."""
+        return self.latency.stats()
+
+    def _epoch_second(self, timestamp: str) -> int:
+        """Convert an RFC3339 timestamp to its epoch second."""
+        # K6 writes e.g. 2024-01-01T12:00:00.123456789+08:00 or ...Z
+        if timestamp[-6] in "+-":
+            key = timestamp[:19] + timestamp[-6:]
+        else:
+            key = timestamp[:19] + "+00:00"
+
+        if key != self._last_second_key:
+            self._last_second = int(datetime.fromisoformat(key).timestamp())
+            self._last_second_key = key
+        return self._last_second
+
+
+# Metrics the aggregator looks at
+_FED_METRICS = frozenset(("http_reqs", "http_req_duration", "http_req_failed", "iterations", "vus", "vus_max"))
+
+
+def _add_by_second(target: Dict[int, int], times_us: np.ndarray, values: np.ndarray, combine):
+    """Fold values into a per-second dict with a numpy ufunc (np.add or np.maximum)."""
+    if not len(values):
+        return
+    seconds = times_us // 1_000_000
+    unique, inverse = np.unique(seconds, return_inverse=True)
+    totals = np.zeros(len(unique), dtype=np.int64)
+    if combine is np.maximum:
+        totals[:] = np.iinfo(np.int64).min
+    combine.at(totals, inverse, values.astype(np.int64))
+    for second, total in zip(unique.tolist(), totals.tolist()):
+        target[second] = int(combine(target.get(second, 0), total))
+
+
+class ResultTailer:
+    """
+    Follow a K6 NDJSON result file while K6 is still writing it.
+
+    Gzip output (.gz) is inflated incrementally as compressed blocks are
+    flushed; points show up a little later than with plain output.
+    """
+
+    def __init__(
+        self,
+        result_file: str,
+        aggregator: Optional[ResultAggregator] = None,
+        interval: Optional[float] = None,
+    ):
+        self.result_file = result_file
+        self.aggregator = aggregator or ResultAggregator()
+        # Read at construction, not import, so a changed setting applies
+        self.interval = settings.LIVE_METRICS_INTERVAL if interval is None else interval
+        self._offset = 0
+        self._partial = b""
+        self._decompressor = _gzip_decompressor() if result_file.endswith(".gz") else None
+        self._stopped = asyncio.Event()
+        # True while _drain() runs in a thread and the aggregator is changing
+        self.draining = False
+
+    async def follow(self, on_metrics: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Tail the result file until stop() is called.
+
+        Args:
+            on_metrics: Callback receiving an aggregate snapshot every interval
+        """
+        while not self._stopped.is_set():
+            # File reads and JSON decoding stay off the event loop
+            self.draining = True
+            try:
+                await asyncio.to_thread(self._drain)
+            finally:
+                self.draining = False
+
+            if on_metrics and self.aggregator.has_data():
+                await on_metrics(self.aggregator.snapshot())
+
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+        # Pick up everything written before K6 exited
+        self.draining = True
+        try:
+            await asyncio.to_thread(self._drain, True)
+        finally:
+            self.draining = False
+
+    def stop(self):
+        """Ask follow() to do a final drain and return."""
+        self._stopped.set()
+
+    def _drain(self, final: bool = False):
+        """Feed all complete lines appended since the last drain."""
+        if not os.path.exists(self.result_file):
+            return
+
+        with metrics.PARSE_SECONDS.time(stage="tail"), open(self.result_file, "rb") as f:
+            f.seek(self._offset)
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self._offset += len(chunk)
+                if self._decompressor:
+                    chunk = self._inflate(chunk)
+
+                lines = (self._partial + chunk).split(b"\n")
+                # The last piece may be a line K6 has not finished writing
+                self._partial = lines.pop()
+                for line in lines:
+                    if line:
+                        self.aggregator.feed_line(line)
+
+        if final and self._partial:
+            self.aggregator.feed_line(self._partial)
+            self._partial = b""
+
+    def _inflate(self, data: bytes) -> bytes:
+        """Decompress newly read gzip bytes, following into further gzip members."""
+        output = self._decompressor.decompress(data)
+        while self._decompressor.eof and self._decompressor.unused_data:
+            rest = self._decompressor.unused_data
+            self._decompressor = _gzip_decompressor()
+            output += self._decompressor.decompress(rest)
+        return output
+
+
+def _gzip_decompressor():
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
@@ -0,0 +1,346 @@
+"""Columnar store of K6 result points for time-series queries."""
+import json
+import math
+import os
+import shutil
+import threading
+import uuid
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+import orjson
+
+from ..config import settings
+from . import bulk_parser
+from .latency_sketch import LatencySketch, quantile_from_key
+from .result_parser import open_result_file
+
+
+STORE_VERSION = 1
+
+# Upper bound on buckets per query (default step is chosen to stay below it)
+MAX_POINTS = 2000
+
+_AGGREGATIONS = ("avg", "sum", "min", "max", "count", "rate")
+
+# Builds of a store and requests opening it take the lock of their execution
+# (striped by id), so a request never sees or races a half-built store
+_BUILD_LOCKS = [threading.Lock() for _ in range(64)]
+
+
+def store_dir_for(execution_id: int) -> str:
+    """Directory holding the columnar store of an execution."""
+    return os.path.join(settings.RESULTS_DIR, f"store_{execution_id}")
+
+
+class ResultStore:
+    """
+    Per-execution columnar copy of the K6 result file.
+
+    Layout of the store directory:
+        meta.json   metric names, tag set dictionary and row groups
+        m<i>.time   int64 epoch microseconds of metric i
+        m<i>.value  float64 values of metric i
+        m<i>.tag    int32 tag set ids of metric i
+
+    Every parsed chunk of the result file becomes one row group per metric,
+    sorted by time, with its time range recorded in meta.json. Queries skip
+    row groups outside the requested range, binary-search the boundary
+    groups and read the columns through memory maps, so only the selected
+    rows are ever loaded.
+    """
+
+    def __init__(self, path: str, meta: Dict[str, Any]):
+        self.path = path
+        self.meta = meta
+        self.metrics = {m["name"]: i for i, m in enumerate(meta["metrics"])}
+        self.tag_sets: List[Dict[str, str]] = meta["tag_sets"]
+
+    @classmethod
+    def open(cls, path: str) -> Optional["ResultStore"]:
+        """Open an existing store, None if it is missing or from another version."""
+        try:
+            with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != STORE_VERSION:
+            return None
+        return cls(path, meta)
+
+    @classmethod
+    def build(cls, result_file: str, path: str) -> "ResultStore":
+        """Convert a K6 NDJSON result file into a store at `path` (replacing any old one)."""
+        # Unique, so two builds of the same store never write into one directory
+        building = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(building)
+
+        try:
+            metrics: List[Dict[str, Any]] = []
+            metric_index: Dict[str, int] = {}
+            tag_index: Dict[bytes, int] = {b"": 0}
+            tag_sets: List[Dict[str, str]] = [{}]
+            files: Dict[int, List] = {}
+
+            try:
+                with open_result_file(result_file) as f:
+                    for chunk in bulk_parser.iter_chunks(f):
+                        columns = bulk_parser.decode_points(chunk, with_tags=True)
+                        if len(columns) == 0:
+                            continue
+
+                        tag_ids = np.fromiter(
+                            (tag_index.setdefault(raw, len(tag_index)) for raw in columns.tags),
+                            dtype=np.int32,
+                            count=len(columns),
+                        )
+                        for raw in list(tag_index)[len(tag_sets):]:
+                            tag_sets.append(_decode_tags(raw))
+
+                        for local_id, name in enumerate(columns.metric_names):
+                            mask = (columns.metric_ids == local_id) & columns.time_valid
+                            if not mask.any():
+                                continue
+                            if name not in metric_index:
+                                metric_index[name] = len(metrics)
+                                metrics.append({"name": name, "count": 0, "groups": []})
+                                files[metric_index[name]] = [
+                                    open(os.path.join(building, f"m{metric_index[name]}.{column}"), "wb")
+                                    for column in ("time", "value", "tag")
+                                ]
+                            metric = metrics[metric_index[name]]
+
+                            times = columns.time_us[mask]
+                            order = np.argsort(times, kind="stable")
+                            times = times[order]
+                            time_file, value_file, tag_file = files[metric_index[name]]
+                            time_file.write(times.tobytes())
+                            value_file.write(columns.values[mask][order].tobytes())
+                            tag_file.write(tag_ids[mask][order].tobytes())
+
+                            # [first row, row count, min time, max time]
+                            metric["groups"].append([metric["count"], len(times), int(times[0]), int(times[-1])])
+                            metric["count"] += len(times)
+            finally:
+                for handles in files.values():
+                    for handle in handles:
+                        handle.close()
+
+            meta = {
+                "version": STORE_VERSION,
+                "source": os.path.basename(result_file),
+                "metrics": metrics,
+                "tag_sets": tag_sets,
+            }
+            with open(os.path.join(building, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+        except BaseException:
+            shutil.rmtree(building, ignore_errors=True)
+            raise
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(building, path)
+        return cls(path, meta)
+
+    def time_range(self, metric: str) -> Optional[List[int]]:
+        """[first, last] epoch microseconds of a metric, None if it has no points."""
+        groups = self.meta["metrics"][self.metrics[metric]]["groups"]
+        if not groups:
+            return None
+        return [min(g[2] for g in groups), max(g[3] for g in groups)]
+
+    def query(
+        self,
+        metric: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        step: Optional[float] = None,
+        agg: str = "avg",
+        tags: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Aggregate one metric into fixed time buckets.
+
+        Args:
+            metric: Metric name (KeyError if the run has no such metric)
+            start: Range start, epoch seconds (default: first point)
+            end: Range end, epoch seconds, exclusive (default: after the last point)
+            step: Bucket width in seconds (default: fit in MAX_POINTS buckets)
+            agg: avg, sum, min, max, count, rate (count per second) or a quantile like p95 or p999
+            tags: Only points whose tags contain all these key/value pairs
+
+        Returns:
+            {"metric", "agg", "step", "times": [bucket start, epoch s], "values", "counts"}
+        """
+        for name, value in (("from", start), ("to", end), ("step", step)):
+            if value is not None and not math.isfinite(value):
+                raise ValueError(f"{name} must be a finite number")
+        quantile = _parse_aggregation(agg)
+        metric_id = self.metrics[metric]
+        bounds = self.time_range(metric)
+        empty = {"metric": metric, "agg": agg, "step": step, "times": [], "values": [], "counts": []}
+        if bounds is None:
+            return empty
+
+        start_us = bounds[0] if start is None else int(start * 1_000_000)
+        end_us = bounds[1] + 1 if end is None else int(end * 1_000_000)
+        if end_us <= start_us:
+            return empty
+        if step is None:
+            step = max(1, math.ceil((end_us - start_us) / 1_000_000 / MAX_POINTS))
+        step_us = int(step * 1_000_000)
+        if step_us <= 0:
+            raise ValueError("step must be positive")
+        start_us -= start_us % step_us  # Align buckets to whole steps
+        bucket_count = -(-(end_us - start_us) // step_us)
+        if bucket_count > MAX_POINTS:
+            raise ValueError(f"Too many points ({bucket_count}), use a larger step (max {MAX_POINTS})")
+
+        allowed_tags = self._matching_tag_sets(tags) if tags else None
+
+        counts = np.zeros(bucket_count, dtype=np.int64)
+        sums = np.zeros(bucket_count, dtype=np.float64)
+        mins = np.full(bucket_count, np.inf)
+        maxs = np.full(bucket_count, -np.inf)
+        sketches: Dict[int, LatencySketch] = {}
+
+        columns = self._columns(metric_id)
+        for first, count, group_start, group_end in self.meta["metrics"][metric_id]["groups"]:
+            if group_end < start_us or group_start >= end_us:
+                continue
+            times = columns["time"][first:first + count]
+            low, high = np.searchsorted(times, [start_us, end_us])
+            if low == high:
+                continue
+            times = np.asarray(times[low:high])
+            values = np.asarray(columns["value"][first + low:first + high])
+            if allowed_tags is not None:
+                keep = np.isin(columns["tag"][first + low:first + high], allowed_tags)
+                times, values = times[keep], values[keep]
+                if len(times) == 0:
+                    continue
+
+            # Times are sorted within a group, so buckets form contiguous runs
+            buckets = (times - start_us) // step_us
+            run_starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+            run_buckets = buckets[run_starts]
+            counts[run_buckets] += np.diff(np.append(run_starts, len(buckets)))
+            sums[run_buckets] += np.add.reduceat(values, run_starts)
+            mins[run_buckets] = np.minimum(mins[run_buckets], np.minimum.reduceat(values, run_starts))
+            maxs[run_buckets] = np.maximum(maxs[run_buckets], np.maximum.reduceat(values, run_starts))
+            if quantile is not None:
+                for bucket, values_in_bucket in zip(run_buckets.tolist(), np.split(values, run_starts[1:])):
+                    sketch = sketches.get(bucket)
+                    if sketch is None:
+                        sketch = sketches[bucket] = LatencySketch()
+                    sketch.add_many(values_in_bucket)
+
+        present = np.flatnonzero(counts)
+        if agg == "avg":
+            values = sums[present] / counts[present]
+        elif agg == "sum":
+            values = sums[present]
+        elif agg == "min":
+            values = mins[present]
+        elif agg == "max":
+            values = maxs[present]
+        elif agg == "count":
+            values = counts[present].astype(np.float64)
+        elif agg == "rate":
+            values = counts[present] / step
+        else:
+            values = np.array([sketches[bucket].quantile(quantile) for bucket in present.tolist()])
+
+        return {
+            "metric": metric,
+            "agg": agg,
+            "step": step,
+            "times": ((start_us + present * step_us) / 1_000_000).tolist(),
+            "values": values.tolist(),
+            "counts": counts[present].tolist(),
+        }
+
+    def _columns(self, metric_id: int) -> Dict[str, np.ndarray]:
+        """Memory-mapped columns of one metric."""
+        count = self.meta["metrics"][metric_id]["count"]
+        return {
+            column: np.memmap(
+                os.path.join(self.path, f"m{metric_id}.{column}"), dtype=dtype, mode="r", shape=(count,)
+            ) if count else np.zeros(0, dtype=dtype)
+            for column, dtype in (("time", np.int64), ("value", np.float64), ("tag", np.int32))
+        }
+
+    def _matching_tag_sets(self, tags: Dict[str, str]) -> np.ndarray:
+        """Ids of the tag sets containing every requested key/value pair."""
+        return np.array([
+            tag_id for tag_id, tag_set in enumerate(self.tag_sets)
+            if all(tag_set.get(key) == value for key, value in tags.items())
+        ], dtype=np.int32)
+
+
+def build_for(execution_id: int, result_file: str) -> ResultStore:
+    """
+    Build the store of an execution from its result file.
+
+    A store already built from that file (by a request that came first) is
+    kept rather than replaced under the readers that may have it open.
+    """
+    path = store_dir_for(execution_id)
+    with _build_lock(execution_id):
+        store = ResultStore.open(path)
+        if store is None or store.meta["source"] != os.path.basename(result_file):
+            store = ResultStore.build(result_file, path)
+    return store
+
+
+def open_or_build(execution_id: int, result_file: Optional[str]) -> Optional[ResultStore]:
+    """
+    Open the store of an execution, building it from its result file if needed.
+
+    Waits for a build of the same execution in progress (see build_for)
+    instead of starting a second one.
+    """
+    path = store_dir_for(execution_id)
+    with _build_lock(execution_id):
+        store = ResultStore.open(path)
+        if store is None and result_file and os.path.exists(result_file):
+            store = ResultStore.build(result_file, path)
+    return store
+
+
+def _build_lock(execution_id: int) -> threading.Lock:
+    return _BUILD_LOCKS[execution_id % len(_BUILD_LOCKS)]
+
+
+def parse_tag_filter(text: Optional[str]) -> Optional[Dict[str, str]]:
+    """Parse "status:200,method:GET" into a dict."""
+    if not text:
+        return None
+    tags = {}
+    for pair in text.split(","):
+        key, sep, value = pair.partition(":")
+        if not sep or not key.strip():
+            raise ValueError(f"Invalid tag filter: {pair}")
+        tags[key.strip()] = value.strip()
+    return tags
+
+
+def _parse_aggregation(agg: str) -> Optional[float]:
+    """Validate an aggregation name; returns the quantile for p95, p999 or p99.9, else None."""
+    if agg in _AGGREGATIONS:
+        return None
+    quantile = quantile_from_key(agg)
+    if quantile is None:
+        raise ValueError(f"Unknown aggregation: {agg}")
+    return quantile
+
+
+def _decode_tags(raw: bytes) -> Dict[str, str]:
+    """Tag set dict from its raw JSON object."""
+    if not raw:
+        return {}
+    try:
+        tags = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return {}
+    return tags if isinstance(tags, dict) else {}
@@ -0,0 +1,392 @@
+"""Server-side execution queue and scheduler."""
+import asyncio
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from fastapi import WebSocket
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import undefer
+
+from ..config import settings
+from .. import metrics
+from ..database import AsyncSessionLocal
+from ..models import TestConfig, TestExecution
+from ..websocket import manager
+from .k6_generator import K6ScriptGenerator
+from .script_cache import ScriptCache
+from .k6_executor import K6Executor
+from .agents import AgentRegistry, RemoteSegmentWorker
+from .segment_worker import MAX_SEGMENTS
+from .data_files import DATA_DISTRIBUTIONS, data_dependencies
+from .profiling import PhaseTimer, SamplingProfiler, start_profile, finish_profile
+from . import result_store, regression, execution_summaries
+
+
+class ExecutionScheduler:
+    """
+    Run queued test executions with a concurrency limit.
+
+    The queue is the test_executions table itself: an execution is created
+    with status "queued", its priority and the original run request, and
+    the scheduler starts the highest-priority, oldest queued execution
+    whenever fewer than MAX_CONCURRENT_EXECUTIONS are running. Because the
+    queue lives in the database, queued runs survive a backend restart, and
+    because runs are owned by the scheduler rather than a WebSocket, they
+    continue when the browser disconnects. Clients follow an execution by
+    subscribing to it through the connection manager.
+
+    When load generator agents are registered and a run asks for them
+    ("useAgents": true), it is spread across all of them, one execution
+    segment per agent sized by its capacity.
+    """
+
+    def __init__(self, max_concurrent: Optional[int] = None, agents: Optional[AgentRegistry] = None):
+        self.max_concurrent = max_concurrent or settings.MAX_CONCURRENT_EXECUTIONS
+        self.agents = agents or AgentRegistry()
+        self._running: Dict[int, K6Executor] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        """Recover state left by a previous process and start queued runs."""
+        async with AsyncSessionLocal() as db:
+            # K6 processes do not outlive the backend
+            interrupted = (await db.scalars(
+                select(TestExecution).where(TestExecution.status == "running")
+            )).all()
+            for execution in interrupted:
+                execution.status = "failed"
+                execution.end_time = datetime.utcnow()
+                await db.run_sync(execution_summaries.sync, execution)
+            await db.commit()
+        await self.dispatch()
+
+    async def shutdown(self):
+        """Stop all running tests and wait for their records to be written."""
+        for executor in list(self._running.values()):
+            executor.stop()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def enqueue(
+        self,
+        config_data: Dict[str, Any],
+        priority: int = 0,
+        subscriber: Optional[WebSocket] = None,
+    ) -> TestExecution:
+        """
+        Queue a test run.
+
+        Args:
+            config_data: Run request as sent by the frontend ("config" of the run action)
+            priority: Higher runs first; equal priorities run in submission order
+            subscriber: Connection to follow the run from its first message
+
+        Raises:
+            ValueError: If the request is invalid
+        """
+        if not config_data.get("url"):
+            raise ValueError("URL is required")
+        segments = config_data.get("segments")
+        if segments is not None and (not isinstance(segments, int) or not 1 <= segments <= MAX_SEGMENTS):
+            raise ValueError(f"segments must be between 1 and {MAX_SEGMENTS}")
+        if config_data.get("dataDistribution", "round-robin") not in DATA_DISTRIBUTIONS:
+            raise ValueError(f"dataDistribution must be one of: {', '.join(DATA_DISTRIBUTIONS)}")
+
+        async with AsyncSessionLocal() as db:
+            stages_data = config_data.get("stages", [])
+            thresholds_data = config_data.get("thresholds", [])
+            db_config = TestConfig(
+                name=config_data.get("name", "Quick Test"),
+                url=config_data["url"],
+                method=config_data.get("method", "GET"),
+                headers=config_data.get("headers", []),
+                body=config_data.get("body"),
+                vus=config_data.get("vus", 1),
+                duration=config_data.get("duration", "30s"),
+                stages=stages_data if stages_data else None,
+                thresholds=thresholds_data if thresholds_data else None,
+                data_file=config_data.get("dataFile"),
+            )
+            db.add(db_config)
+            await db.flush()
+
+            execution = TestExecution(
+                config_id=db_config.id,
+                status="queued",
+                priority=priority,
+                run_request=config_data,
+            )
+            db.add(execution)
+            await db.flush()
+            # The summary reads deferred columns, which need the sync session to load
+            await db.run_sync(execution_summaries.sync, execution)
+            await db.commit()
+
+        if subscriber:
+            manager.subscribe(subscriber, execution.id)
+        await self.dispatch()
+        return execution
+
+    async def cancel(self, execution_id: int) -> bool:
+        """Cancel a queued execution or stop a running one. False if it is neither."""
+        executor = self._running.get(execution_id)
+        if executor:
+            # Also effective before K6 has started: the executor then never starts it
+            executor.stop()
+            return True
+
+        async with self._lock:
+            async with AsyncSessionLocal() as db:
+                execution = await db.scalar(select(TestExecution).where(
+                    TestExecution.id == execution_id,
+                    TestExecution.status == "queued",
+                ))
+                if not execution:
+                    return False
+                execution.status = "cancelled"
+                execution.end_time = datetime.utcnow()
+                await db.run_sync(execution_summaries.sync, execution)
+                await db.commit()
+
+        await manager.publish(execution_id, {"type": "status", "status": "cancelled", "execution_id": execution_id})
+        await self._publish_positions()
+        return True
+
+    async def queued(self) -> List[Dict[str, Any]]:
+        """Queued executions in the order they will run."""
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(TestExecution.id, TestExecution.priority, TestExecution.created_at)
+                .where(TestExecution.status == "queued")
+                .order_by(TestExecution.priority.desc(), TestExecution.id)
+            )).all()
+        return [
+            {"execution_id": row.id, "position": position, "priority": row.priority, "created_at": row.created_at}
+            for position, row in enumerate(rows, 1)
+        ]
+
+    async def queue_depth(self) -> int:
+        """Number of queued executions."""
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(
+                select(func.count()).select_from(TestExecution).where(TestExecution.status == "queued")
+            )
+
+    async def position(self, execution_id: int) -> Optional[int]:
+        """1-based queue position, None if the execution is not queued."""
+        for entry in await self.queued():
+            if entry["execution_id"] == execution_id:
+                return entry["position"]
+        return None
+
+    @property
+    def running_count(self) -> int:
+        """Number of executions running on this backend."""
+        return len(self._running)
+
+    async def status(self) -> Dict[str, Any]:
+        """Running and queued executions."""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "running": sorted(self._running),
+            "queued": await self.queued(),
+        }
+
+    async def dispatch(self):
+        """Start queued executions while there is capacity."""
+        started = False
+        async with self._lock:
+            while len(self._running) < self.max_concurrent:
+                async with AsyncSessionLocal() as db:
+                    execution = await db.scalar(
+                        select(TestExecution)
+                        .options(undefer(TestExecution.run_request))
+                        .where(TestExecution.status == "queued")
+                        .order_by(TestExecution.priority.desc(), TestExecution.id)
+                        .limit(1)
+                    )
+                    if not execution:
+                        break
+                    execution.status = "running"
+                    execution.start_time = datetime.utcnow()
+                    await db.run_sync(execution_summaries.sync, execution)
+                    await db.commit()
+                    execution_id = execution.id
+                    config_id = execution.config_id
+                    config_data = execution.run_request or {}
+
+                self._running[execution_id] = K6Executor()
+                self._tasks[execution_id] = asyncio.create_task(self._run(execution_id, config_data, config_id))
+                started = True
+
+        if started:
+            await self._publish_positions()
+
+    async def _run(self, execution_id: int, config_data: Dict[str, Any], config_id: Optional[int] = None):
+        """Generate the script, run K6 and store the result of one execution."""
+        executor = self._running[execution_id]
+        timer = PhaseTimer()
+        profiler = None
+        try:
+            await manager.publish(execution_id, {"type": "status", "status": "starting", "execution_id": execution_id})
+
+            if config_data.get("profile") and settings.PROFILER_ENABLED:
+                profiler = start_profile()
+                if profiler is None:
+                    await manager.publish_log(execution_id, "[WARN] Another execution is being profiled, not profiling this one")
+
+            # Extract configuration - two-level mode structure
+            stages_data = config_data.get("stages", [])
+            rps_stages_data = config_data.get("rpsStages", [])
+            thresholds_data = config_data.get("thresholds", [])
+
+            # Data file ingestion and rendering block; keep them off the event loop
+            generator = K6ScriptGenerator()
+            script_path = await asyncio.to_thread(
+                generator.generate,
+                name=config_data.get("name", "Quick Test"),
+                url=config_data["url"],
+                method=config_data.get("method", "GET"),
+                headers=config_data.get("headers", []),
+                body=config_data.get("body"),
+                load_category=config_data.get("loadCategory", "vus"),
+                load_sub_mode=config_data.get("loadSubMode", "simple"),
+                vus=config_data.get("vus", 1),
+                duration=config_data.get("duration", "30s"),
+                stages=stages_data if stages_data else None,
+                rps=config_data.get("rps", 100),
+                pre_allocated_vus=config_data.get("preAllocatedVUs", 10),
+                max_vus=config_data.get("maxVUs", 100),
+                rps_stages=rps_stages_data if rps_stages_data else None,
+                thresholds=thresholds_data if thresholds_data else None,
+                stop_on_failure=config_data.get("stopOnFailure", False),
+                data_file=config_data.get("dataFile"),
+                data_distribution=config_data.get("dataDistribution", "round-robin"),
+                timer=timer,
+            )
+
+            # Identical configs share one cached script; record which one ran
+            with timer.span("db.script_hash"):
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(TestExecution)
+                        .where(TestExecution.id == execution_id)
+                        .values(script_hash=ScriptCache.key_of(script_path))
+                    )
+                    await db.commit()
+
+            await manager.publish_log(execution_id, f"Generated script: {script_path}")
+            await manager.publish(execution_id, {"type": "status", "status": "running", "execution_id": execution_id})
+
+            async def on_log(log: str):
+                await manager.publish_log(execution_id, log)
+
+            async def on_metrics(snapshot: Dict[str, Any]):
+                metrics.observe_execution(execution_id, config_id, snapshot)
+                await manager.publish(execution_id, {"type": "metrics", "execution_id": execution_id, "data": snapshot})
+
+            # Remote agents are opt-in per run: the script and data files are sent to them
+            agents = self.agents.available() if config_data.get("useAgents", False) else []
+
+            result = await executor.run(
+                script_path=script_path,
+                execution_id=execution_id,
+                on_log=on_log,
+                on_metrics=on_metrics,
+                segments=config_data.get("segments"),
+                workers=[RemoteSegmentWorker(agent) for agent in agents] or None,
+                weights=[agent.weight for agent in agents] or None,
+                dependencies=data_dependencies(config_data.get("dataFile")),
+                timer=timer,
+            )
+
+            # Written through the async driver: other streams keep flowing meanwhile
+            with timer.span("db.result"):
+                async with AsyncSessionLocal() as db:
+                    execution = await db.get(TestExecution, execution_id)
+                    execution.end_time = datetime.utcnow()
+                    if result.get("cancelled"):
+                        execution.status = "cancelled"
+                    else:
+                        execution.status = "completed" if result.get("success") else "failed"
+                    execution.result_summary = result.get("summary")
+                    execution.latency_sketch = result.get("latency_sketch")
+                    execution.result_file = result.get("result_file")
+                    # Head and tail only, the full log is in log_file
+                    execution.logs = result.get("log_excerpt")
+                    execution.log_file = result.get("log_file")
+                    await db.run_sync(execution_summaries.sync, execution)
+                    await db.commit()
+                    status = execution.status
+                    result_file = execution.result_file
+
+            # Verdict against the previous runs of the same script
+            report = None
+            if status == "completed" and result.get("latency_sketch"):
+                try:
+                    with timer.span("regression"):
+                        report = await asyncio.to_thread(regression.record_verdict, execution_id)
+                except Exception as e:
+                    print(f"Error comparing with baseline: {e}")
+
+            # Columnar copy of the result file for time-series queries, ready
+            # before clients are told the result is there and start querying it
+            if result_file:
+                try:
+                    with metrics.PARSE_SECONDS.time(stage="store"), timer.span("result.store"):
+                        await asyncio.to_thread(result_store.build_for, execution_id, result_file)
+                except Exception as e:
+                    print(f"Error building result store: {e}")
+
+            await manager.publish(execution_id, {"type": "status", "status": status, "execution_id": execution_id})
+            await manager.publish(execution_id, {
+                "type": "result",
+                "data": {
+                    "execution_id": execution_id,
+                    "success": result.get("success", False),
+                    "summary": result.get("summary"),
+                    "regression": report,
+                },
+            })
+
+        except Exception as e:
+            async with AsyncSessionLocal() as db:
+                execution = await db.get(TestExecution, execution_id)
+                if execution and execution.status == "running":
+                    execution.status = "failed"
+                    execution.end_time = datetime.utcnow()
+                    await db.run_sync(execution_summaries.sync, execution)
+                    await db.commit()
+            await manager.publish(execution_id, {"type": "error", "message": f"Error running test: {str(e)}"})
+            await manager.publish(execution_id, {"type": "status", "status": "failed", "execution_id": execution_id})
+
+        finally:
+            metrics.forget_execution(execution_id, config_id)
+            await self._save_phases(execution_id, timer, profiler)
+            self._running.pop(execution_id, None)
+            self._tasks.pop(execution_id, None)
+            await self.dispatch()
+
+    async def _save_phases(self, execution_id: int, timer: PhaseTimer, profiler: Optional[SamplingProfiler] = None):
+        """Store the phase timings of a finished execution and its profile, if one was taken."""
+        try:
+            phases = timer.to_dict()
+            if profiler is not None:
+                await asyncio.to_thread(finish_profile, profiler, execution_id)
+                phases["profile"] = {"samples": profiler.samples, "interval": profiler.interval}
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(TestExecution).where(TestExecution.id == execution_id).values(phases=phases))
+                await db.commit()
+        except Exception as e:
+            print(f"Error saving phase timings: {e}")
+
+    async def _publish_positions(self):
+        """Tell subscribers of queued executions where they stand."""
+        for entry in await self.queued():
+            await manager.publish(entry["execution_id"], {
+                "type": "queue",
+                "execution_id": entry["execution_id"],
+                "position": entry["position"],
+            })
+
@@ -0,0 +1,145 @@
+"""Content-addressed store for generated K6 scripts and their archives."""
+import asyncio
+import os
+import time
+import uuid
+from typing import Optional, List, Tuple, Sequence
+
+from ..config import settings
+
+
+class ScriptCache:
+    """
+    Generated scripts keyed by the hash of the config they were built from.
+
+    A script lives at `<hash>.js` in the scripts directory, so a run with an
+    identical config reuses the file instead of rendering and writing it
+    again. Using a script refreshes its modification time, which makes the
+    directory an LRU: when it holds more than `max_files` files or
+    `max_bytes` bytes, the least recently used ones are deleted. Scripts
+    used within the last `min_age` seconds are kept regardless, as a run
+    may be about to start K6 on them.
+
+    Next to a script, `<hash>.tar` holds its `k6 archive`: the script with
+    every module it imports and every file it open()s, so running it needs
+    no module resolution, remote fetch or data file on the machine running K6.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_files: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        min_age: float = 60,
+    ):
+        self.directory = directory or settings.SCRIPTS_DIR
+        self.max_files = settings.SCRIPT_CACHE_MAX_FILES if max_files is None else max_files
+        self.max_bytes = settings.SCRIPT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.min_age = min_age
+
+    def path_for(self, key: str) -> str:
+        """Location of the script with this hash."""
+        return os.path.join(self.directory, f"{key}.js")
+
+    @staticmethod
+    def key_of(path: str) -> str:
+        """Hash of a cached script from its path."""
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of a cached script, marked as recently used; None on a miss."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, content: str) -> str:
+        """Store a script and evict old ones if the cache is over its limits."""
+        path = self.path_for(key)
+        # Write then rename, so a concurrent run never sees a partial script
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temporary, path)
+        self.evict()
+        return path
+
+    async def archive(
+        self,
+        script_path: str,
+        k6_path: Optional[str] = None,
+        dependencies: Sequence[str] = (),
+    ) -> str:
+        """
+        Path of the archive of a cached script, building it if needed.
+
+        The script itself never changes (its name is its content hash), but
+        files it reads may: the archive is rebuilt when one of
+        `dependencies` is newer than it.
+
+        Raises:
+            RuntimeError: If `k6 archive` fails
+        """
+        archive_path = os.path.splitext(script_path)[0] + ".tar"
+        try:
+            built = os.path.getmtime(archive_path)
+            if all(os.path.getmtime(path) <= built for path in dependencies if os.path.exists(path)):
+                os.utime(archive_path)
+                return archive_path
+        except FileNotFoundError:
+            pass
+
+        temporary = f"{archive_path}.{uuid.uuid4().hex}.tmp"
+        process = await asyncio.create_subprocess_exec(
+            k6_path or settings.K6_PATH, "archive", "--archive-out", temporary, script_path,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        output, _ = await process.communicate()
+        if process.returncode != 0 or not os.path.exists(temporary):
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            message = output.decode("utf-8", errors="replace").strip().splitlines()[-3:]
+            raise RuntimeError(f"k6 archive exited with code {process.returncode}: {' '.join(message)}")
+        os.replace(temporary, archive_path)
+        self.evict()
+        return archive_path
+
+    def evict(self) -> int:
+        """Delete least recently used scripts and archives until within limits. Returns the number deleted."""
+        entries = self._entries()
+        total_bytes = sum(size for _, _, size in entries)
+        count = len(entries)
+        now = time.time()
+        deleted = 0
+        # Oldest first; files from before the cache (timestamped names) age out the same way
+        for path, mtime, size in sorted(entries, key=lambda entry: entry[1]):
+            if count <= self.max_files and total_bytes <= self.max_bytes:
+                break
+            if now - mtime < self.min_age:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            count -= 1
+            total_bytes -= size
+            deleted += 1
+        return deleted
+
+    def _entries(self) -> List[Tuple[str, float, int]]:
+        """(path, mtime, size) of every script and archive in the directory."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith((".js", ".tar")) or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return entries
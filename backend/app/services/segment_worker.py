@@ -0,0 +1,222 @@
+"""Workers that run one execution segment of a K6 test."""
+import abc
+import asyncio
+import codecs
+import re
+import sys
+from fractions import Fraction
+from typing import Optional, Callable, List, Sequence, Any
+
+from ..config import settings
+
+
+# Bytes read from K6's stdout/stderr per read call
+OUTPUT_READ_SIZE = 64 * 1024
+
+# Seconds K6 gets to shut down after stop() before it is killed
+STOP_GRACE_SECONDS = 5
+
+# Upper limit on the execution segments of one run
+MAX_SEGMENTS = 64
+
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+
+def segment_sequence(count: int, weights: Optional[Sequence[float]] = None) -> List[Fraction]:
+    """
+    Boundaries of `count` consecutive execution segments covering 0..1.
+
+    Segments are equal unless `weights` gives their relative sizes (e.g. the
+    capacity of the machine running each one).
+    """
+    if not 1 <= count <= MAX_SEGMENTS:
+        raise ValueError(f"Between 1 and {MAX_SEGMENTS} segments are supported")
+    if weights is None:
+        weights = [1] * count
+    if len(weights) != count or any(w <= 0 for w in weights):
+        raise ValueError("One positive weight per segment is required")
+
+    # Rational weights keep the boundaries exact, as K6 expects
+    parts = [Fraction(w).limit_denominator(1000) for w in weights]
+    total = sum(parts)
+    bounds = [Fraction(0)]
+    for part in parts:
+        bounds.append(bounds[-1] + part / total)
+    bounds[-1] = Fraction(1)
+    return bounds
+
+
+class SegmentWorker(abc.ABC):
+    """
+    Runs K6 for one execution segment.
+
+    K6Executor talks to workers only through this interface: run() gets the
+    script, the segment, the whole segment sequence and the local path the
+    NDJSON output must end up at, and reports output lines as they arrive.
+    A worker on another machine implements the same calls by forwarding
+    them over the agent protocol and writing the streamed output locally.
+    """
+
+    @abc.abstractmethod
+    async def run(
+        self,
+        script_path: str,
+        result_file: str,
+        on_line: Callable[[str], Any],
+        segment: Optional[str] = None,
+        sequence: Optional[str] = None,
+    ) -> int:
+        """
+        Run K6 and return its exit code.
+
+        Args:
+            script_path: K6 script to run
+            result_file: Path of the NDJSON output (.json or .json.gz)
+            on_line: Coroutine function awaited for every output line
+            segment: Execution segment, e.g. "1/4:1/2" (None runs the whole test)
+            sequence: Execution segment sequence, e.g. "0,1/4,1/2,3/4,1"
+        """
+
+    @abc.abstractmethod
+    def stop(self):
+        """Ask the running K6 to stop; run() returns once it has exited."""
+
+    @abc.abstractmethod
+    def describe(self) -> str:
+        """Short name for log lines."""
+
+
+class LocalSegmentWorker(SegmentWorker):
+    """Runs K6 as a subprocess of the backend."""
+
+    def __init__(self, k6_path: Optional[str] = None):
+        self.k6_path = k6_path or settings.K6_PATH
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._stop_requested = False
+
+    def describe(self) -> str:
+        return "local"
+
+    def command(
+        self,
+        script_path: str,
+        result_file: str,
+        segment: Optional[str] = None,
+        sequence: Optional[str] = None,
+    ) -> List[str]:
+        """K6 command line for one segment."""
+        # --no-color for cleaner output
+        cmd = [
+            self.k6_path,
+            "run",
+            "--out", f"json={result_file}",
+            "--no-color",
+        ]
+        if segment:
+            # Also visible to the script, which loads only its segment's data rows
+            cmd += ["--execution-segment", segment, "--env", f"EXECUTION_SEGMENT={segment}"]
+            if sequence:
+                cmd += ["--execution-segment-sequence", sequence]
+        cmd.append(script_path)
+        return cmd
+
+    async def run(
+        self,
+        script_path: str,
+        result_file: str,
+        on_line: Callable[[str], Any],
+        segment: Optional[str] = None,
+        sequence: Optional[str] = None,
+    ) -> int:
+        cmd = self.command(script_path, result_file, segment, sequence)
+        if not supports_subprocesses(asyncio.get_running_loop()):
+            raise RuntimeError(
+                "The event loop does not support subprocesses; "
+                "on Windows run uvicorn with the Proactor event loop"
+            )
+        self.process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        process = self.process
+        # stop() came while the process was being created
+        if self._stop_requested:
+            self.stop()
+
+        await on_line(f"[INFO] Command: {' '.join(cmd)}")
+
+        # Read stdout and stderr concurrently, each line handled as it arrives
+        reader_tasks = [
+            asyncio.create_task(read_lines(process.stdout, on_line)),
+            asyncio.create_task(read_lines(process.stderr, on_line)),
+        ]
+        try:
+            await asyncio.gather(*reader_tasks)
+            return await process.wait()
+        finally:
+            # Also reached when the run task is cancelled: leave nothing running
+            for task in reader_tasks:
+                task.cancel()
+            if process.returncode is None:
+                kill(process)
+
+    def stop(self):
+        """
+        Sends SIGTERM so K6 can write its summary, and kills it if it is
+        still running after STOP_GRACE_SECONDS.
+        """
+        self._stop_requested = True
+        process = self.process
+        if not process or process.returncode is not None:
+            return
+        try:
+            process.terminate()
+        except ProcessLookupError:
+            return
+        asyncio.get_running_loop().call_later(STOP_GRACE_SECONDS, kill, process)
+
+
+def supports_subprocesses(loop: asyncio.AbstractEventLoop) -> bool:
+    """Whether the loop can run subprocesses: on Windows only the Proactor loop can."""
+    if sys.platform == "win32":
+        return isinstance(loop, asyncio.ProactorEventLoop)
+    return True
+
+
+async def read_lines(stream: asyncio.StreamReader, on_line: Callable[[str], Any]):
+    """
+    Read a process output stream and await on_line for every non-empty line.
+
+    Reads in blocks rather than readline() so very long lines cannot hit the
+    stream buffer limit, and treats a bare \\r as a line break as well since
+    K6 redraws its progress bar with carriage returns.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    while True:
+        data = await stream.read(OUTPUT_READ_SIZE)
+        buffer = pending + decoder.decode(data, final=not data)
+
+        # A trailing \r may be the first half of a \r\n split across reads
+        held = "\r" if data and buffer.endswith("\r") else ""
+        parts = _LINE_BREAK.split(buffer[:-1] if held else buffer)
+        pending = parts.pop() + held
+        for line in parts:
+            if line.strip():
+                await on_line(line)
+
+        if not data:
+            break
+    if pending.strip():
+        await on_line(pending)
+
+
+def kill(process: asyncio.subprocess.Process):
+    """Kill a process unless it has already exited."""
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
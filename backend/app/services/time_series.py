@@ -0,0 +1,239 @@
+"""Per-second series of a run and their downsampling for charts."""
+import math
+import os
+from typing import Optional, Dict, Any, List, Iterable, TYPE_CHECKING
+
+import numpy as np
+
+from ..config import settings
+
+if TYPE_CHECKING:
+    from .result_parser import ResultAggregator
+
+
+# Relative accuracy of the per-second latency quantiles
+HISTOGRAM_ACCURACY = 0.05
+
+# Latencies (ms) covered by the histogram buckets; values outside land in the edge buckets
+HISTOGRAM_MIN = 0.01
+HISTOGRAM_MAX = 600_000
+
+_GAMMA = (1 + HISTOGRAM_ACCURACY) / (1 - HISTOGRAM_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_MIN_INDEX = math.ceil(math.log(HISTOGRAM_MIN) / _LOG_GAMMA)
+BUCKETS = math.ceil(math.log(HISTOGRAM_MAX) / _LOG_GAMMA) - _MIN_INDEX + 1
+
+# Quantiles kept per second, as series named p50, p90...
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+SERIES_NAMES = ("rps", "error_rate", "vus") + tuple(f"p{round(q * 100)}" for q in QUANTILES)
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+class SecondHistograms:
+    """
+    A latency histogram for every second of a run.
+
+    All histograms share fixed log-spaced buckets (like LatencySketch, with
+    HISTOGRAM_ACCURACY relative error), so histograms of the same second
+    from different parts of a result file or different execution segments
+    merge by adding counts, and quantiles per second come out of one
+    cumulative sum at the end.
+    """
+
+    def __init__(self):
+        self.rows: Dict[int, np.ndarray] = {}  # epoch second -> counts per bucket
+
+    def add(self, second: int, value: float):
+        """Record one latency."""
+        row = self.rows.get(second)
+        if row is None:
+            row = self.rows[second] = np.zeros(BUCKETS, dtype=np.uint32)
+        row[_bucket_indexes(np.array([value]))[0]] += 1
+
+    def add_many(self, seconds: np.ndarray, values: np.ndarray):
+        """Record latencies with the epoch second of each."""
+        if not len(values):
+            return
+        keys = seconds.astype(np.int64) * BUCKETS + _bucket_indexes(values)
+        unique, counts = np.unique(keys, return_counts=True)
+        for second in np.unique(unique // BUCKETS).tolist():
+            if second not in self.rows:
+                self.rows[second] = np.zeros(BUCKETS, dtype=np.uint32)
+        for key, count in zip(unique.tolist(), counts.tolist()):
+            self.rows[key // BUCKETS][key % BUCKETS] += count
+
+    def merge(self, other: "SecondHistograms"):
+        """Add the counts of another set of histograms."""
+        for second, row in other.rows.items():
+            mine = self.rows.get(second)
+            if mine is None:
+                self.rows[second] = row.copy()
+            else:
+                mine += row
+
+    def quantiles(self, seconds: np.ndarray, quantiles: Iterable[float]) -> np.ndarray:
+        """Array of shape (len(quantiles), len(seconds)); NaN for seconds without data."""
+        quantiles = list(quantiles)
+        result = np.full((len(quantiles), len(seconds)), np.nan)
+        present = [i for i, second in enumerate(seconds.tolist()) if second in self.rows]
+        if not present:
+            return result
+        counts = np.stack([self.rows[seconds[i]] for i in present]).astype(np.int64)
+        cumulative = np.cumsum(counts, axis=1)
+        totals = cumulative[:, -1]
+        for j, q in enumerate(quantiles):
+            # Same rank convention as LatencySketch.quantile
+            ranks = np.minimum((totals * q).astype(np.int64), totals - 1)
+            buckets = (cumulative > ranks[:, None]).argmax(axis=1)
+            result[j, present] = _bucket_values(buckets)
+        return result
+
+
+def build_series(aggregator: "ResultAggregator") -> Optional[Dict[str, Any]]:
+    """
+    Dense per-second series of an aggregated run, None if it has no points.
+
+    Returns:
+        {"start": first epoch second, "rps": array, "error_rate", "vus", "p50", ...},
+        one value per second; NaN where a second has no data for a series
+    """
+    seconds = set(aggregator.rps_by_second) | set(aggregator.vus_by_second) | set(aggregator.latency_by_second.rows)
+    if not seconds:
+        return None
+    start = min(seconds)
+    times = np.arange(start, max(seconds) + 1, dtype=np.int64)
+
+    def dense(values: Dict[int, int], fill: float) -> np.ndarray:
+        column = np.full(len(times), fill)
+        for second, value in values.items():
+            column[second - start] = value
+        return column
+
+    requests = dense(aggregator.rps_by_second, 0)
+    failed = dense(aggregator.failed_by_second, 0)
+    series = {
+        "start": start,
+        "rps": requests,
+        "error_rate": np.divide(failed, requests, out=np.full(len(times), np.nan), where=requests > 0),
+        "vus": dense(aggregator.vus_by_second, np.nan),
+    }
+    for name, values in zip(SERIES_NAMES[3:], aggregator.latency_by_second.quantiles(times, QUANTILES)):
+        series[name] = values
+    return series
+
+
+def series_path_for(execution_id: int) -> str:
+    """File holding the per-second series of an execution."""
+    return os.path.join(settings.RESULTS_DIR, f"series_{execution_id}.npz")
+
+
+def save_series(execution_id: int, aggregator: "ResultAggregator") -> Optional[str]:
+    """Write the per-second series of a run; returns the path, None if there was no data."""
+    series = build_series(aggregator)
+    if series is None:
+        return None
+    path = series_path_for(execution_id)
+    temporary = path + ".tmp.npz"
+    np.savez_compressed(temporary, **series)
+    os.replace(temporary, path)
+    return path
+
+
+def load_series(execution_id: int) -> Optional[Dict[str, np.ndarray]]:
+    """Per-second series saved for an execution, None if there are none."""
+    try:
+        with np.load(series_path_for(execution_id)) as data:
+            return {name: data[name] for name in data.files}
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+
+
+def load_or_build(execution_id: int, result_file: Optional[str]) -> Optional[Dict[str, np.ndarray]]:
+    """Saved series of an execution, rebuilt from its result file for runs from before series were saved."""
+    series = load_series(execution_id)
+    if series is not None or not result_file or not os.path.exists(result_file):
+        return series
+    from . import bulk_parser  # Imports result_parser, which imports this module
+    if save_series(execution_id, bulk_parser.parse_result_file(result_file)) is None:
+        return None
+    return load_series(execution_id)
+
+
+def downsample(times: np.ndarray, values: np.ndarray, points: int, method: str = "lttb") -> Dict[str, List[float]]:
+    """
+    Reduce a series to at most `points` points for plotting.
+
+    Seconds without data (NaN) are dropped first. "lttb" (largest triangle
+    three buckets) keeps the points that preserve the visual shape of the
+    line; "minmax" keeps the lowest and highest point of each bucket, so
+    every spike survives.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown method: {method}")
+    present = ~np.isnan(values)
+    times, values = times[present], values[present]
+    if len(times) > points:
+        keep = lttb(times, values, points) if method == "lttb" else min_max(values, points)
+        times, values = times[keep], values[keep]
+    return {"times": times.tolist(), "values": values.tolist()}
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indexes of the `points` points chosen by Largest-Triangle-Three-Buckets."""
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        return np.array([0, n - 1])
+
+    x = x.astype(np.float64)
+    # First and last points are kept; the rest is split into points - 2 buckets
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    keep = np.empty(points, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Third vertex: average of the next bucket (the last point for the last bucket)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        keep[i + 1] = previous
+    return keep
+
+
+def min_max(y: np.ndarray, points: int) -> np.ndarray:
+    """Indexes of the minimum and maximum of each of points / 2 buckets, in order."""
+    n = len(y)
+    buckets = max(points // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    keep = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if start == end:
+            continue
+        low = start + int(y[start:end].argmin())
+        high = start + int(y[start:end].argmax())
+        keep.extend(sorted({low, high}))
+    return np.array(keep, dtype=np.int64)
+
+
+def _bucket_indexes(values: np.ndarray) -> np.ndarray:
+    """Histogram bucket of each latency."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        indexes = np.ceil(np.log(np.maximum(values, HISTOGRAM_MIN)) / _LOG_GAMMA) - _MIN_INDEX
+    return np.clip(indexes, 0, BUCKETS - 1).astype(np.int64)
+
+
+def _bucket_values(indexes: np.ndarray) -> np.ndarray:
+    """Representative latency of buckets, within the relative accuracy of all their members."""
+    return 2 * _GAMMA ** (indexes + _MIN_INDEX) / (_GAMMA + 1)
@@ -0,0 +1,154 @@
+"""Batching of log lines sent over a WebSocket."""
+import asyncio
+from typing import Optional, Callable, Dict, Any, List, Awaitable
+
+from ..config import settings
+
+
+class LogBatcher:
+    """
+    Group the log lines of one WebSocket connection into "logs" frames.
+
+    Lines are buffered and sent as one frame every flush_interval seconds,
+    or as soon as batch_size lines are waiting. Progress lines only keep the
+    latest one. Bytes that are buffered or being sent count against
+    max_in_flight_bytes; while a slow client keeps that budget used up, new
+    lines are dropped and the next frame reports how many.
+
+    With `schedule`, the batcher does not send from its own task: when a
+    frame is due it calls schedule(sequence) instead, and the owner calls
+    flush(upto=sequence) when it gets to it, so frames can be ordered with
+    the connection's other messages.
+
+    Frame format:
+        {"type": "logs", "lines": [...], "progress": "..." | None, "dropped": 0}
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Dict[str, Any]], Awaitable[None]],
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_in_flight_bytes: Optional[int] = None,
+        schedule: Optional[Callable[[int], None]] = None,
+    ):
+        self._send = send
+        self._schedule = schedule
+        self.batch_size = settings.LOG_BATCH_SIZE
+        self.flush_interval = settings.LOG_FLUSH_INTERVAL
+        self.max_in_flight_bytes = settings.LOG_MAX_IN_FLIGHT_BYTES
+        self.configure(batch_size, flush_interval, max_in_flight_bytes)
+
+        self._lines: List[str] = []
+        self._sizes: List[int] = []
+        self._in_flight = 0
+        self._progress: Optional[str] = None
+        self._dropped = 0
+        # Sequence number of the next accepted line and of the first buffered one
+        self.sequence = 0
+        self._first = 0
+
+        self._wake = asyncio.Event()
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_in_flight_bytes: Optional[int] = None,
+    ):
+        """Change the batching limits; None keeps the current value."""
+        if batch_size is not None:
+            if int(batch_size) < 1:
+                raise ValueError("batch_size must be at least 1")
+            self.batch_size = int(batch_size)
+        if flush_interval is not None:
+            if float(flush_interval) <= 0:
+                raise ValueError("flush_interval must be positive")
+            self.flush_interval = float(flush_interval)
+        if max_in_flight_bytes is not None:
+            if int(max_in_flight_bytes) < 1:
+                raise ValueError("max_in_flight_bytes must be positive")
+            self.max_in_flight_bytes = int(max_in_flight_bytes)
+
+    def add(self, line: str):
+        """Queue a line for the next frame (never blocks)."""
+        if line.startswith("[PROGRESS]"):
+            self._progress = line
+        else:
+            size = len(line.encode("utf-8"))
+            if self._in_flight + size > self.max_in_flight_bytes:
+                self._dropped += 1
+                return
+            self._lines.append(line)
+            self._sizes.append(size)
+            self._in_flight += size
+            self.sequence += 1
+            if len(self._lines) >= self.batch_size:
+                self._full.set()
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        self._wake.set()
+
+    @property
+    def pending(self) -> bool:
+        """Whether anything is waiting to be sent."""
+        return bool(self._lines or self._progress or self._dropped)
+
+    async def flush(self, upto: Optional[int] = None):
+        """Send everything buffered right away (only lines before sequence number `upto`, if given)."""
+        async with self._lock:
+            self._wake.clear()
+            self._full.clear()
+            while self._lines or self._progress or self._dropped:
+                count = self.batch_size if upto is None else min(self.batch_size, upto - self._first)
+                if count <= 0 and self._lines:
+                    break
+                lines = self._lines[:count]
+                size = sum(self._sizes[:len(lines)])
+                del self._lines[:len(lines)]
+                del self._sizes[:len(lines)]
+                self._first += len(lines)
+
+                # Progress and the drop count ride on the last frame of the flush
+                progress, dropped = None, 0
+                if not self._lines or (upto is not None and self._first >= upto):
+                    progress, dropped = self._progress, self._dropped
+                    self._progress, self._dropped = None, 0
+
+                try:
+                    await self._send({
+                        "type": "logs",
+                        "lines": lines,
+                        "progress": progress,
+                        "dropped": dropped,
+                    })
+                finally:
+                    self._in_flight -= size
+            if self._lines:
+                # Lines after `upto` wait for the next tick
+                self._wake.set()
+
+    def close(self):
+        """Stop the background sender; buffered lines are discarded."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        """Flush on every interval tick that has something to send, or when a batch fills up."""
+        while True:
+            await self._wake.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._schedule is None:
+                await self.flush()
+            else:
+                self._wake.clear()
+                self._full.clear()
+                self._schedule(self.sequence)
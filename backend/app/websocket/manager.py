@@ -1,47 +1,157 @@
 """WebSocket connection manager."""
+import asyncio
 import json
-from typing import Dict, Any, List
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple
 from fastapi import WebSocket
 
+from .. import metrics
+from ..config import settings
+from .log_batcher import LogBatcher
+
 
 class ConnectionManager:
-    """Manage WebSocket connections."""
+    """
+    Manage WebSocket connections.
+    
+    Every managed connection has its own outbound queue and sender task:
+    publishing a message only queues it, so one slow client never holds up
+    the others or the test run producing the messages. A client that lets
+    WEBSOCKET_QUEUE_SIZE messages pile up is disconnected.
+    """
     
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.log_batchers: Dict[WebSocket, LogBatcher] = {}
+        self.outboxes: Dict[WebSocket, asyncio.Queue] = {}
+        self.senders: Dict[WebSocket, asyncio.Task] = {}
+        self.subscriptions: Dict[int, List[WebSocket]] = {}  # execution id -> followers
     
     async def connect(self, websocket: WebSocket):
         """Accept and track a new WebSocket connection."""
         await websocket.accept()
         self.active_connections.append(websocket)
+        # Log frames are written by the sender task too, in queue order
+        self.log_batchers[websocket] = LogBatcher(
+            partial(self._send_json, websocket),
+            schedule=partial(self._queue_logs, websocket),
+        )
+        self.outboxes[websocket] = asyncio.Queue(maxsize=settings.WEBSOCKET_QUEUE_SIZE)
+        self.senders[websocket] = asyncio.create_task(self._sender(websocket))
     
     def disconnect(self, websocket: WebSocket):
         """Remove a WebSocket connection."""
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        batcher = self.log_batchers.pop(websocket, None)
+        if batcher:
+            batcher.close()
+        self.outboxes.pop(websocket, None)
+        sender = self.senders.pop(websocket, None)
+        if sender:
+            sender.cancel()
+        for execution_id in list(self.subscriptions):
+            self.unsubscribe(websocket, execution_id)
+    
+    def subscribe(self, websocket: WebSocket, execution_id: int):
+        """Follow the messages of an execution on this connection."""
+        followers = self.subscriptions.setdefault(execution_id, [])
+        if websocket not in followers:
+            followers.append(websocket)
+    
+    def unsubscribe(self, websocket: WebSocket, execution_id: int):
+        """Stop following an execution."""
+        followers = self.subscriptions.get(execution_id)
+        if followers and websocket in followers:
+            followers.remove(websocket)
+        if not followers:
+            self.subscriptions.pop(execution_id, None)
+    
+    async def publish(self, execution_id: int, message: Dict[str, Any]):
+        """Send a message to every connection following an execution."""
+        for websocket in list(self.subscriptions.get(execution_id, [])):
+            await self.send_message(websocket, message)
+    
+    async def publish_log(self, execution_id: int, log: str):
+        """Send a log line to every connection following an execution."""
+        metrics.LOG_LINES.inc()
+        for websocket in list(self.subscriptions.get(execution_id, [])):
+            await self.send_log(websocket, log)
+    
+    def configure_logs(
+        self,
+        websocket: WebSocket,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_in_flight_bytes: Optional[int] = None,
+    ):
+        """Tune log batching for one connection (ValueError on invalid limits)."""
+        batcher = self.log_batchers.get(websocket)
+        if batcher:
+            batcher.configure(batch_size, flush_interval, max_in_flight_bytes)
     
     async def send_message(self, websocket: WebSocket, message: Dict[str, Any]):
-        """Send a message to a specific WebSocket."""
+        """Send a message to a specific WebSocket (queued on managed connections, never waits for the client)."""
+        if websocket not in self.outboxes:
+            await self._send_json(websocket, message)
+            return
+        # Log lines buffered so far go out first so messages keep their order
+        batcher = self.log_batchers[websocket]
+        if batcher.pending:
+            self._queue_logs(websocket, batcher.sequence)
+        self._enqueue(websocket, ("message", message))
+    
+    def _queue_logs(self, websocket: WebSocket, sequence: int):
+        """Queue a frame of the buffered log lines before line number `sequence`."""
+        self._enqueue(websocket, ("logs", sequence))
+    
+    def _enqueue(self, websocket: WebSocket, item: Tuple[str, Any]):
+        outbox = self.outboxes.get(websocket)
+        if outbox is None:
+            return
         try:
-            await websocket.send_json(message)
+            outbox.put_nowait(item)
+        except asyncio.QueueFull:
+            # The client stopped reading: drop it rather than buffer without bound
+            self.disconnect(websocket)
+            asyncio.create_task(self._close(websocket))
+    
+    async def _sender(self, websocket: WebSocket):
+        """Write the queued messages and log frames of one connection, in order."""
+        outbox = self.outboxes[websocket]
+        batcher = self.log_batchers[websocket]
+        while True:
+            kind, item = await outbox.get()
+            if kind == "logs":
+                await batcher.flush(upto=item)
+            else:
+                await self._send_json(websocket, item)
+    
+    async def _close(self, websocket: WebSocket):
+        try:
+            # 1013: try again later
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+    
+    async def _send_json(self, websocket: WebSocket, message: Dict[str, Any]):
+        try:
+            with metrics.WEBSOCKET_SEND_SECONDS.time():
+                await websocket.send_json(message)
         except Exception:
             self.disconnect(websocket)
     
     async def broadcast(self, message: Dict[str, Any]):
         """Broadcast a message to all connected WebSockets."""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                disconnected.append(connection)
-        
-        # Clean up disconnected connections
-        for conn in disconnected:
-            self.disconnect(conn)
+        for connection in list(self.active_connections):
+            await self.send_message(connection, message)
     
     async def send_log(self, websocket: WebSocket, log: str, level: str = "info"):
-        """Send a log message."""
+        """Send a log message (batched into "logs" frames on managed connections)."""
+        batcher = self.log_batchers.get(websocket)
+        if batcher:
+            batcher.add(log)
+            return
         await self.send_message(websocket, {
             "type": "log",
             "level": level,
@@ -65,6 +175,14 @@ class ConnectionManager:
             "data": result
         })
     
+    async def send_metrics(self, websocket: WebSocket, execution_id: int, payload: Dict[str, Any]):
+        """Send live aggregate metrics of a running test."""
+        await self.send_message(websocket, {
+            "type": "metrics",
+            "execution_id": execution_id,
+            "data": payload
+        })
+    
     async def send_error(self, websocket: WebSocket, error: str):
         """Send error message."""
         await self.send_message(websocket, {
@@ -0,0 +1,35 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import engine, SessionLocal
+from app.models import ExecutionSummary
+from app.services import execution_summaries
+from sqlalchemy import text
+
+def migrate():
+    print("Migrating database schema...")
+    try:
+        # Create execution_summaries with its indexes
+        ExecutionSummary.__table__.create(bind=engine, checkfirst=True)
+        print("Success: execution_summaries table ready.")
+
+        with engine.connect() as conn:
+            # Composite index for listing the executions of one config by time
+            try:
+                statement = "CREATE INDEX ix_test_executions_config_created ON test_executions (config_id, created_at)"
+                print(f"Executing: {statement}")
+                conn.execute(text(statement))
+                conn.commit()
+                print("Success.")
+            except Exception as e:
+                print(f"Error executing statement (might already exist): {e}")
+
+        with SessionLocal() as db:
+            count = execution_summaries.backfill(db)
+        print(f"Success: {count} execution summaries written.")
+    except Exception as e:
+        print(f"Connection Error: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1 @@
+"""Performance measurements for the backend (run with python -m benchmarks.<name>)."""
@@ -0,0 +1,50 @@
+"""
+The standard benchmark suite: result parsing and log streaming.
+
+Usage (from the backend directory):
+    python -m benchmarks --output results.jsonl               # 1M points
+    python -m benchmarks --sizes 1M,10M,50M --output results.jsonl
+
+Every measurement is one JSON line (suite, name, timestamp, params,
+metrics, env with the git commit), so results of successive runs can be
+appended to one file and trended per name. The 50M point files take
+several GB of disk (gzip: a few hundred MB) in --data-dir, and the stream
+and tail parsers need minutes for them.
+"""
+import argparse
+
+from . import parsing, streaming, synthetic
+from .report import DEFAULT_DATA_DIR, Recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1M", help="Comma separated result file sizes in points, e.g. 1M,10M,50M")
+    parser.add_argument("--parsers", default=",".join(parsing.PARSERS), help="Comma separated parsers to measure")
+    parser.add_argument("--compression", choices=("none", "gzip"), default="gzip", help="Result file compression")
+    parser.add_argument("--lines", default="1000000", help="Comma separated log lines per K6 process")
+    parser.add_argument("--segments", default="1,4", help="Comma separated K6 process counts for streaming")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where synthetic files are cached")
+    parser.add_argument("--output", help="JSON lines file to append the results to")
+    args = parser.parse_args()
+
+    recorder = Recorder(args.output)
+    parsing.run(
+        [synthetic.parse_size(size) for size in args.sizes.split(",")],
+        [name.strip() for name in args.parsers.split(",") if name.strip()],
+        args.compression,
+        args.data_dir,
+        recorder,
+    )
+    streaming.run(
+        [synthetic.parse_size(count) for count in args.lines.split(",")],
+        [int(count) for count in args.segments.split(",")],
+        0,
+        synthetic.SIZES["1M"],
+        args.data_dir,
+        recorder,
+    )
+
+
+if __name__ == "__main__":
+    main()
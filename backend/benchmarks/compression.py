@@ -0,0 +1,82 @@
+"""
+Disk size and parse throughput of plain vs gzip K6 JSON output.
+
+Usage (from the backend directory):
+    python -m benchmarks.compression --requests 200000
+    python -m benchmarks.compression --file results/result_1_20240101_120000.json
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from app.services import bulk_parser
+from app.services.result_parser import ResultAggregator, open_result_file
+
+from .synthetic import GZIP_LEVEL, POINTS_PER_REQUEST, write_result_file
+
+
+def measure(path: str, parser: str) -> dict:
+    """Parse a result file once and report size and throughput."""
+    started = time.perf_counter()
+    if parser == "bulk":
+        aggregator = bulk_parser.parse_result_file(path)
+    else:
+        aggregator = ResultAggregator()
+        with open_result_file(path) as f:
+            for line in f:
+                aggregator.feed_line(line)
+    seconds = time.perf_counter() - started
+
+    disk_bytes = os.path.getsize(path)
+    return {
+        "file": os.path.basename(path),
+        "parser": parser,
+        "disk_bytes": disk_bytes,
+        "seconds": round(seconds, 3),
+        "disk_mb_per_s": round(disk_bytes / seconds / 1e6, 1),
+        "requests_per_s": round(aggregator.http_reqs / seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="Existing plain K6 result file to measure")
+    parser.add_argument("--requests", type=int, default=200000, help="Synthetic requests (4 points each, plus one per second)")
+    parser.add_argument("--parsers", default="bulk,stream", help="Comma separated: bulk, stream")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="k6_compression_")
+    try:
+        plain = os.path.join(workdir, "result.json")
+        if args.file:
+            shutil.copyfile(args.file, plain)
+        else:
+            write_result_file(plain, args.requests * POINTS_PER_REQUEST)
+
+        compressed = plain + ".gz"
+        started = time.perf_counter()
+        with open(plain, "rb") as src, gzip.open(compressed, "wb", compresslevel=GZIP_LEVEL) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        compress_seconds = time.perf_counter() - started
+
+        plain_bytes = os.path.getsize(plain)
+        compressed_bytes = os.path.getsize(compressed)
+        print(json.dumps({
+            "plain_bytes": plain_bytes,
+            "gzip_bytes": compressed_bytes,
+            "ratio": round(plain_bytes / compressed_bytes, 1),
+            "gzip_write_mb_per_s": round(plain_bytes / compress_seconds / 1e6, 1),
+        }))
+        for name in args.parsers.split(","):
+            for path in (plain, compressed):
+                print(json.dumps(measure(path, name.strip())))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
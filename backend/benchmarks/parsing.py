@@ -0,0 +1,131 @@
+"""
+Throughput and peak memory of the result file parsers.
+
+Each parser runs on the same synthetic file in a fresh process, so peak RSS
+is that parser's own high-water mark:
+
+    stream, bulk, parallel  K6Executor._parse_result_file with RESULT_PARSER set
+    tail                    ResultTailer draining the whole file, as after a run
+
+Usage (from the backend directory):
+    python -m benchmarks.parsing --sizes 1M,10M,50M --output parsing.jsonl
+    python -m benchmarks.parsing --sizes 1M --parsers bulk,parallel --compression gzip
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+from . import synthetic
+from .report import DEFAULT_DATA_DIR, Recorder, peak_rss_mb, run_child
+
+
+PARSERS = ("stream", "bulk", "parallel", "tail")
+
+
+def measure(parser: str, path: str, workers: Optional[int] = None) -> Dict[str, Any]:
+    """Parse a file once in this process; the caller runs this in a child process."""
+    from app.config import settings
+    from app.services.k6_executor import K6Executor
+    from app.services.result_parser import ResultTailer
+
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    if parser == "tail":
+        tailer = ResultTailer(path)
+        # Already stopped: follow() goes straight to its final drain
+        tailer.stop()
+        asyncio.run(tailer.follow())
+        summary = tailer.aggregator.summary()
+    else:
+        settings.RESULT_PARSER = parser
+        if workers:
+            settings.RESULT_PARSE_WORKERS = workers
+        summary = K6Executor()._parse_result_file(path)
+    seconds = time.perf_counter() - started
+    if not summary:
+        raise RuntimeError(f"{parser} parser returned no summary")
+    return {
+        "seconds": round(seconds, 3),
+        "http_reqs": summary["http_reqs"],
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_child_rss_mb": peak_rss_mb(children=True) if parser == "parallel" else None,
+    }
+
+
+def run(
+    sizes: List[int],
+    parsers: List[str],
+    compression: str,
+    data_dir: str,
+    recorder: Recorder,
+    repeat: int = 1,
+    workers: Optional[int] = None,
+):
+    """Measure every parser on every size and record the median run of each."""
+    for points in sizes:
+        path = synthetic.cached_result_file(data_dir, points, compression)
+        disk_bytes = os.path.getsize(path)
+        written = synthetic.point_count(points)
+        for parser in parsers:
+            args = ["--child", parser, path] + (["--workers", str(workers)] if workers else [])
+            runs = sorted((run_child("benchmarks.parsing", args) for _ in range(repeat)), key=lambda r: r["seconds"])
+            result = runs[len(runs) // 2]
+            seconds = result["seconds"]
+            recorder.emit("parsing", f"{parser}-{_label(points)}-{compression}", {
+                "parser": parser,
+                "points": written,
+                "compression": compression,
+                "disk_bytes": disk_bytes,
+                "repeat": repeat,
+                "workers": workers,
+            }, {
+                **result,
+                "points_per_s": round(written / seconds),
+                "disk_mb_per_s": round(disk_bytes / seconds / 1e6, 1),
+            })
+
+
+def _label(points: int) -> str:
+    for label, size in synthetic.SIZES.items():
+        if size == points:
+            return label
+    return str(points)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1M", help="Comma separated point counts, e.g. 1M,10M,50M")
+    parser.add_argument("--parsers", default=",".join(PARSERS), help="Comma separated: " + ", ".join(PARSERS))
+    parser.add_argument("--compression", choices=("none", "gzip"), default="none")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the median is recorded")
+    parser.add_argument("--workers", type=int, help="Processes of the parallel parser (default RESULT_PARSE_WORKERS)")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where synthetic files are cached")
+    parser.add_argument("--output", help="JSON lines file to append the results to")
+    parser.add_argument("--child", nargs=2, metavar=("PARSER", "FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], args.child[1], args.workers)))
+        return
+
+    parsers = [name.strip() for name in args.parsers.split(",") if name.strip()]
+    unknown = set(parsers) - set(PARSERS)
+    if unknown:
+        parser.error(f"Unknown parsers: {', '.join(sorted(unknown))}")
+    run(
+        [synthetic.parse_size(size) for size in args.sizes.split(",")],
+        parsers,
+        args.compression,
+        args.data_dir,
+        Recorder(args.output),
+        args.repeat,
+        args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
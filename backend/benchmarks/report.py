@@ -0,0 +1,90 @@
+"""Machine-readable benchmark records and process isolation for measurements."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Synthetic inputs are kept here between runs
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "k6_benchmarks")
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def environment() -> Dict[str, Any]:
+    """What a result was measured on, so trends compare like with like."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=_BACKEND_DIR, capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """Peak resident memory of this process (or its largest finished child), None where unsupported."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # Kilobytes on Linux, bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss / divisor, 1)
+
+
+def run_child(module: str, args: List[str], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Run one measurement in a fresh interpreter and return its JSON result.
+
+    Peak RSS is a high-water mark of the whole process, so each measurement
+    gets its own process; the child prints its result as the last line of
+    its output.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-m", module, *args],
+        cwd=_BACKEND_DIR, capture_output=True, text=True, timeout=timeout,
+    )
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        raise RuntimeError(f"{module} {' '.join(args)} failed ({completed.returncode}): {completed.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+
+class Recorder:
+    """Writes one JSON line per measurement to stdout and, optionally, appends it to a file."""
+
+    def __init__(self, output: Optional[str] = None):
+        self.output = output
+        self.env = environment()
+        self.timestamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    def emit(self, suite: str, name: str, params: Dict[str, Any], metrics: Dict[str, Any]) -> Dict[str, Any]:
+        record = {
+            "suite": suite,
+            "name": name,
+            "timestamp": self.timestamp,
+            "params": params,
+            "metrics": metrics,
+            "env": self.env,
+        }
+        line = json.dumps(record)
+        print(line, flush=True)
+        if self.output:
+            with open(self.output, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        return record
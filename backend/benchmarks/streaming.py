@@ -0,0 +1,204 @@
+"""
+Log streaming throughput and event-loop lag of K6Executor.run.
+
+A stub k6 binary (a Python script given as K6_PATH) prints console log
+lines on stderr and a progress line on stdout every 1000 lines, as fast as
+possible or at a fixed rate, while copying a synthetic result file into its
+--out file, so the tailers have points to drain meanwhile. A ticker task
+measures how late the event loop wakes it up while the lines are handled.
+
+Usage (from the backend directory):
+    python -m benchmarks.streaming --lines 1000000 --segments 1,4 --output streaming.jsonl
+    python -m benchmarks.streaming --lines 200000 --rate 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List
+
+import numpy as np
+
+from . import synthetic
+from .report import DEFAULT_DATA_DIR, Recorder, peak_rss_mb, run_child
+
+
+# Period of the lag ticker
+TICK_SECONDS = 0.005
+
+STUB_K6 = '''#!{python}
+"""Stub k6: replays console output and a result file (see benchmarks/streaming.py)."""
+import gzip, os, sys, time
+
+args = sys.argv[1:]
+if args[0] != "run":
+    sys.exit(0)
+out = next(arg[5:] for arg in args if arg.startswith("json="))
+lines = int(os.environ["BENCH_LINES"])
+rate = float(os.environ.get("BENCH_RATE", "0"))
+source = open(os.environ["BENCH_SOURCE"], "rb")
+size = os.path.getsize(os.environ["BENCH_SOURCE"])
+chunks = max(1, lines // 1000)
+target = gzip.open(out, "wb", compresslevel=1) if out.endswith(".gz") else open(out, "wb")
+stderr = sys.stderr
+started = time.perf_counter()
+for i in range(lines):
+    stderr.write(f'time="2024-01-01T12:00:00+08:00" level=info msg="order {{i}} placed, status 200" source=console\\n')
+    if i % 1000 == 999:
+        stderr.flush()
+        print(f"running (0m{{i // 1000 % 60:02d}}.0s), 50/50 VUs, {{i}} complete and 0 interrupted iterations", flush=True)
+        # Whole lines of the result file, spread over the run
+        target.write(source.read(size // chunks))
+        target.write(source.readline())
+        target.flush()
+    if rate:
+        delay = started + (i + 1) / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+target.write(source.read())
+target.close()
+print("     http_reqs......................: 0  0/s")
+'''
+
+
+def write_stub(directory: str) -> str:
+    """Write the stub k6 executable and return its path."""
+    path = os.path.join(directory, "k6_stub.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(STUB_K6.format(python=sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+
+async def _replay(stub: str, script: str, workdir: str, segments: int) -> Dict[str, Any]:
+    from app.config import settings
+    from app.services.k6_executor import K6Executor
+    from app.services.profiling import PhaseTimer
+
+    # Result, series and log files of the run stay in the scratch directory
+    settings.RESULTS_DIR = settings.LOGS_DIR = workdir
+    executor = K6Executor()
+    executor.k6_path = stub
+    executor.results_dir = workdir
+
+    lags: List[float] = []
+    stopped = False
+
+    async def ticker():
+        while not stopped:
+            before = time.perf_counter()
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(time.perf_counter() - before - TICK_SECONDS)
+
+    received = 0
+
+    async def on_log(line: str):
+        nonlocal received
+        received += 1
+
+    snapshots = 0
+
+    async def on_metrics(snapshot: Dict[str, Any]):
+        nonlocal snapshots
+        snapshots += 1
+
+    timer = PhaseTimer()
+    ticker_task = asyncio.create_task(ticker())
+    result = await executor.run(
+        script, 1, on_log=on_log, on_metrics=on_metrics, segments=segments, archive=False, timer=timer,
+    )
+    stopped = True
+    await ticker_task
+
+    if not result.get("success"):
+        raise RuntimeError(result.get("error") or f"stub k6 exited with {result.get('return_code')}")
+    phases = timer.to_dict()
+    run_span = next(span for span in phases["spans"] if span["name"] == "k6.run")
+    run_ms = run_span["duration_ms"]
+    lag_ms = np.array(lags) * 1000
+    return {
+        "seconds": round(run_ms / 1000, 3),
+        "lines": received,
+        "lines_per_s": round(received / (run_ms / 1000)),
+        "first_output_ms": phases["marks"].get("k6.first_output"),
+        # Final drain, summary and series after the last K6 process exited
+        "post_run_ms": round(phases["total_ms"] - run_span["start_ms"] - run_ms, 1),
+        "metrics_snapshots": snapshots,
+        "http_reqs": (result.get("summary") or {}).get("http_reqs"),
+        "loop_lag_ms_mean": round(float(lag_ms.mean()), 3),
+        "loop_lag_ms_p99": round(float(np.percentile(lag_ms, 99)), 3),
+        "loop_lag_ms_max": round(float(lag_ms.max()), 3),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure(lines: int, rate: float, segments: int, source: str) -> Dict[str, Any]:
+    """Replay one stub run in this process; the caller runs this in a child process."""
+    workdir = tempfile.mkdtemp(prefix="k6_streaming_")
+    try:
+        stub = write_stub(workdir)
+        script = os.path.join(workdir, "script.js")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write("export default function () {}\n")
+        os.environ.update(BENCH_LINES=str(lines), BENCH_RATE=str(rate), BENCH_SOURCE=source)
+        return asyncio.run(_replay(stub, script, workdir, segments))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(
+    lines: List[int],
+    segments: List[int],
+    rate: float,
+    points: int,
+    data_dir: str,
+    recorder: Recorder,
+):
+    """Replay every line count with every segment count and record each run."""
+    source = synthetic.cached_result_file(data_dir, points)
+    for count in lines:
+        for segment_count in segments:
+            result = run_child("benchmarks.streaming", [
+                "--child", str(count), str(rate), str(segment_count), source,
+            ])
+            recorder.emit("streaming", f"lines-{count}-segments-{segment_count}-rate-{rate:g}", {
+                "lines": count,
+                "segments": segment_count,
+                "rate": rate,
+                "result_points": synthetic.point_count(points) * segment_count,
+            }, result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", default="1000000", help="Comma separated log lines per K6 process")
+    parser.add_argument("--segments", default="1", help="Comma separated K6 process counts")
+    parser.add_argument("--rate", type=float, default=0, help="Lines per second per process (0 = as fast as possible)")
+    parser.add_argument("--points", default="1M", help="Result points written by each process")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where synthetic files are cached")
+    parser.add_argument("--output", help="JSON lines file to append the results to")
+    parser.add_argument("--child", nargs=4, metavar=("LINES", "RATE", "SEGMENTS", "SOURCE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        lines, rate, segments, source = args.child
+        print(json.dumps(measure(int(lines), float(rate), int(segments), source)))
+        return
+
+    run(
+        [synthetic.parse_size(count) for count in args.lines.split(",")],
+        [int(count) for count in args.segments.split(",")],
+        args.rate,
+        synthetic.parse_size(args.points),
+        args.data_dir,
+        Recorder(args.output),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Synthetic K6 NDJSON result files for the benchmarks.
+
+Files are deterministic for a given size and seed, so runs on different
+commits parse the same bytes. They are cached in a data directory because
+generating the larger ones takes longer than parsing them.
+
+Usage (from the backend directory):
+    python -m benchmarks.synthetic --points 1M --compression gzip
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from .report import DEFAULT_DATA_DIR
+
+
+# Go's gzip.DefaultCompression, which K6 uses for json=*.gz
+GZIP_LEVEL = 6
+
+# Sizes of the standard benchmark files
+SIZES = {"1M": 1_000_000, "10M": 10_000_000, "50M": 50_000_000}
+
+# Points per request: http_reqs, http_req_duration, http_req_failed, iterations
+POINTS_PER_REQUEST = 4
+
+# Requests generated per numpy batch
+_BATCH = 100_000
+
+_TAGS = json.dumps({
+    "expected_response": "true",
+    "group": "",
+    "method": "GET",
+    "name": "https://api.example.com/v1/orders",
+    "proto": "HTTP/1.1",
+    "scenario": "default",
+    "status": "200",
+    "tls_version": "tls1.3",
+    "url": "https://api.example.com/v1/orders",
+}, separators=(",", ":"))
+
+_START = datetime(2024, 1, 1, 12, tzinfo=timezone(timedelta(hours=8)))
+
+
+def parse_size(text: str) -> int:
+    """Point count from "1M", "10M", "250k" or a plain number."""
+    text = text.strip()
+    if text in SIZES:
+        return SIZES[text]
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:].lower())
+    return int(float(text[:-1]) * multiplier) if multiplier else int(text)
+
+
+def point_count(points: int, rps: int = 5000) -> int:
+    """Points actually written by write_result_file for a requested size."""
+    requests = max(1, points // POINTS_PER_REQUEST)
+    return requests * POINTS_PER_REQUEST + math.ceil(requests / rps)
+
+
+def write_result_file(
+    path: str,
+    points: int,
+    rps: int = 5000,
+    vus: int = 50,
+    error_rate: float = 0.02,
+    seed: int = 1,
+    compression: str = "none",
+):
+    """
+    Write a K6-style NDJSON result file of about `points` points.
+
+    Every request has the four points K6 writes for an HTTP request, with
+    lognormal latencies and `error_rate` failures, at `rps` requests per
+    second; every second also has a vus point.
+    """
+    rng = np.random.default_rng(seed)
+    requests = max(1, points // POINTS_PER_REQUEST)
+    opener = gzip.open(path, "wt", encoding="utf-8", compresslevel=GZIP_LEVEL) if compression == "gzip" \
+        else open(path, "w", encoding="utf-8")
+    prefixes = {}
+    with opener as f:
+        for first in range(0, requests, _BATCH):
+            count = min(_BATCH, requests - first)
+            micros = (np.arange(first, first + count, dtype=np.int64) * 1_000_000) // rps
+            durations = rng.lognormal(3, 0.5, count)
+            failed = rng.random(count) < error_rate
+            lines = []
+            for offset, duration, failure in zip(micros.tolist(), durations.tolist(), failed.tolist()):
+                second, micro = divmod(offset, 1_000_000)
+                prefix = prefixes.get(second)
+                if prefix is None:
+                    prefixes.clear()
+                    moment = (_START + timedelta(seconds=second)).isoformat()
+                    # "2024-01-01T12:00:05+08:00" -> "2024-01-01T12:00:05." ... "+08:00"
+                    prefix = prefixes[second] = (moment[:-6] + ".", moment[-6:])
+                    lines.append(_point("vus", f"{prefix[0]}000000{prefix[1]}", vus))
+                timestamp = f"{prefix[0]}{micro:06d}{prefix[1]}"
+                lines.append(_point("http_reqs", timestamp, 1))
+                lines.append(_point("http_req_duration", timestamp, duration))
+                lines.append(_point("http_req_failed", timestamp, int(failure)))
+                lines.append(_point("iterations", timestamp, 1))
+            f.write("".join(lines))
+
+
+def cached_result_file(data_dir: str, points: int, compression: str = "none", seed: int = 1) -> str:
+    """Path of a synthetic file of the given size, generated on first use."""
+    os.makedirs(data_dir, exist_ok=True)
+    extension = ".json.gz" if compression == "gzip" else ".json"
+    path = os.path.join(data_dir, f"synthetic_{points}_s{seed}{extension}")
+    if not os.path.exists(path):
+        temporary = path + ".tmp"
+        write_result_file(temporary, points, seed=seed, compression=compression)
+        os.replace(temporary, path)
+    return path
+
+
+def _point(metric: str, timestamp: str, value) -> str:
+    return f'{{"metric":"{metric}","type":"Point","data":{{"time":"{timestamp}","value":{value},"tags":{_TAGS}}}}}\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", default="1M", help="Points to generate, e.g. 1M, 10M, 50M")
+    parser.add_argument("--compression", choices=("none", "gzip"), default="none")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    path = cached_result_file(args.data_dir, parse_size(args.points), args.compression, args.seed)
+    print(json.dumps({
+        "file": path,
+        "bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - started, 3),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Shared fixtures: a throwaway SQLite database and the FastAPI app."""
+import os
+import tempfile
+
+# Before any app module reads the settings
+_DB_DIR = tempfile.mkdtemp(prefix="k6_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ["DEBUG"] = "false"
+
+import pytest
+
+import app.models  # noqa: F401 (registers the tables)
+from app.config import settings
+from app.database import Base, engine
+
+
+@pytest.fixture(autouse=True)
+def database():
+    """Empty tables for every test."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    """Results, logs, scripts and data in a temporary directory."""
+    for name in ("RESULTS_DIR", "LOGS_DIR", "SCRIPTS_DIR", "DATA_DIR"):
+        path = tmp_path / name.split("_")[0].lower()
+        path.mkdir()
+        monkeypatch.setattr(settings, name, str(path))
+    return tmp_path
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    return TestClient(app)
@@ -0,0 +1,35 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.agent import app as agent_app
+from app.config import settings
+from app.services import agent_registry
+
+REGISTRATION = {"name": "node-1", "url": "http://node-1:9001", "capacity": {"cpus": 4}}
+
+
+def test_registration_refused_without_agent_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_TOKEN", "")
+    assert client.post("/api/agents", json=REGISTRATION).status_code == 403
+    assert client.post("/api/agents", json=REGISTRATION, headers={"X-Agent-Token": ""}).status_code == 403
+    assert client.delete("/api/agents/node-1").status_code == 403
+
+
+def test_registration_and_removal_need_the_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_TOKEN", "secret")
+    assert client.post("/api/agents", json=REGISTRATION, headers={"X-Agent-Token": "wrong"}).status_code == 403
+    assert client.post("/api/agents", json=REGISTRATION, headers={"X-Agent-Token": "secret"}).status_code == 200
+    assert client.delete("/api/agents/node-1").status_code == 403
+    assert client.delete("/api/agents/node-1", headers={"X-Agent-Token": "secret"}).status_code == 200
+    agent_registry.remove("node-1")
+
+
+def test_agent_refuses_runs_without_token(monkeypatch):
+    agent = TestClient(agent_app)
+    for token, query in (("", ""), ("secret", "?token=wrong"), ("secret", "")):
+        monkeypatch.setattr(settings, "AGENT_TOKEN", token)
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with agent.websocket_connect("/run" + query) as websocket:
+                websocket.receive_json()
+        assert closed.value.code == 1008
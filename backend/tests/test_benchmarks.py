@@ -0,0 +1,48 @@
+import gzip
+import json
+
+import pytest
+
+from benchmarks import parsing, streaming, synthetic
+from benchmarks.report import Recorder
+
+
+def records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_synthetic_files_have_the_announced_points(tmp_path, compression):
+    path = synthetic.cached_result_file(str(tmp_path), synthetic.parse_size("2k"), compression)
+    opener = gzip.open if compression == "gzip" else open
+    with opener(path, "rt") as f:
+        lines = f.readlines()
+    assert len(lines) == synthetic.point_count(2000)
+    assert json.loads(lines[0])["metric"] == "vus"
+    assert synthetic.cached_result_file(str(tmp_path), 2000, compression) == path
+    assert synthetic.parse_size("10M") == 10_000_000 and synthetic.parse_size("1500") == 1500
+
+
+def test_parsing_records_one_json_line_per_parser(tmp_path):
+    output = tmp_path / "results.jsonl"
+    parsing.run([2000], ["bulk", "tail"], "gzip", str(tmp_path), Recorder(str(output)))
+
+    bulk, tail = records(output)
+    assert bulk["suite"] == "parsing" and bulk["name"] == "bulk-2000-gzip"
+    assert tail["params"]["parser"] == "tail"
+    assert bulk["metrics"]["http_reqs"] == tail["metrics"]["http_reqs"] == 500
+    assert bulk["metrics"]["points_per_s"] > 0
+    assert set(bulk["env"]) == {"commit", "python", "platform", "cpus"}
+
+
+def test_streaming_replays_log_lines_through_the_executor(tmp_path):
+    output = tmp_path / "results.jsonl"
+    streaming.run([3000], [2], 0, 2000, str(tmp_path), Recorder(str(output)))
+
+    [record] = records(output)
+    assert record["name"] == "lines-3000-segments-2-rate-0"
+    # Both processes' lines reach on_log (progress lines included)
+    assert record["metrics"]["lines"] >= 2 * 3000
+    assert record["metrics"]["http_reqs"] == 2 * 500
+    assert record["metrics"]["loop_lag_ms_max"] >= 0
@@ -0,0 +1,131 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from app.services import bulk_parser
+from app.services.result_parser import ResultAggregator, open_result_file
+
+TAGS = {"method": "GET", "status": "200", "url": "https://api.example.test/v1/orders"}
+
+# Edge cases of K6 output: both field orders, timestamp and number spellings,
+# escapes, non-Point entries and lines that are not JSON at all
+LINES = [
+    '{"type":"Metric","data":{"name":"http_reqs","type":"counter","contains":"default","thresholds":[]},"metric":"http_reqs"}',
+    '{"type":"Point","data":{"time":"2024-01-01T12:00:00.123456789+08:00","value":1,"tags":%s},"metric":"http_reqs"}' % json.dumps(TAGS),
+    '{"metric":"http_req_duration","type":"Point","data":{"time":"2024-01-01T12:00:00.5+08:00","value":12.25,"tags":%s}}' % json.dumps(TAGS),
+    '{"metric":"http_req_duration","type":"Point","data":{"time":"2024-01-01T04:00:00Z","value":1.5e2,"tags":{}}}',
+    '{"metric":"http_req_duration","type":"Point","data":{"time":"2024-01-01T03:59:59.999-00:30","value":0,"tags":null}}',
+    '{"metric":"http_reqs","type":"Point","data":{"time":"2024-01-01T04:00:01.000001Z","value":3,"tags":{"name":"quote \\" and \\\\ backslash, \\u00e9"}}}',
+    '{"metric":"http_req_failed","type":"Point","data":{"time":"2024-01-01T04:00:01Z","value":1,"tags":{}}}',
+    '{"metric":"http_req_failed","type":"Point","data":{"time":"2024-01-01T04:00:01Z","value":0,"tags":{}}}',
+    '{"metric":"vus","type":"Point","data":{"time":"2024-01-01T04:00:00Z","value":5,"tags":{}}}',
+    '{"metric":"vus","type":"Point","data":{"time":"2024-01-01T04:00:00.9Z","value":3,"tags":{}}}',
+    '{"metric":"vus_max","type":"Point","data":{"time":"2024-01-01T04:00:00Z","value":10,"tags":{}}}',
+    '{"metric":"iterations","type":"Point","data":{"time":"2024-01-01T04:00:02Z","value":2,"tags":{}}}',
+    # Unknown metric, a long tag set past the fast path's windows, a bad timestamp
+    '{"metric":"data_received","type":"Point","data":{"time":"2024-01-01T04:00:00Z","value":999,"tags":{}}}',
+    '{"metric":"http_req_duration","type":"Point","data":{"time":"2024-01-01T04:00:02Z","value":80,"tags":{"name":"%s"}}}' % ("x" * 500),
+    '{"metric":"http_reqs","type":"Point","data":{"time":"not a time","value":1,"tags":{}}}',
+    # Extra whitespace: valid JSON, but not K6's layout
+    '{"metric": "http_reqs", "type": "Point", "data": {"time": "2024-01-01T04:00:02Z", "value": 1, "tags": {}}}',
+    '',
+    'garbage that is not JSON',
+    '[1, 2, 3]',
+]
+
+
+def write(path, text, compression=None):
+    opener = gzip.open if compression == "gzip" else open
+    with opener(path, "wb") as f:
+        f.write(text.encode("utf-8"))
+    return str(path)
+
+
+def reference(path):
+    aggregator = ResultAggregator()
+    with open_result_file(path) as f:
+        for line in f:
+            aggregator.feed_line(line)
+    return aggregator
+
+
+def assert_same(actual: ResultAggregator, expected: ResultAggregator):
+    assert actual.summary() == expected.summary()
+    assert actual.snapshot() == expected.snapshot()
+    assert actual.rps_by_second == expected.rps_by_second
+    assert actual.failed_by_second == expected.failed_by_second
+    assert actual.vus_by_second == expected.vus_by_second
+    assert actual.latency_by_second.rows.keys() == expected.latency_by_second.rows.keys()
+    for second, row in expected.latency_by_second.rows.items():
+        assert np.array_equal(actual.latency_by_second.rows[second], row)
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_bulk_parser_matches_feed_line(tmp_path, newline, compression):
+    # The last line has no newline, as in a file K6 is still writing
+    name = "result.json.gz" if compression else "result.json"
+    path = write(tmp_path / name, newline.join(LINES + LINES[1:3]), compression)
+    expected = reference(path)
+    assert expected.http_reqs == 7
+
+    assert_same(bulk_parser.parse_result_file(path), expected)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 50, 333])
+def test_chunk_boundaries_do_not_change_the_result(tmp_path, chunk_size):
+    path = write(tmp_path / "result.json", "\n".join(LINES * 3) + "\n")
+    aggregator = ResultAggregator()
+    with open_result_file(path) as f:
+        for chunk in bulk_parser.iter_chunks(f, chunk_size):
+            aggregator.feed_columns(bulk_parser.decode_points(chunk))
+
+    assert_same(aggregator, reference(path))
+
+
+@pytest.mark.parametrize("parts", [1, 2, 5, 40])
+def test_line_ranges_merge_to_the_whole_file(tmp_path, parts):
+    path = write(tmp_path / "result.json", "\n".join(LINES * 4) + "\n")
+    ranges = bulk_parser.split_line_ranges(path, parts)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(open(path, "rb").read())
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+
+    aggregator = ResultAggregator()
+    for start, end in ranges:
+        aggregator.merge(bulk_parser._parse_range(path, start, end))
+    assert_same(aggregator, reference(path))
+
+
+def test_parallel_parser_uses_worker_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_parser, "PARALLEL_MIN_BYTES", 0)
+    path = write(tmp_path / "result.json", "\n".join(LINES * 50) + "\n")
+    assert_same(bulk_parser.parse_result_file_parallel(path, 3), reference(path))
+
+
+def test_parallel_parser_spawns_its_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_parser, "PARALLEL_MIN_BYTES", 0)
+    contexts = []
+    real_pool = bulk_parser.ProcessPoolExecutor
+
+    def pool(**kwargs):
+        contexts.append(kwargs["mp_context"].get_start_method())
+        return real_pool(**kwargs)
+
+    monkeypatch.setattr(bulk_parser, "ProcessPoolExecutor", pool)
+    path = write(tmp_path / "result.json", "\n".join(LINES * 10) + "\n")
+    assert_same(bulk_parser.parse_result_file_parallel(path, 2), reference(path))
+    assert contexts == ["spawn"]
+
+
+def test_decoded_columns(tmp_path):
+    columns = bulk_parser.decode_points(memoryview("\n".join(LINES[1:4]).encode() + b"\n"))
+    assert [columns.metric_names[i] for i in columns.metric_ids] == ["http_reqs", "http_req_duration", "http_req_duration"]
+    assert columns.values.tolist() == [1, 12.25, 150]
+    assert columns.time_valid.all()
+
+
+def test_decoded_tags_are_the_raw_json():
+    columns = bulk_parser.decode_points(memoryview("\n".join(LINES[1:4]).encode() + b"\n"), with_tags=True)
+    assert [json.loads(raw) for raw in columns.tags] == [TAGS, TAGS, {}]
@@ -0,0 +1,108 @@
+import io
+import json
+import os
+import time
+
+import pytest
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import TestConfig
+from app.services import data_files
+from app.services.k6_generator import K6ScriptGenerator
+
+CSV = "id,name\r\n1,alice\r\n\r\n2,\"b,ob\"\r\n3,carol\r\n"
+
+
+def shard_rows(manifest):
+    rows = []
+    for shard in manifest["shards"]:
+        with open(shard["path"], encoding="utf-8") as f:
+            rows.extend(json.load(f))
+    return rows
+
+
+def test_upload_is_sharded_and_deduplicated(dirs):
+    first = data_files.store_upload(io.BytesIO(CSV.encode()), shard_rows=2)
+    second = data_files.store_upload(io.BytesIO(CSV.encode()), shard_rows=2)
+
+    assert first["columns"] == ["id", "name"] and first["rows"] == 3
+    assert not first["deduplicated"] and second["deduplicated"]
+    assert second["path"] == first["path"] == os.path.join(str(dirs / "data"), first["sha256"] + ".csv")
+    manifest = data_files.load_manifest(first["path"])
+    assert manifest["delimiter"] == ","
+    assert [shard["rows"] for shard in manifest["shards"]] == [2, 1]
+    assert shard_rows(manifest) == [["1", "alice"], ["2", "b,ob"], ["3", "carol"]]
+    assert data_files.usage()["files"] == 1
+
+
+@pytest.mark.parametrize("content, message", [
+    (b"", "no header"),
+    (b"a,a\n1,2\n", "appears more than once"),
+    (b"a,b\n1\n", "expected 2 fields"),
+    (b"a,b\n", "no data rows"),
+    (b"a,b\n\xff,1\n", "UTF-8"),
+])
+def test_invalid_uploads_are_rejected(dirs, content, message):
+    with pytest.raises(ValueError, match=message):
+        data_files.store_upload(io.BytesIO(content))
+    assert os.listdir(dirs / "data") == []
+
+
+def test_upload_limits(dirs):
+    with pytest.raises(data_files.DataLimitExceeded):
+        data_files.store_upload(io.BytesIO(CSV.encode()), max_bytes=10)
+    stored = data_files.store_upload(io.BytesIO(CSV.encode()))
+    with pytest.raises(data_files.DataLimitExceeded):
+        data_files.store_upload(io.BytesIO(b"x\n1\n"), quota_bytes=data_files.usage()["bytes"])
+    assert os.path.exists(stored["path"])
+
+
+def test_garbage_collection_keeps_referenced_and_recent_files(dirs):
+    kept = data_files.store_upload(io.BytesIO(b"a\n1\n"))
+    unused = data_files.store_upload(io.BytesIO(b"a\n2\n"))
+    recent = data_files.store_upload(io.BytesIO(b"a\n3\n"))
+    old = time.time() - 3600
+    for stored in (kept, unused):
+        os.utime(stored["path"], (old, old))
+    with SessionLocal() as db:
+        db.add(TestConfig(name="t", url="http://example.test", data_file=kept["path"]))
+        db.commit()
+
+    assert data_files.collect_garbage(min_age=60)["files"] == 1
+    assert os.path.exists(kept["path"]) and os.path.exists(recent["path"])
+    assert not os.path.exists(unused["path"])
+    assert not os.path.exists(data_files.shards_dir(unused["path"]))
+
+
+def test_files_stored_before_ingestion_are_converted(dirs):
+    legacy = dirs / "data" / "legacy.csv"
+    legacy.write_text("\ufeffcode\tqty\n\nA\t1\nB\t2\n", encoding="utf-8")
+
+    script_path = K6ScriptGenerator().generate(name="t", url="http://example.test", data_file=str(legacy))
+    with open(script_path, encoding="utf-8") as f:
+        script = f.read()
+
+    manifest = data_files.load_manifest(str(legacy))
+    assert manifest["columns"] == ["code", "qty"]
+    assert shard_rows(manifest) == [["A", "1"], ["B", "2"]]
+    assert "papaparse" not in script and "DATA_SHARDS" in script
+    # Converted once: the manifest is reused
+    assert data_files.ingest_existing(str(legacy)) == data_files.load_manifest(str(legacy))
+
+
+def test_upload_endpoint_deduplicates_and_enforces_the_limit(dirs, client, monkeypatch):
+    from app.api import upload
+    monkeypatch.setattr(upload, "UPLOAD_DIR", str(dirs / "data"))
+
+    def post(content):
+        return client.post("/api/upload/data", files={"file": ("users.csv", content, "text/csv")})
+
+    first, second = post(CSV.encode()), post(CSV.encode())
+    assert first.status_code == second.status_code == 200
+    assert first.json()["deduplicated"] is False and second.json()["deduplicated"] is True
+    assert second.json()["path"] == first.json()["path"]
+
+    monkeypatch.setattr(settings, "DATA_UPLOAD_MAX_BYTES", 10)
+    assert post(CSV.encode() + b"4,dave\r\n").status_code == 413
+    assert data_files.usage()["files"] == 1
@@ -0,0 +1,62 @@
+from app.database import SessionLocal
+from app.models import TestConfig, TestExecution, ExecutionSummary
+from app.services import execution_summaries
+
+
+def add_executions(db, count, **fields):
+    config = TestConfig(name="Orders", url="http://example.test/orders")
+    db.add(config)
+    db.flush()
+    executions = []
+    for i in range(count):
+        execution = TestExecution(config_id=config.id, status="completed" if i % 2 else "failed", **fields)
+        db.add(execution)
+        executions.append(execution)
+    db.flush()
+    return config, executions
+
+
+def test_keyset_pages_cover_every_execution_once():
+    with SessionLocal() as db:
+        _, executions = add_executions(db, 7)
+        for execution in executions:
+            execution_summaries.sync(db, execution)
+        db.commit()
+        expected = sorted((e.id for e in executions), reverse=True)
+
+        seen, cursor = [], None
+        while True:
+            page = execution_summaries.page(db, limit=3, before=cursor)
+            seen += [item.execution_id for item in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == expected
+
+        completed = execution_summaries.page(db, limit=10, status="completed")
+        assert [item.execution_id for item in completed["items"]] == [
+            e.id for e in sorted(executions, key=lambda e: -e.id) if e.status == "completed"
+        ]
+        assert completed["next_cursor"] is None
+
+
+def test_summary_falls_back_to_the_config_without_a_run_request():
+    with SessionLocal() as db:
+        _, (execution,) = add_executions(db, 1)
+        execution.result_summary = {"http_reqs": 200, "http_req_failed": 10, "rps": 20.0,
+                                    "http_req_duration": {"p95": 120.0, "p99": 180.0}}
+        db.commit()
+        execution_id = execution.id
+
+        # Backfill expunges what it loaded
+        assert execution_summaries.backfill(db) == 1
+        summary = db.get(ExecutionSummary, execution_id)
+        assert (summary.name, summary.url) == ("Orders", "http://example.test/orders")
+        assert (summary.http_reqs, summary.p95, summary.error_rate) == (200, 120.0, 0.05)
+
+
+def test_run_request_takes_precedence_over_the_config():
+    with SessionLocal() as db:
+        _, (execution,) = add_executions(db, 1, run_request={"name": "Quick Test", "url": "http://example.test/quick"})
+        summary = execution_summaries.sync(db, execution)
+        assert (summary.name, summary.url) == ("Quick Test", "http://example.test/quick")
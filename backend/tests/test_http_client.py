@@ -0,0 +1,93 @@
+import asyncio
+import gzip
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.services import http_client
+from app.services.http_client import BODY_READ_LIMIT
+
+
+class ChunkedBody(httpx.AsyncByteStream):
+    """A response body arriving in 4 KB chunks."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    async def __aiter__(self):
+        for offset in range(0, len(self.body), 4096):
+            yield self.body[offset:offset + 4096]
+
+
+def fetch(body: bytes):
+    """fetch() against a transport answering every request with `body`."""
+    async def scenario():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=ChunkedBody(body)))
+        http_client._client = httpx.AsyncClient(transport=transport)
+        http_client._client_loop = asyncio.get_running_loop()
+        try:
+            response, content, truncated, _ = await http_client.fetch("GET", "http://example.test")
+        finally:
+            await http_client.close_client()
+        return response.status_code, content, truncated
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("size, truncated", [
+    (10, False),
+    (BODY_READ_LIMIT, False),
+    (BODY_READ_LIMIT + 1, True),
+    (BODY_READ_LIMIT * 3, True),
+])
+def test_body_is_truncated_only_past_the_limit(size, truncated):
+    status, content, was_truncated = fetch(b"x" * size)
+    assert status == 200
+    assert content == b"x" * min(size, BODY_READ_LIMIT)
+    assert was_truncated is truncated
+
+
+def test_gzip_body_is_decompressed():
+    assert fetch(gzip.compress(b'{"ok": true}')) == (200, b'{"ok": true}', False)
+    # Small on the wire, over the limit once decompressed
+    status, content, truncated = fetch(gzip.compress(b"y" * (BODY_READ_LIMIT * 2)))
+    assert content == b"y" * BODY_READ_LIMIT and truncated
+
+
+def test_client_of_a_finished_event_loop_is_closed():
+    async def open_client():
+        return http_client.get_client()
+
+    async def replace_client():
+        client = http_client.get_client()
+        await asyncio.sleep(0)
+        return client
+
+    old = asyncio.run(open_client())
+    new = asyncio.run(replace_client())
+    try:
+        assert new is not old and not new.is_closed
+        assert old.is_closed
+    finally:
+        asyncio.run(http_client.close_client())
+
+
+@pytest.mark.parametrize("verify", [False, True])
+def test_tls_verification_follows_the_setting(monkeypatch, verify):
+    created = []
+    real_client = httpx.AsyncClient
+
+    def record(**kwargs):
+        created.append(kwargs)
+        return real_client(**kwargs)
+
+    monkeypatch.setattr(settings, "DEBUG_HTTP_VERIFY_TLS", verify)
+    monkeypatch.setattr(httpx, "AsyncClient", record)
+
+    async def scenario():
+        http_client.get_client()
+        await http_client.close_client()
+
+    asyncio.run(scenario())
+    assert [kwargs["verify"] for kwargs in created] == [verify]
@@ -0,0 +1,203 @@
+import asyncio
+import gzip
+import stat
+import sys
+import time
+
+import pytest
+
+from app.config import settings
+from app.services.k6_executor import K6Executor
+from app.services.log_sink import LogReader
+from app.services.segment_worker import SegmentWorker
+
+STUB_HEADER = '''#!{python}
+import gzip, signal, sys, time
+args = sys.argv[1:]
+out = next(arg[5:] for arg in args if arg.startswith("json="))
+'''
+
+# Progress redrawn with bare \r, Windows line breaks, a line split across
+# writes, output on stderr and a last line without a newline
+CHATTY_K6 = r'''
+with (gzip.open if out.endswith(".gz") else open)(out, "wt") as f:
+    f.write('{"metric":"http_reqs","type":"Point","data":{"time":"2024-01-01T12:00:00.5+08:00","value":1,"tags":{}}}\n')
+for i in range(3):
+    sys.stdout.write("running %d/3\r" % i)
+    sys.stdout.flush()
+sys.stdout.write("done\r\n")
+sys.stdout.write("split ")
+sys.stdout.flush()
+time.sleep(0.05)
+sys.stdout.write("line\n")
+sys.stdout.write("x" * 200000 + "\n")
+sys.stderr.write("level=warning msg=slow\n")
+sys.stdout.write("last")
+'''
+
+# Exits cleanly on SIGTERM, like K6 writing its summary
+GRACEFUL_K6 = r'''
+def stop(*_):
+    print("stopping", flush=True)
+    sys.exit(0)
+signal.signal(signal.SIGTERM, stop)
+print("started", flush=True)
+time.sleep(30)
+'''
+
+# Writes 10 requests and names its execution segment
+SEGMENT_K6 = r'''
+segment = args[args.index("--execution-segment") + 1] if "--execution-segment" in args else "whole"
+with (gzip.open if out.endswith(".gz") else open)(out, "wt") as f:
+    for i in range(10):
+        f.write('{"metric":"http_reqs","type":"Point","data":{"time":"2024-01-01T12:00:0%d.5+08:00","value":1,"tags":{}}}\n' % (i % 3))
+        f.write('{"metric":"http_req_duration","type":"Point","data":{"time":"2024-01-01T12:00:00.5+08:00","value":%d,"tags":{}}}\n' % (10 + i))
+print("segment " + segment)
+'''
+
+STUBBORN_K6 = r'''
+signal.signal(signal.SIGTERM, signal.SIG_IGN)
+print("started", flush=True)
+time.sleep(30)
+'''
+
+
+def points(count, status_value=0):
+    return "".join(
+        '{"metric":"http_reqs","type":"Point","data":{"time":"2024-01-01T12:00:00.5+08:00","value":1,"tags":{}}}\n'
+        '{"metric":"http_req_failed","type":"Point","data":{"time":"2024-01-01T12:00:00.5+08:00","value":%d,"tags":{}}}\n'
+        % status_value
+        for _ in range(count)
+    )
+
+
+class FakeWorker(SegmentWorker):
+    """Writes a fixed result file instead of running K6."""
+
+    def __init__(self, name, count, exit_code=0, failed=0):
+        self.name, self.count, self.exit_code, self.failed = name, count, exit_code, failed
+        self.calls = []
+
+    async def run(self, script_path, result_file, on_line, segment=None, sequence=None):
+        self.calls.append((segment, sequence))
+        opener = gzip.open if result_file.endswith(".gz") else open
+        with opener(result_file, "wt") as f:
+            f.write(points(self.count, self.failed))
+        await on_line(f"done {segment}")
+        return self.exit_code
+
+    def stop(self):
+        pass
+
+    def describe(self):
+        return self.name
+
+
+@pytest.fixture
+def k6_stub(dirs, monkeypatch):
+    """Point K6_PATH at a Python script standing in for K6; returns a test script path."""
+    def install(body):
+        path = dirs / "stub_k6.py"
+        path.write_text(STUB_HEADER.format(python=sys.executable) + body)
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+        monkeypatch.setattr(settings, "K6_PATH", str(path))
+        monkeypatch.setattr(settings, "K6_ARCHIVE", False)
+        script = dirs / "scripts" / "test.js"
+        script.write_text("export default function () {}\n")
+        return str(script)
+    return install
+
+
+async def wait_for_line(logs, text, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not any(text in line for line in logs):
+        assert time.monotonic() < deadline, logs
+        await asyncio.sleep(0.01)
+
+
+def test_output_lines_are_split_on_any_line_break(k6_stub):
+    script = k6_stub(CHATTY_K6)
+    logs = []
+
+    async def on_log(line):
+        logs.append(line)
+
+    result = asyncio.run(K6Executor().run(script, 1, on_log=on_log))
+
+    assert result["success"] and result["summary"]["http_reqs"] == 1
+    output = [line for line in logs if not line.startswith("[INFO]")]
+    assert [line for line in output if "running" in line] == [f"[PROGRESS] running {i}/3" for i in range(3)]
+    assert {"done", "split line", "x" * 200000, "level=warning msg=slow", "last"} <= set(output)
+
+
+def test_stop_lets_k6_exit_on_its_own(k6_stub):
+    script = k6_stub(GRACEFUL_K6)
+    executor = K6Executor()
+    logs = []
+
+    async def on_log(line):
+        logs.append(line)
+
+    async def scenario():
+        run = asyncio.create_task(executor.run(script, 1, on_log=on_log))
+        await wait_for_line(logs, "started")
+        executor.stop()
+        return await asyncio.wait_for(run, timeout=5)
+
+    result = asyncio.run(scenario())
+    assert result["return_code"] == 0 and "stopping" in logs
+    assert executor.workers == []
+
+
+def test_cancelling_the_run_kills_k6(k6_stub):
+    script = k6_stub(STUBBORN_K6)
+    executor = K6Executor()
+    logs = []
+
+    async def on_log(line):
+        logs.append(line)
+
+    async def scenario():
+        run = asyncio.create_task(executor.run(script, 1, on_log=on_log))
+        await wait_for_line(logs, "started")
+        process = executor.workers[0].process
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+        return await asyncio.wait_for(process.wait(), timeout=5)
+
+    assert asyncio.run(scenario()) != 0
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_local_segments_are_merged_into_one_result(k6_stub, monkeypatch, compression):
+    script = k6_stub(SEGMENT_K6)
+    monkeypatch.setattr(settings, "RESULT_COMPRESSION", compression)
+    logs = []
+
+    async def on_log(line):
+        logs.append(line)
+
+    result = asyncio.run(K6Executor().run(script, 1, on_log=on_log, segments=3))
+
+    assert result["success"] and result["segments"] == 3
+    assert result["summary"]["http_reqs"] == 30
+    assert result["summary"]["http_req_duration"]["max"] == 19
+    assert result["result_file"].endswith(".json.gz" if compression == "gzip" else ".json")
+    opener = gzip.open if compression == "gzip" else open
+    with opener(result["result_file"], "rt") as f:
+        assert sum(1 for _ in f) == 60
+    assert {"[s0] segment 0:1/3", "[s1] segment 1/3:2/3", "[s2] segment 2/3:1"} <= set(logs)
+    assert LogReader(result["log_file"]).page(0, 100)["total"] == len(logs) - 3
+
+
+def test_custom_workers_with_weights_and_a_failing_segment(dirs):
+    workers = [FakeWorker("agent-a", 30), FakeWorker("agent-b", 10, exit_code=99, failed=1)]
+    script = dirs / "scripts" / "test.js"
+    script.write_text("export default function () {}\n")
+
+    result = asyncio.run(K6Executor().run(str(script), 2, workers=workers, weights=[3, 1], archive=False))
+
+    assert [worker.calls for worker in workers] == [[("0:3/4", "0,3/4,1")], [("3/4:1", "0,3/4,1")]]
+    assert not result["success"] and result["return_code"] == 99
+    assert result["summary"]["http_reqs"] == 40 and result["summary"]["http_req_failed"] == 10
@@ -0,0 +1,31 @@
+import io
+
+import pytest
+
+from app.services import data_files
+from app.services.k6_generator import K6ScriptGenerator
+
+
+@pytest.fixture
+def data_file(dirs):
+    return data_files.store_upload(io.BytesIO(b"n\n1\n2\n3\n"))["path"]
+
+
+@pytest.mark.parametrize("options, test_vus", [
+    ({"vus": 8}, "8"),
+    ({"load_sub_mode": "stages", "stages": [{"duration": "10s", "target": 5}, {"duration": "5s", "target": 2}]}, "5"),
+    ({"load_category": "rps"}, "null"),
+    ({"load_category": "rps", "load_sub_mode": "stages", "rps_stages": [{"duration": "10s", "target": 50}]}, "null"),
+])
+def test_per_vu_slices_use_the_configured_vu_count(data_file, options, test_vus):
+    script = K6ScriptGenerator().generate_preview(
+        url="http://example.test", data_file=data_file, data_distribution="per-vu", **options
+    )
+    assert f"const TEST_VUS = {test_vus};" in script
+    assert "vusInitialized" not in script
+
+
+def test_round_robin_has_no_vu_slices(data_file):
+    script = K6ScriptGenerator().generate_preview(url="http://example.test", data_file=data_file)
+    assert "vuSlice" not in script
+    assert "exec.scenario.iterationInInstance % data.length" in script
@@ -0,0 +1,93 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from app.services.latency_sketch import LatencySketch, quantile_from_key, _quantile_key
+
+QUANTILES = (0.01, 0.1, 0.5, 0.9, 0.95, 0.99, 0.999)
+
+
+def distributions():
+    rng = random.Random(7)
+    return {
+        "lognormal": [rng.lognormvariate(3, 0.8) for _ in range(50_000)],
+        "uniform": [rng.uniform(0.5, 2000) for _ in range(50_000)],
+        # Fast cache hits and slow misses, with a long tail
+        "bimodal": [max(rng.gauss(5, 0.5), 0.1) for _ in range(40_000)]
+        + [rng.expovariate(1 / 400) + 100 for _ in range(10_000)],
+    }
+
+
+def sketch_of(values, *args, **kwargs):
+    sketch = LatencySketch(*args, **kwargs)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+@pytest.mark.parametrize("name", ["lognormal", "uniform", "bimodal"])
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_quantiles_within_relative_accuracy(name, accuracy):
+    values = distributions()[name]
+    exact = sorted(values)
+    sketch = sketch_of(values, accuracy)
+
+    for q in QUANTILES:
+        expected = exact[min(int(len(exact) * q), len(exact) - 1)]
+        assert abs(sketch.quantile(q) - expected) <= accuracy * expected, q
+    assert sketch.quantile(0) == pytest.approx(exact[0], rel=accuracy)
+    assert sketch.quantile(1) == exact[-1]
+    assert sketch.count == len(values) and sketch.sum == pytest.approx(math.fsum(values))
+
+
+def test_merge_matches_a_single_sketch():
+    values = distributions()["lognormal"][:5000]
+    whole = sketch_of(values)
+    merged = LatencySketch()
+    for start in range(0, len(values), 700):
+        merged.merge(sketch_of(values[start:start + 700]))
+
+    assert merged.buckets == whole.buckets
+    assert (merged.count, merged.min, merged.max) == (whole.count, whole.min, whole.max)
+    assert merged.sum == pytest.approx(whole.sum)
+
+
+def test_zeros_and_serialization():
+    sketch = sketch_of([0, 0, 0, 10, 20])
+    assert sketch.quantile(0.5) == 0
+    assert sketch.quantile(0.9) == pytest.approx(20, rel=0.01)
+
+    restored = LatencySketch.from_dict(sketch.to_dict())
+    assert restored.stats() == sketch.stats()
+    coarse = LatencySketch(0.05)
+    coarse.add(1)
+    with pytest.raises(ValueError):
+        sketch.merge(coarse)
+
+
+def test_collapsing_keeps_the_upper_quantiles_accurate():
+    values = [0.001 * 10 ** (8 * i / 19_999) for i in range(20_000)]
+    sketch = sketch_of(values, 0.01, max_buckets=200)
+
+    assert len(sketch.buckets) <= 200
+    for q in (0.9, 0.99, 0.999):
+        expected = values[int(len(values) * q)]
+        assert sketch.quantile(q) == pytest.approx(expected, rel=0.01)
+
+
+def test_add_many_matches_add():
+    values = distributions()["bimodal"][::7]
+    vectorized = LatencySketch()
+    vectorized.add_many(np.array(values))
+    one_by_one = sketch_of(values)
+
+    assert vectorized.buckets == one_by_one.buckets
+    assert (vectorized.count, vectorized.min, vectorized.max) == (one_by_one.count, one_by_one.min, one_by_one.max)
+    assert vectorized.sum == pytest.approx(one_by_one.sum)
+
+
+@pytest.mark.parametrize("q", [0.05, 0.5, 0.9, 0.95, 0.99, 0.995, 0.999, 0.9999, 1.0])
+def test_quantile_keys_round_trip(q):
+    assert quantile_from_key(_quantile_key(q)) == q
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from app.websocket.log_batcher import LogBatcher
+
+
+def test_lines_are_batched_and_progress_keeps_the_latest():
+    async def scenario():
+        frames = []
+
+        async def send(frame):
+            frames.append(frame)
+
+        batcher = LogBatcher(send, batch_size=3, flush_interval=60)
+        for i in range(7):
+            batcher.add(f"line {i}")
+        batcher.add("[PROGRESS] 10%")
+        batcher.add("[PROGRESS] 20%")
+        await batcher.flush()
+        batcher.close()
+        return frames
+
+    frames = asyncio.run(scenario())
+    assert [frame["lines"] for frame in frames] == [
+        ["line 0", "line 1", "line 2"], ["line 3", "line 4", "line 5"], ["line 6"],
+    ]
+    assert [frame["progress"] for frame in frames] == [None, None, "[PROGRESS] 20%"]
+    assert all(frame["dropped"] == 0 for frame in frames)
+
+
+def test_lines_are_sent_after_the_flush_interval():
+    async def scenario():
+        sent = asyncio.Event()
+        frames = []
+
+        async def send(frame):
+            frames.append(frame)
+            sent.set()
+
+        batcher = LogBatcher(send, batch_size=100, flush_interval=0.01)
+        batcher.add("only line")
+        await asyncio.wait_for(sent.wait(), timeout=5)
+        batcher.close()
+        return frames
+
+    assert asyncio.run(scenario())[0]["lines"] == ["only line"]
+
+
+def test_slow_client_gets_a_drop_count_instead_of_unbounded_buffering():
+    async def scenario():
+        frames = []
+        release = asyncio.Event()
+
+        async def send(frame):
+            frames.append(frame)
+            await release.wait()  # The client is not reading
+
+        # Ten-byte lines, room for five of them
+        batcher = LogBatcher(send, batch_size=2, flush_interval=60, max_in_flight_bytes=50)
+        for i in range(8):
+            batcher.add(f"line {i:05d}")
+        flushing = asyncio.create_task(batcher.flush())
+        await asyncio.sleep(0)
+        # Sending does not free the budget until the frame is written
+        batcher.add("line 99999")
+        release.set()
+        await flushing
+
+        # Once the client caught up, lines are accepted again
+        batcher.add("line after")
+        await batcher.flush()
+        batcher.close()
+        return frames
+
+    frames = asyncio.run(scenario())
+    lines = [line for frame in frames for line in frame["lines"]]
+    assert lines == [f"line {i:05d}" for i in range(5)] + ["line after"]
+    assert sum(frame["dropped"] for frame in frames) == 4
+    assert frames[2]["dropped"] == 4
+
+
+def test_configure_validates_limits():
+    async def scenario():
+        async def send(frame):
+            pass
+
+        batcher = LogBatcher(send)
+        batcher.configure(batch_size=10, flush_interval=0.5, max_in_flight_bytes=1024)
+        assert (batcher.batch_size, batcher.flush_interval, batcher.max_in_flight_bytes) == (10, 0.5, 1024)
+        for limits in ({"batch_size": 0}, {"flush_interval": 0}, {"max_in_flight_bytes": 0}):
+            with pytest.raises(ValueError):
+                batcher.configure(**limits)
+
+    asyncio.run(scenario())
+
+
+def test_flush_up_to_a_line_sequence_number():
+    async def scenario():
+        frames = []
+        scheduled = []
+
+        async def send(frame):
+            frames.append(frame)
+
+        batcher = LogBatcher(send, batch_size=10, flush_interval=60, schedule=scheduled.append)
+        for i in range(3):
+            batcher.add(f"line {i}")
+        upto = batcher.sequence
+        batcher.add("line 3")
+        batcher.add("[PROGRESS] 50%")
+        await batcher.flush(upto=upto)
+        assert batcher.pending
+        await batcher.flush(upto=batcher.sequence)
+        batcher.close()
+        return frames
+
+    frames = asyncio.run(scenario())
+    assert [frame["lines"] for frame in frames] == [["line 0", "line 1", "line 2"], ["line 3"]]
+    assert frames[0]["progress"] == "[PROGRESS] 50%" and frames[1]["progress"] is None
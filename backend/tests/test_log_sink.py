@@ -0,0 +1,84 @@
+import gzip
+
+import pytest
+
+from app.services.log_sink import LogSink, LogReader, page_text, index_path_for
+
+
+def sample_lines(count):
+    kinds = [
+        'time="2024-01-01T12:00:00+08:00" level=info msg="order {} placed" source=console',
+        "[ERROR] request {} failed: connection refused",
+        'time="2024-01-01T12:00:00+08:00" level=warning msg="slow response {}"',
+        "running (0m{:02d}.0s), 10/10 VUs, ünïcode progress",
+    ]
+    return [kinds[(i * 7) % 5 % 4].format(i % 60) for i in range(count)]
+
+
+@pytest.fixture
+def log(tmp_path):
+    lines = sample_lines(103)
+    sink = LogSink(str(tmp_path / "exec.log.gz"), head_lines=5, tail_lines=10, chunk_lines=7)
+    for line in lines:
+        sink.write(line)
+    sink.close()
+    return sink, lines
+
+
+@pytest.mark.parametrize("level", [None, "error", "warning", "info"])
+@pytest.mark.parametrize("limit", [1, 6, 7, 50, 500])
+def test_paging_round_trips(log, level, limit):
+    sink, lines = log
+    reader = LogReader(sink.path)
+    expected = page_text("\n".join(lines), 0, len(lines), level)
+
+    pages, offset = [], 0
+    while True:
+        page = reader.page(offset, limit, level)
+        assert page["total"] == expected["total"]
+        assert page == page_text("\n".join(lines), offset, limit, level)
+        if not page["lines"]:
+            break
+        pages += page["lines"]
+        offset += limit
+    assert pages == expected["lines"]
+    assert all(lines[item["n"]] == item["text"] for item in pages)
+
+
+def test_log_file_is_plain_gzip(log):
+    sink, lines = log
+    with gzip.open(sink.path, "rt", encoding="utf-8") as f:
+        assert f.read().splitlines() == lines
+    with open(index_path_for(sink.path), encoding="utf-8") as f:
+        assert len(f.readlines()) == -(-len(lines) // 7)
+
+
+def test_memory_keeps_head_and_tail(log):
+    sink, lines = log
+    assert sink.head == lines[:5] and list(sink.tail) == lines[-10:]
+    assert sink.omitted == len(lines) - 15
+    excerpt = sink.excerpt().split("\n")
+    assert excerpt[:5] == lines[:5] and excerpt[-10:] == lines[-10:]
+    assert f"[{len(lines) - 15} lines omitted" in excerpt[5]
+
+
+def test_short_log_has_no_marker(tmp_path):
+    lines = sample_lines(12)
+    sink = LogSink(str(tmp_path / "short.log.gz"), head_lines=5, tail_lines=10)
+    for line in lines:
+        sink.write(line)
+    sink.close()
+    assert sink.omitted == 0 and sink.excerpt() == "\n".join(lines)
+
+
+def test_reading_while_the_log_is_written(tmp_path):
+    lines = sample_lines(20)
+    sink = LogSink(str(tmp_path / "live.log.gz"), chunk_lines=8)
+    for line in lines:
+        sink.write(line)
+
+    # Only whole chunks are on disk until the sink is closed
+    page = LogReader(sink.path).page(0, 100)
+    assert page["total"] == 16 and [item["text"] for item in page["lines"]] == lines[:16]
+    sink.close()
+    assert LogReader(sink.path).page(10, 100)["lines"][-1] == {"n": 19, "text": lines[-1]}
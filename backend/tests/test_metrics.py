@@ -0,0 +1,61 @@
+import pytest
+
+from app import metrics
+from app.metrics import Metric, Registry
+
+
+def test_metric_is_abstract():
+    with pytest.raises(TypeError):
+        Metric("m", "doc")
+
+
+def test_render_openmetrics():
+    registry = Registry()
+    counter = registry.counter("lines", "Lines seen", ("source",))
+    gauge = registry.gauge("depth", 'Queue "depth"\nnow')
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    counter.inc(source='a"b')
+    counter.inc(2, source='a"b')
+    gauge.set(3)
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+
+    assert registry.render() == (
+        "# TYPE lines counter\n"
+        "# HELP lines Lines seen\n"
+        'lines_total{source="a\\"b"} 3\n'
+        "# TYPE depth gauge\n"
+        '# HELP depth Queue \\"depth\\"\\nnow\n'
+        "depth 3\n"
+        "# TYPE latency_seconds histogram\n"
+        "# HELP latency_seconds Latency\n"
+        'latency_seconds_bucket{le="0.1"} 1\n'
+        'latency_seconds_bucket{le="1.0"} 2\n'
+        'latency_seconds_bucket{le="+Inf"} 3\n'
+        "latency_seconds_sum 5.55\n"
+        "latency_seconds_count 3\n"
+        "# EOF\n"
+    )
+
+
+def test_label_and_registration_checks():
+    registry = Registry()
+    counter = registry.counter("c", "doc", ("a",))
+    with pytest.raises(ValueError):
+        registry.gauge("c", "doc")
+    with pytest.raises(ValueError):
+        counter.inc(b=1)
+    with pytest.raises(ValueError):
+        counter.inc(-1, a=1)
+
+
+def test_execution_series_are_removed_when_finished():
+    snapshot = {"http_reqs": 10, "http_req_failed": 1, "error_rate": 0.1, "rps": 5, "vus": 2,
+                "http_req_duration": {"p50": 10.0, "p99": 90.0}}
+    metrics.observe_execution(999, None, snapshot)
+    text = metrics.REGISTRY.render()
+    assert 'k6_execution_http_reqs{execution_id="999",config_id=""} 10' in text
+    assert 'k6_execution_http_req_duration_milliseconds{execution_id="999",config_id="",quantile="0.99"} 90.0' in text
+
+    metrics.forget_execution(999, None)
+    assert 'execution_id="999"' not in metrics.REGISTRY.render()
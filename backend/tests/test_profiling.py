@@ -0,0 +1,104 @@
+import threading
+import time
+
+from app.services.profiling import (
+    PhaseTimer, SamplingProfiler, finish_profile, profile_path_for, span, start_profile,
+)
+
+
+def test_spans_are_sorted_by_start_and_nest():
+    timer = PhaseTimer()
+    with timer.span("run"):
+        with timer.span("k6"):
+            time.sleep(0.01)
+    spans = timer.to_dict()["spans"]
+    assert [s["name"] for s in spans] == ["run", "k6"]
+    run, k6 = spans
+    assert run["start_ms"] <= k6["start_ms"]
+    assert run["duration_ms"] >= k6["duration_ms"] >= 10
+
+
+def test_span_recorded_when_the_block_raises():
+    timer = PhaseTimer()
+    try:
+        with timer.span("parse"):
+            raise ValueError
+    except ValueError:
+        pass
+    assert [s["name"] for s in timer.to_dict()["spans"]] == ["parse"]
+
+
+def test_marks_keep_the_first_moment_and_totals_add_up():
+    timer = PhaseTimer()
+    timer.mark("first_output")
+    first = timer.marks["first_output"]
+    time.sleep(0.005)
+    timer.mark("first_output")
+    assert timer.marks["first_output"] == first
+
+    timer.add("scan", 0.001)
+    timer.add("scan", 0.002)
+    assert timer.to_dict()["totals"] == {"scan": {"ms": 3.0, "count": 2}}
+
+
+def test_totals_from_many_threads():
+    timer = PhaseTimer()
+
+    def work():
+        for _ in range(1000):
+            timer.add("scan", 0.001)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert timer.to_dict()["totals"]["scan"]["count"] == 4000
+
+
+def test_span_without_timer_is_a_no_op():
+    with span(None, "run"):
+        pass
+    timer = PhaseTimer()
+    with span(timer, "run"):
+        pass
+    assert len(timer.spans) == 1
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampling_profiler_folds_stacks_of_other_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    worker.start()
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    time.sleep(0.1)
+    folded = profiler.stop()
+    stop.set()
+    worker.join()
+
+    assert profiler.samples > 0
+    lines = folded.splitlines()
+    assert any(line.startswith("busy;") and "busy_loop (test_profiling.py:" in line for line in lines)
+    assert not any(line.startswith("profiler;") for line in lines)
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+
+
+def test_one_profile_at_a_time(dirs):
+    profiler = start_profile()
+    assert profiler is not None
+    assert start_profile() is None
+    path = finish_profile(profiler, 7)
+    assert path == profile_path_for(7)
+    with open(path, encoding="utf-8") as f:
+        f.read()
+    # The lock is released, so the next execution can be profiled
+    again = start_profile()
+    assert again is not None
+    finish_profile(again, 8)
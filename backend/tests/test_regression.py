@@ -0,0 +1,102 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.database import SessionLocal
+from app.models import TestConfig, TestExecution
+from app.services import regression
+from app.services.latency_sketch import LatencySketch
+
+
+def sketch_of(values):
+    sketch = LatencySketch()
+    sketch.add_many(np.asarray(values))
+    return sketch
+
+
+def execution(id, latencies, requests=10_000, failed=50, rps=100.0, **fields):
+    return TestExecution(
+        id=id,
+        latency_sketch=sketch_of(latencies).to_dict(),
+        result_summary={"http_reqs": requests, "http_req_failed": failed, "rps": rps},
+        **fields,
+    )
+
+
+@pytest.mark.parametrize("t, df", [(0.5, 1), (2.0, 1), (12.7, 1), (1.0, 2), (4.3, 2)])
+def test_student_t_matches_closed_forms(t, df):
+    # Cauchy for one degree of freedom, 1 - |t| / sqrt(t^2 + 2) for two
+    expected = 1 - 2 * math.atan(abs(t)) / math.pi if df == 1 else 1 - abs(t) / math.sqrt(t * t + 2)
+    assert regression._student_t_two_sided(t, df) == pytest.approx(expected, rel=1e-9)
+
+
+def test_known_critical_values():
+    assert regression._student_t_two_sided(2.228, 10) == pytest.approx(0.05, abs=5e-4)
+    assert regression._student_t_two_sided(1.96, 5000) == pytest.approx(0.05, abs=5e-4)
+    assert regression._kolmogorov_sf(1.358) == pytest.approx(0.05, abs=5e-4)
+    assert regression._kolmogorov_sf(1.0) == pytest.approx(0.27, abs=5e-4)
+    # 5% vs 8% of 1000 requests: z = 2.72
+    assert regression.proportion_test(50, 1000, 80, 1000) == pytest.approx(0.0065, rel=0.02)
+    assert regression.proportion_test(0, 1000, 0, 1000) == 1.0
+
+
+def test_ks_test_and_moments():
+    rng = np.random.default_rng(11)
+    a = rng.lognormal(3, 0.5, 5000)
+    same = sketch_of(rng.lognormal(3, 0.5, 5000))
+    shifted = sketch_of(rng.lognormal(3.1, 0.5, 5000))
+
+    assert regression.ks_test(sketch_of(a), sketch_of(a)) == (0.0, 1.0)
+    assert regression.ks_test(sketch_of(a), same)[1] > 0.01
+    d, p = regression.ks_test(sketch_of(a), shifted)
+    assert d > 0.05 and p < 1e-6
+
+    mean, variance = regression.sketch_moments(sketch_of(a))
+    assert mean == pytest.approx(a.mean())
+    assert variance == pytest.approx(a.var(ddof=1), rel=0.02)
+
+
+def test_compare_flags_slower_candidates_only(dirs):
+    rng = np.random.default_rng(5)
+    baseline = [execution(1, rng.lognormal(3, 0.4, 20_000)), execution(2, rng.lognormal(3, 0.4, 20_000))]
+
+    steady = regression.compare(baseline, [execution(3, rng.lognormal(3, 0.4, 20_000))], rebuild_series=False)
+    assert steady["verdict"] == "pass" and steady["baseline"] == [1, 2]
+    assert all(check["status"] == "ok" for check in steady["checks"])
+
+    slower = regression.compare(baseline, [execution(4, rng.lognormal(3.3, 0.4, 20_000))], rebuild_series=False)
+    statuses = {check["metric"]: check["status"] for check in slower["checks"]}
+    assert slower["verdict"] == "regression"
+    assert statuses["http_req_duration.p95"] == statuses["http_req_duration.avg"] == "regression"
+    assert statuses["error_rate"] == statuses["rps"] == "ok"
+
+    faster = regression.compare(baseline, [execution(5, rng.lognormal(2.7, 0.4, 20_000))], rebuild_series=False)
+    assert faster["verdict"] == "pass"
+    assert {check["metric"]: check["status"] for check in faster["checks"]}["http_req_duration.p50"] == "improvement"
+
+    failing = regression.compare(baseline, [execution(6, rng.lognormal(3, 0.4, 20_000), failed=800)],
+                                 rebuild_series=False)
+    assert [c["status"] for c in failing["checks"] if c["metric"] == "error_rate"] == ["regression"]
+
+
+def test_verdict_uses_earlier_runs_of_the_same_script(dirs):
+    rng = np.random.default_rng(9)
+    with SessionLocal() as db:
+        config = TestConfig(name="t", url="http://example.test")
+        db.add(config)
+        db.flush()
+        runs = [
+            execution(None, rng.lognormal(3, 0.4, 5000), config_id=config.id, status=status, script_hash=script)
+            for status, script in (("completed", "a"), ("failed", "a"), ("completed", "b"), ("completed", "a"))
+        ]
+        db.add_all(runs)
+        db.commit()
+        first, _, _, latest = (run.id for run in runs)
+
+    assert regression.record_verdict(first)["verdict"] == "no_baseline"
+    report = regression.record_verdict(latest)
+    assert report["baseline"] == [first] and report["verdict"] == "pass"
+    with SessionLocal() as db:
+        assert db.get(TestExecution, latest).regression["verdict"] == "pass"
+    assert regression.record_verdict(12345) is None
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+
+import pytest
+
+from app.services import result_store
+from app.services.latency_sketch import LatencySketch
+from app.services.result_store import ResultStore
+
+# 2024-01-01T00:00:00Z
+EPOCH = 1704067200
+
+
+def point(metric, second, micros, value, **tags):
+    timestamp = f"2024-01-01T00:00:{second:02d}.{micros:06d}+00:00"
+    return json.dumps({"metric": metric, "type": "Point", "data": {"time": timestamp, "value": value, "tags": tags}})
+
+
+@pytest.fixture
+def store(tmp_path):
+    lines = [json.dumps({"type": "Metric", "metric": "http_req_duration", "data": {"type": "trend"}})]
+    # Second 0: 100 requests of 1..100 ms; second 2: two requests, one failing
+    for i in range(100):
+        lines.append(point("http_req_duration", 0, i * 1000, i + 1, status="200", method="GET"))
+    lines.append(point("http_req_duration", 2, 0, 500, status="500", method="POST"))
+    lines.append(point("http_req_duration", 2, 500000, 20, status="200", method="POST"))
+    lines.append(point("vus", 1, 0, 7))
+    path = tmp_path / "result.json"
+    # Points out of time order within the file are sorted per row group
+    path.write_text("\n".join(reversed(lines)) + "\n", encoding="utf-8")
+    ResultStore.build(str(path), str(tmp_path / "store"))
+    return ResultStore.open(str(tmp_path / "store"))
+
+
+def test_bucketed_aggregations(store):
+    assert store.time_range("http_req_duration") == [EPOCH * 1_000_000, (EPOCH + 2) * 1_000_000 + 500_000]
+
+    counts = store.query("http_req_duration", step=1, agg="count")
+    assert counts["times"] == [EPOCH, EPOCH + 2]
+    assert counts["values"] == [100, 2]
+
+    assert store.query("http_req_duration", step=1, agg="avg")["values"] == [50.5, 260]
+    assert store.query("http_req_duration", step=1, agg="max")["values"] == [100, 500]
+    assert store.query("http_req_duration", step=4, agg="rate")["values"] == [102 / 4]
+    assert store.query("vus", agg="sum")["values"] == [7]
+
+
+def test_quantile_aggregations(store):
+    exact = LatencySketch()
+    exact.add_many(range(1, 101))
+    for agg, q in (("p50", 0.5), ("p999", 0.999), ("p99.9", 0.999)):
+        values = store.query("http_req_duration", step=1, agg=agg)["values"]
+        assert values[0] == pytest.approx(exact.quantile(q))
+    assert store.query("http_req_duration", step=1, agg="p999")["values"][0] == pytest.approx(100, rel=0.02)
+
+
+def test_range_and_tag_filters(store):
+    window = store.query("http_req_duration", start=EPOCH + 1, end=EPOCH + 3, step=1, agg="count")
+    assert window["times"] == [EPOCH + 2] and window["values"] == [2]
+
+    posts = store.query("http_req_duration", step=1, agg="avg", tags={"method": "POST", "status": "200"})
+    assert posts["values"] == [20]
+    assert store.query("http_req_duration", tags={"status": "404"})["values"] == []
+
+
+def test_invalid_queries(store):
+    for agg in ("median", "p", "p99.", "p1000x"):
+        with pytest.raises(ValueError, match="Unknown aggregation"):
+            store.query("http_req_duration", agg=agg)
+    with pytest.raises(ValueError, match="Too many points"):
+        store.query("http_req_duration", step=0.0001)
+    with pytest.raises(KeyError):
+        store.query("missing")
+    for value in (float("inf"), float("-inf"), float("nan")):
+        for option in ("start", "end", "step"):
+            with pytest.raises(ValueError, match="must be a finite number"):
+                store.query("http_req_duration", **{option: value})
+
+
+def test_concurrent_builds_and_opens_of_one_store(store, dirs):
+    result_file = os.path.join(os.path.dirname(store.path), "result.json")
+    errors = []
+
+    def work(build):
+        try:
+            for _ in range(5):
+                if build:
+                    result_store.build_for(7, result_file)
+                else:
+                    opened = result_store.open_or_build(7, result_file)
+                    assert opened.query("http_req_duration", step=1, agg="count")["values"] == [100, 2]
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(i % 2 == 0,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert os.listdir(dirs / "results") == ["store_7"]
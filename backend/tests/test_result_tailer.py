@@ -0,0 +1,109 @@
+import asyncio
+import gzip
+import zlib
+
+from app.config import settings
+from app.services import k6_executor
+from app.services.result_parser import ResultTailer
+
+
+def request_line(i):
+    return ('{"metric":"http_reqs","type":"Point","data":{"time":"2024-01-01T12:00:%02d.5+08:00","value":1,"tags":{}}}\n'
+            % (i % 60)).encode()
+
+
+def test_plain_file_is_read_line_by_line_as_it_grows(tmp_path):
+    path = tmp_path / "result.json"
+    data = b"".join(request_line(i) for i in range(10))
+    tailer = ResultTailer(str(path))
+    tailer._drain()  # K6 has not created the file yet
+
+    # Appends end mid-line; only complete lines count until the final drain
+    cuts = [0, 30, len(request_line(0)) * 3 + 5, len(data) - 1, len(data)]
+    seen = []
+    with open(path, "wb") as f:
+        for start, end in zip(cuts, cuts[1:]):
+            f.write(data[start:end])
+            f.flush()
+            tailer._drain()
+            seen.append(tailer.aggregator.http_reqs)
+    assert seen == [0, 3, 9, 10]
+
+
+def test_unterminated_last_line_is_read_by_the_final_drain(tmp_path):
+    path = tmp_path / "result.json"
+    path.write_bytes(request_line(0) + request_line(1).rstrip(b"\n"))
+    tailer = ResultTailer(str(path))
+    tailer._drain()
+    assert tailer.aggregator.http_reqs == 1
+    tailer._drain(final=True)
+    assert tailer.aggregator.http_reqs == 2
+
+
+def test_gzip_blocks_and_members_are_inflated_incrementally(tmp_path):
+    path = tmp_path / "result.json.gz"
+    tailer = ResultTailer(str(path))
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    with open(path, "wb") as f:
+        # A flushed block holding 4 lines, then the rest of the first member
+        f.write(compressor.compress(b"".join(request_line(i) for i in range(4))))
+        f.write(compressor.flush(zlib.Z_SYNC_FLUSH))
+        f.flush()
+        tailer._drain()
+        assert tailer.aggregator.http_reqs == 4
+
+        f.write(compressor.compress(request_line(4)) + compressor.flush())
+        # A second gzip member, as after K6 reopened the output
+        f.write(gzip.compress(b"".join(request_line(i) for i in range(5, 8))))
+        f.flush()
+        tailer._drain()
+    tailer._drain(final=True)
+    assert tailer.aggregator.http_reqs == 8
+
+
+def test_follow_reports_snapshots_until_stopped(tmp_path):
+    path = tmp_path / "result.json"
+
+    async def scenario():
+        tailer = ResultTailer(str(path), interval=0.01)
+        snapshots = []
+
+        async def on_metrics(snapshot):
+            snapshots.append(snapshot["http_reqs"])
+
+        following = asyncio.create_task(tailer.follow(on_metrics))
+        with open(path, "wb") as f:
+            for i in range(5):
+                f.write(request_line(i))
+                f.flush()
+                await asyncio.sleep(0.02)
+            f.write(request_line(5).rstrip(b"\n"))
+        tailer.stop()
+        await asyncio.wait_for(following, timeout=5)
+        return tailer, snapshots
+
+    tailer, snapshots = asyncio.run(scenario())
+    assert tailer.aggregator.http_reqs == 6 and not tailer.draining
+    assert snapshots and snapshots == sorted(snapshots) and snapshots[-1] <= 5
+
+
+def test_interval_setting_is_read_at_run_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LIVE_METRICS_INTERVAL", 0.01)
+    assert ResultTailer(str(tmp_path / "result.json")).interval == 0.01
+    assert ResultTailer(str(tmp_path / "result.json"), interval=0).interval == 0
+
+    async def scenario():
+        tailer = ResultTailer(str(tmp_path / "result.json"))
+        tailer.aggregator.feed_line(request_line(0))
+        snapshots = []
+
+        async def on_metrics(snapshot):
+            snapshots.append(snapshot)
+
+        publishing = asyncio.create_task(k6_executor._publish_merged([tailer], on_metrics))
+        await asyncio.sleep(0.2)
+        publishing.cancel()
+        return snapshots
+
+    # Several snapshots in 0.2 s: the patched interval, not the 1 s import-time default
+    assert len(asyncio.run(scenario())) >= 3
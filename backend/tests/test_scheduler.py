@@ -0,0 +1,162 @@
+import asyncio
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import TestExecution
+from app.services import result_store
+from app.services.k6_generator import K6ScriptGenerator
+from app.services.scheduler import ExecutionScheduler
+from app.websocket import manager
+
+STUB_K6 = '''#!{python}
+import gzip, sys
+open({marker!r}, "a").write(" ".join(sys.argv[1:]) + "\\n")
+out = next(arg[5:] for arg in sys.argv if arg.startswith("json="))
+point = '{{"metric":"http_req_duration","type":"Point","data":{{"time":"2024-01-01T12:00:00.5+08:00","value":12.5,"tags":{{}}}}}}\\n'
+point += '{{"metric":"http_reqs","type":"Point","data":{{"time":"2024-01-01T12:00:00.5+08:00","value":1,"tags":{{}}}}}}\\n'
+with (gzip.open if out.endswith(".gz") else open)(out, "wt") as f:
+    f.write(point * 10)
+print("running (0m01.0s), 1/1 VUs, 10 complete and 0 interrupted iterations")
+'''
+
+
+@pytest.fixture
+def k6(dirs, monkeypatch):
+    """A stub K6 that records its invocations in a marker file."""
+    marker = dirs / "k6_runs.log"
+    path = dirs / "k6_stub.py"
+    path.write_text(STUB_K6.format(python=sys.executable, marker=str(marker)))
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setattr(settings, "K6_PATH", str(path))
+    monkeypatch.setattr(settings, "K6_ARCHIVE", False)
+    return marker
+
+
+def status_of(execution_id):
+    with SessionLocal() as db:
+        return db.get(TestExecution, execution_id).status
+
+
+async def wait_idle(scheduler):
+    while scheduler._tasks:
+        await asyncio.gather(*list(scheduler._tasks.values()), return_exceptions=True)
+
+
+def test_run_completes(k6):
+    async def scenario():
+        scheduler = ExecutionScheduler(max_concurrent=1)
+        execution = await scheduler.enqueue({"url": "http://example.test"})
+        await wait_idle(scheduler)
+        return execution.id
+
+    execution_id = asyncio.run(scenario())
+    assert status_of(execution_id) == "completed"
+    with SessionLocal() as db:
+        assert db.get(TestExecution, execution_id).result_summary["http_reqs"] == 10
+    assert len(k6.read_text().splitlines()) == 1
+
+
+def test_result_store_is_ready_when_the_result_is_published(k6, client, monkeypatch):
+    published = []
+
+    async def publish(execution_id, message):
+        if message["type"] == "result":
+            published.append(result_store.ResultStore.open(result_store.store_dir_for(execution_id)))
+
+    monkeypatch.setattr(manager, "publish", publish)
+
+    async def scenario():
+        scheduler = ExecutionScheduler(max_concurrent=1)
+        execution = await scheduler.enqueue({"url": "http://example.test"})
+        await wait_idle(scheduler)
+        return execution.id
+
+    execution_id = asyncio.run(scenario())
+    [store] = published
+    assert store is not None and "http_reqs" in store.metrics
+
+    url = f"/api/executions/{execution_id}/timeseries?metric=http_reqs"
+    assert client.get(url).json()["values"]
+    for option in ("from=inf", "to=-inf", "step=nan"):
+        response = client.get(f"{url}&{option}")
+        assert response.status_code == 400 and "finite" in response.json()["detail"]
+
+
+def test_event_loop_keeps_running_while_a_script_is_generated(k6, monkeypatch):
+    generate = K6ScriptGenerator.generate
+
+    def slow_generate(self, *args, **kwargs):
+        time.sleep(0.3)
+        return generate(self, *args, **kwargs)
+
+    monkeypatch.setattr(K6ScriptGenerator, "generate", slow_generate)
+
+    async def scenario():
+        ticks = 0
+        running = True
+
+        async def ticker():
+            nonlocal ticks
+            while running:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.create_task(ticker())
+        scheduler = ExecutionScheduler(max_concurrent=1)
+        execution = await scheduler.enqueue({"url": "http://example.test"})
+        started = time.perf_counter()
+        await wait_idle(scheduler)
+        elapsed = time.perf_counter() - started
+        running = False
+        await ticker_task
+        return execution.id, ticks, elapsed
+
+    execution_id, ticks, elapsed = asyncio.run(scenario())
+    assert status_of(execution_id) == "completed"
+    # A generate blocking the loop would leave the ticker stalled for 0.3 s
+    assert elapsed >= 0.3 and ticks >= 15
+
+
+def test_queue_runs_by_priority_and_cancels_queued(k6):
+    async def scenario():
+        scheduler = ExecutionScheduler(max_concurrent=1)
+        first = await scheduler.enqueue({"url": "http://example.test/first"})
+        low = await scheduler.enqueue({"url": "http://example.test/low"})
+        high = await scheduler.enqueue({"url": "http://example.test/high"}, priority=5)
+        dropped = await scheduler.enqueue({"url": "http://example.test/dropped"})
+        queue = [entry["execution_id"] for entry in await scheduler.queued()]
+        cancelled = await scheduler.cancel(dropped.id)
+        await wait_idle(scheduler)
+        return first, low, high, dropped, queue, cancelled
+
+    first, low, high, dropped, queue, cancelled = asyncio.run(scenario())
+    assert queue == [high.id, low.id, dropped.id]
+    assert cancelled
+    assert status_of(dropped.id) == "cancelled"
+    assert [status_of(e.id) for e in (first, low, high)] == ["completed"] * 3
+
+
+def test_cancel_before_k6_starts(k6):
+    async def scenario():
+        scheduler = ExecutionScheduler(max_concurrent=1)
+        execution = await scheduler.enqueue({"url": "http://example.test"})
+        # The run task exists but has not generated its script yet
+        assert execution.id in scheduler._running
+        cancelled = await scheduler.cancel(execution.id)
+        await wait_idle(scheduler)
+        return execution.id, cancelled
+
+    execution_id, cancelled = asyncio.run(scenario())
+    assert cancelled
+    assert status_of(execution_id) == "cancelled"
+    assert not os.path.exists(k6)
+
+
+def test_cancel_unknown_execution():
+    assert asyncio.run(ExecutionScheduler().cancel(12345)) is False
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+from app.services.k6_generator import K6ScriptGenerator, script_hash
+from app.services.script_cache import ScriptCache
+
+STUB_K6 = '''#!{python}
+import sys
+args = sys.argv[1:]
+if {fail}:
+    print("error: could not resolve module")
+    sys.exit(107)
+open(args[args.index("--archive-out") + 1], "w").write("archive of " + args[-1])
+open({count!r}, "a").write("x")
+'''
+
+
+def age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_hit_miss_and_key(tmp_path):
+    cache = ScriptCache(str(tmp_path))
+    assert cache.get("abc") is None
+    path = cache.put("abc", "export default function () {}")
+    assert cache.get("abc") == path and ScriptCache.key_of(path) == "abc"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_least_recently_used_scripts_are_evicted(tmp_path):
+    cache = ScriptCache(str(tmp_path), max_files=3, min_age=60)
+    for i, key in enumerate("abc"):
+        age(cache.put(key, "x"), 1000 - i)
+    # Using "a" makes "b" the least recently used
+    cache.get("a")
+    cache.put("d", "x")
+    assert sorted(os.listdir(tmp_path)) == ["a.js", "c.js", "d.js"]
+
+
+def test_recent_scripts_and_byte_limit(tmp_path):
+    cache = ScriptCache(str(tmp_path), max_files=100, max_bytes=25, min_age=60)
+    age(cache.put("old", "x" * 10), 1000)
+    cache.put("new1", "x" * 10)
+    # Over the byte limit, but the remaining scripts are too recent to evict
+    cache.put("new2", "x" * 10)
+    assert sorted(os.listdir(tmp_path)) == ["new1.js", "new2.js"]
+
+
+def test_identical_configs_share_a_script(dirs):
+    generator = K6ScriptGenerator()
+    first = generator.generate(name="A", url="http://example.test", vus=5)
+    again = generator.generate(name="B", url="http://example.test", vus=5)
+    other = generator.generate(name="A", url="http://example.test", vus=6)
+    assert first == again != other
+    assert len(os.listdir(dirs / "scripts")) == 2
+    assert script_hash({"a": 1, "b": [1, 2]}) == script_hash({"b": [1, 2], "a": 1})
+
+
+@pytest.fixture
+def k6(tmp_path):
+    def make(fail=False):
+        count = tmp_path / "archives.count"
+        path = tmp_path / ("k6_failing.py" if fail else "k6_stub.py")
+        path.write_text(STUB_K6.format(python=sys.executable, fail=fail, count=str(count)))
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+        return str(path), count
+    return make
+
+
+def test_archive_is_reused_until_a_dependency_changes(tmp_path, k6):
+    k6_path, count = k6()
+    cache = ScriptCache(str(tmp_path / "scripts"))
+    os.makedirs(cache.directory)
+    script = cache.put("abc", "export default function () {}")
+    data = tmp_path / "data.csv"
+    data.write_text("a\n1\n")
+    age(data, 100)
+
+    archive = asyncio.run(cache.archive(script, k6_path, [str(data)]))
+    assert archive.endswith("abc.tar") and open(archive).read() == "archive of " + script
+    asyncio.run(cache.archive(script, k6_path, [str(data)]))
+    assert count.read_text() == "x"
+
+    data.write_text("a\n2\n")
+    os.utime(data, (time.time() + 5, time.time() + 5))
+    asyncio.run(cache.archive(script, k6_path, [str(data)]))
+    assert count.read_text() == "xx"
+
+
+def test_archive_failure_is_reported(tmp_path, k6):
+    k6_path, _ = k6(fail=True)
+    cache = ScriptCache(str(tmp_path / "scripts"))
+    os.makedirs(cache.directory)
+    script = cache.put("abc", "import x from 'missing';")
+    with pytest.raises(RuntimeError, match="code 107: error: could not resolve module"):
+        asyncio.run(cache.archive(script, k6_path))
+    assert os.listdir(cache.directory) == ["abc.js"]
@@ -0,0 +1,62 @@
+import asyncio
+from fractions import Fraction
+
+import pytest
+
+from app.services import segment_worker
+from app.services.segment_worker import SegmentWorker, LocalSegmentWorker, read_lines, segment_sequence
+
+
+def test_segment_worker_is_abstract():
+    with pytest.raises(TypeError):
+        SegmentWorker()
+
+    class Partial(SegmentWorker):
+        def stop(self):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+    assert LocalSegmentWorker("k6").describe() == "local"
+
+
+def test_segment_sequence():
+    assert segment_sequence(4) == [Fraction(0), Fraction(1, 4), Fraction(1, 2), Fraction(3, 4), Fraction(1)]
+    assert segment_sequence(2, [1, 3]) == [Fraction(0), Fraction(1, 4), Fraction(1)]
+    with pytest.raises(ValueError):
+        segment_sequence(0)
+    with pytest.raises(ValueError):
+        segment_sequence(2, [1, 0])
+
+
+def test_read_lines_splits_carriage_returns_across_reads():
+    async def scenario():
+        stream = asyncio.StreamReader()
+        # A \r\n split between two reads must not give an empty line
+        for chunk in (b"first\r", b"\nprogress 1\rprogress 2\r", b"\n\nl\xc3", b"\xa9ast"):
+            stream.feed_data(chunk)
+        stream.feed_eof()
+        lines = []
+
+        async def on_line(line):
+            lines.append(line)
+
+        original = segment_worker.OUTPUT_READ_SIZE
+        segment_worker.OUTPUT_READ_SIZE = 4
+        try:
+            await read_lines(stream, on_line)
+        finally:
+            segment_worker.OUTPUT_READ_SIZE = original
+        return lines
+
+    assert asyncio.run(scenario()) == ["first", "progress 1", "progress 2", "léast"]
+
+
+def test_unsupported_event_loop_is_reported(monkeypatch):
+    monkeypatch.setattr(segment_worker, "supports_subprocesses", lambda loop: False)
+
+    async def on_line(line):
+        pass
+
+    with pytest.raises(RuntimeError, match="Proactor"):
+        asyncio.run(LocalSegmentWorker("k6").run("script.js", "out.json", on_line))
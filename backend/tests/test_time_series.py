@@ -0,0 +1,92 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.services import time_series
+from app.services.result_parser import ResultAggregator
+
+
+def reference_lttb(x, y, threshold):
+    """Straightforward Largest-Triangle-Three-Buckets (Steinarsson, 2013)."""
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    keep = [0]
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = math.floor((i + 1) * every) + 1
+        avg_end = min(math.floor((i + 2) * every) + 1, n)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+        best, best_area = None, -1
+        for j in range(math.floor(i * every) + 1, math.floor((i + 1) * every) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return keep
+
+
+@pytest.mark.parametrize("n, points", [(10, 5), (1000, 100), (997, 13), (5000, 3)])
+def test_lttb_matches_the_reference_algorithm(n, points):
+    rng = np.random.default_rng(n)
+    x = np.arange(n, dtype=np.float64) + 1_700_000_000
+    y = np.cumsum(rng.normal(0, 1, n))
+    keep = time_series.lttb(x, y, points)
+    assert keep.tolist() == reference_lttb(x.tolist(), y.tolist(), points)
+    assert len(keep) == points and np.all(np.diff(keep) > 0)
+
+
+def test_lttb_keeps_spikes_and_short_series():
+    y = np.zeros(1000)
+    y[537] = 100
+    assert 537 in time_series.lttb(np.arange(1000), y, 20)
+    assert time_series.lttb(np.arange(5), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+    assert time_series.lttb(np.arange(5), np.arange(5.0), 2).tolist() == [0, 4]
+
+
+def test_min_max_keeps_every_extreme():
+    rng = np.random.default_rng(3)
+    y = rng.normal(0, 1, 10_000)
+    keep = time_series.min_max(y, 100)
+    assert len(keep) <= 100 and np.all(np.diff(keep) > 0)
+    assert y.argmax() in keep and y.argmin() in keep
+
+
+def test_downsample_drops_missing_seconds():
+    times = np.arange(10)
+    values = np.array([1, np.nan, 3, 4, np.nan, 6, 7, 8, 9, 10], dtype=np.float64)
+    assert time_series.downsample(times, values, 100) == {
+        "times": [0, 2, 3, 5, 6, 7, 8, 9], "values": [1, 3, 4, 6, 7, 8, 9, 10],
+    }
+    assert len(time_series.downsample(times, values, 4, "minmax")["times"]) <= 4
+    with pytest.raises(ValueError):
+        time_series.downsample(times, values, 4, "average")
+
+
+def test_series_of_a_run_are_saved_and_loaded(dirs):
+    aggregator = ResultAggregator()
+    for second, (requests, failed, vus) in enumerate([(10, 1, 2), (0, 0, 0), (20, 5, 4)]):
+        timestamp = f"2024-01-01T00:00:0{second}Z"
+        for i in range(requests):
+            aggregator.feed({"type": "Point", "metric": "http_reqs", "data": {"time": timestamp, "value": 1}})
+            aggregator.feed({"type": "Point", "metric": "http_req_duration",
+                             "data": {"time": timestamp, "value": 10.0 * (i + 1)}})
+        if failed:
+            aggregator.feed({"type": "Point", "metric": "http_req_failed", "data": {"time": timestamp, "value": failed}})
+        if vus:
+            aggregator.feed({"type": "Point", "metric": "vus", "data": {"time": timestamp, "value": vus}})
+
+    assert time_series.save_series(7, aggregator)
+    series = time_series.load_or_build(7, None)
+    assert series["start"] == 1704067200
+    assert series["rps"].tolist() == [10, 0, 20]
+    assert np.allclose(series["error_rate"], [0.1, np.nan, 0.25], equal_nan=True)
+    assert np.allclose(series["vus"], [2, np.nan, 4], equal_nan=True)
+    # Per-second quantiles within the histogram accuracy of the exact ones (10..100, 10..200 ms)
+    assert series["p50"][0] == pytest.approx(60, rel=time_series.HISTOGRAM_ACCURACY)
+    assert series["p99"][2] == pytest.approx(200, rel=time_series.HISTOGRAM_ACCURACY)
+    assert math.isnan(series["p50"][1])
+    assert time_series.load_series(8) is None
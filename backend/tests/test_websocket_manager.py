@@ -0,0 +1,101 @@
+import asyncio
+
+from app.config import settings
+from app.websocket.manager import ConnectionManager
+
+
+class FakeWebSocket:
+    """Records sent frames; a stalled one never finishes a send until released."""
+
+    def __init__(self, stalled=False):
+        self.frames = []
+        self.closed = None
+        self.released = asyncio.Event()
+        if not stalled:
+            self.released.set()
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        await self.released.wait()
+        self.frames.append(message)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+async def settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_a_stalled_client_does_not_hold_up_publishing():
+    async def scenario():
+        manager = ConnectionManager()
+        fast, stalled = FakeWebSocket(), FakeWebSocket(stalled=True)
+        for websocket in (fast, stalled):
+            await manager.connect(websocket)
+            manager.subscribe(websocket, 1)
+
+        await manager.publish_log(1, "line 1")
+        await asyncio.wait_for(manager.publish(1, {"type": "status", "status": "running"}), timeout=1)
+        await manager.publish_log(1, "line 2")
+        await asyncio.wait_for(manager.publish(1, {"type": "result"}), timeout=1)
+        await settle()
+        fast_frames = list(fast.frames)
+
+        stalled.released.set()
+        await settle()
+        manager.disconnect(fast)
+        manager.disconnect(stalled)
+        return fast_frames, stalled.frames
+
+    fast_frames, stalled_frames = asyncio.run(scenario())
+    # Buffered log lines still go out before the message that follows them
+    expected = [["line 1"], "running", ["line 2"], None]
+    assert [frame.get("lines") or frame.get("status") for frame in fast_frames] == expected
+    assert [frame.get("lines") or frame.get("status") for frame in stalled_frames] == expected
+
+
+def test_a_client_too_far_behind_is_disconnected(monkeypatch):
+    monkeypatch.setattr(settings, "WEBSOCKET_QUEUE_SIZE", 3)
+
+    async def scenario():
+        manager = ConnectionManager()
+        stalled = FakeWebSocket(stalled=True)
+        await manager.connect(stalled)
+        manager.subscribe(stalled, 1)
+        for i in range(6):
+            await manager.publish(1, {"type": "metrics", "n": i})
+        await settle()
+        return manager, stalled
+
+    manager, stalled = asyncio.run(scenario())
+    assert stalled.closed == 1013
+    assert stalled not in manager.active_connections and 1 not in manager.subscriptions
+    assert manager.senders == {} and manager.outboxes == {}
+
+
+def test_lines_logged_after_a_message_are_sent_after_it(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_FLUSH_INTERVAL", 0.01)
+
+    async def scenario():
+        manager = ConnectionManager()
+        stalled = FakeWebSocket(stalled=True)
+        await manager.connect(stalled)
+        manager.subscribe(stalled, 1)
+
+        await manager.publish(1, {"type": "status", "status": "running"})
+        for i in range(3):
+            await manager.publish_log(1, f"line {i}")
+        # Flush ticks come and go while the message is still waiting
+        await asyncio.sleep(0.05)
+        stalled.released.set()
+        await asyncio.sleep(0.05)
+        manager.disconnect(stalled)
+        return stalled.frames
+
+    frames = asyncio.run(scenario())
+    assert frames[0]["status"] == "running"
+    assert [line for frame in frames[1:] for line in frame["lines"]] == ["line 0", "line 1", "line 2"]
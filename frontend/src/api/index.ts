@@ -1,5 +1,5 @@
 import axios from 'axios'
-import type { TestConfig, TestConfigResponse, TestExecution } from '@/types'
+import type { TestConfig, TestConfigResponse, TestExecution, ExecutionPage, TimeSeries, TimeSeriesQuery, LogPage, ExecutionSeries, CompareRequest, RegressionReport } from '@/types'
 
 const api = axios.create({
   baseURL: '/api',
@@ -30,14 +30,27 @@ export const configApi = {
 
 // Test Execution APIs
 export const executionApi = {
-  // List executions
-  list: (configId?: number) => {
-    const params = configId ? { config_id: configId } : {}
-    return api.get<TestExecution[]>('/executions', { params })
-  },
+  // List executions, newest first; pass next_cursor of a page as `before` for the next one
+  list: (params: { config_id?: number; status?: string; script_hash?: string; before?: number; limit?: number } = {}) =>
+    api.get<ExecutionPage>('/executions', { params }),
   
   // Get a specific execution
   get: (id: number) => api.get<TestExecution>(`/executions/${id}`),
+  
+  // Get a page of log lines (level: error | warning | info)
+  logs: (id: number, params: { offset: number; limit: number; level?: string }) =>
+    api.get<LogPage>(`/executions/${id}/logs`, { params }),
+  
+  // Get one metric aggregated into time buckets
+  timeseries: (id: number, query: TimeSeriesQuery) =>
+    api.get<TimeSeries>(`/executions/${id}/timeseries`, { params: query }),
+  
+  // Get the per-second series (rps, error_rate, vus, p50...) downsampled to at most `points` points
+  series: (id: number, params: { points?: number; method?: 'lttb' | 'minmax'; names?: string } = {}) =>
+    api.get<ExecutionSeries>(`/executions/${id}/series`, { params }),
+  
+  // Compare executions with a baseline (default: previous runs of the same script)
+  compare: (request: CompareRequest) => api.post<RegressionReport>('/executions/compare', request),
 }
 
 // WebSocket helper
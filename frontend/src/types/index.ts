@@ -21,6 +21,9 @@ export type LoadCategory = 'vus' | 'rps'
 // 二级：简单模式 / 阶梯模式  
 export type LoadSubMode = 'simple' | 'stages'
 
+// 数据驱动：轮询 / 按 VU 分片
+export type DataDistribution = 'round-robin' | 'per-vu'
+
 // 保留旧类型以兼容
 export type LoadMode = 'simple' | 'stages' | 'rps'
 
@@ -73,8 +76,12 @@ export interface TestConfig {
   thresholds: ThresholdConfig[]
   // 执行控制
   stopOnFailure?: boolean
+  segments?: number               // K6 进程数(执行分段数)
+  useAgents?: boolean             // 分配到远程 Agent 执行(需 AGENT_TOKEN)
+  profile?: boolean               // 采样后端调用栈(需 PROFILER_ENABLED)
   // 数据驱动
   dataFile?: string
+  dataDistribution?: DataDistribution  // 数据行分配方式
 }
 
 export interface TestConfigResponse extends TestConfig {
@@ -91,17 +98,76 @@ export interface TestExecution {
   end_time?: string
   result_summary?: TestResultSummary
   result_file?: string
+  script_hash?: string             // 生成脚本的配置哈希
+  regression?: RegressionReport    // 与同一脚本之前执行的对比
   created_at: string
 }
 
+// One row of the execution history (GET /executions)
+export interface ExecutionSummary {
+  execution_id: number
+  config_id: number
+  name?: string
+  url?: string
+  status: string
+  script_hash?: string
+  created_at?: string
+  start_time?: string
+  end_time?: string
+  duration_ms?: number
+  http_reqs?: number
+  rps?: number
+  p95?: number
+  p99?: number
+  error_rate?: number
+  verdict?: RegressionReport['verdict']
+}
+
+export interface ExecutionPage {
+  items: ExecutionSummary[]
+  next_cursor: number | null       // 作为 before 参数获取下一页, null 表示没有更多
+}
+
+// Regression check of a run against a baseline (POST /executions/compare)
+export interface RegressionCheck {
+  metric: string                   // http_req_duration.p95, rps, error_rate ...
+  baseline: number | null
+  candidate: number | null
+  change: number | null            // 相对变化(error_rate 为绝对变化)
+  tolerance: number
+  test: 'ks' | 'welch' | 'z' | null
+  p_value: number | null
+  status: 'ok' | 'regression' | 'improvement'
+}
+
+export interface RegressionReport {
+  verdict: 'pass' | 'regression' | 'no_baseline'
+  baseline: number[]               // 基线执行ID
+  candidate: number[]
+  alpha?: number
+  checks: RegressionCheck[]
+}
+
+export interface CompareRequest {
+  candidate: number[]
+  baseline?: number[]              // 默认: 同一脚本之前的执行
+  latency_tolerance?: number
+  throughput_tolerance?: number
+  error_rate_tolerance?: number
+  alpha?: number
+}
+
 export interface TestResultSummary {
   http_reqs?: number
   http_req_duration?: {
     avg: number
     min: number
     max: number
+    p50?: number
     p90: number
     p95: number
+    p99?: number
+    p999?: number
   }
   http_req_failed?: number
   iterations?: number
@@ -154,20 +220,102 @@ export interface MetricTiming {
   }
 }
 
+// 运行中的实时聚合指标
+export interface LiveMetrics {
+  http_reqs: number
+  http_req_failed: number
+  error_rate: number
+  iterations: number
+  vus: number
+  vus_max: number
+  rps: number        // 最近一个完整秒的请求数
+  elapsed: number    // 已有请求的秒数
+  http_req_duration: {
+    avg: number
+    min: number
+    max: number
+    p50?: number
+    p90: number
+    p95: number
+    p99?: number
+    p999?: number
+  }
+}
+
+// Time-series query (GET /executions/{id}/timeseries)
+export interface TimeSeriesQuery {
+  metric: string
+  from?: number      // epoch 秒
+  to?: number        // epoch 秒
+  step?: number      // 分桶宽度(秒)
+  agg?: string       // avg | sum | min | max | count | rate | p95 ...
+  tags?: string      // 例如 status:200,method:GET
+}
+
+export interface TimeSeries {
+  metric: string
+  agg: string
+  step: number
+  times: number[]    // 分桶起始时间, epoch 秒
+  values: number[]
+  counts: number[]
+}
+
+// Per-second series of an execution, downsampled (GET /executions/{id}/series)
+export type SeriesName = 'rps' | 'error_rate' | 'vus' | 'p50' | 'p90' | 'p95' | 'p99'
+
+export interface ExecutionSeries {
+  execution_id: number
+  start: number      // epoch 秒
+  end: number
+  method: 'lttb' | 'minmax'
+  points: number     // 每条序列的最大点数
+  series: Partial<Record<SeriesName, { times: number[]; values: number[] }>>
+}
+
+// Paged execution log (GET /executions/{id}/logs)
+export interface LogLine {
+  n: number          // 行号(从0开始)
+  text: string
+}
+
+export interface LogPage {
+  total: number      // 匹配的总行数
+  offset: number
+  lines: LogLine[]
+}
+
+// Quick probe result (POST /debug/probe)
+export interface ProbeResult {
+  requests: number
+  concurrency: number
+  success: number
+  failed: number
+  status_codes: Record<string, number>
+  errors: Record<string, number>
+  duration: number                 // 总耗时(秒)
+  rps: number
+  latency: Record<string, number>  // avg/min/max/p50/p90/p95/p99/p999 (ms)
+}
+
 // WebSocket message types
 export interface WebSocketMessage {
-  type: 'log' | 'status' | 'result' | 'error' | 'execution_started' | 'info' | 'script_preview'
+  type: 'log' | 'logs' | 'status' | 'result' | 'error' | 'execution_started' | 'info' | 'script_preview' | 'metrics' | 'queue'
   level?: 'info' | 'warning' | 'error' | 'success'
   message?: string
+  lines?: string[]          // logs: 一批日志行
+  progress?: string | null  // logs: 最新的进度行(只保留最后一条)
+  dropped?: number          // logs: 客户端过慢时跳过的行数
   status?: string
   data?: any
   execution_id?: number
+  position?: number          // queue: 在队列中的位置
   config_id?: number
   script?: string
 }
 
 // Component state types
-export type TestStatus = 'idle' | 'starting' | 'running' | 'completed' | 'failed'
+export type TestStatus = 'idle' | 'queued' | 'starting' | 'running' | 'completed' | 'failed' | 'cancelled'
 
 // Curl解析结果
 export interface CurlParseResult {